@@ -0,0 +1,36 @@
+"""building created_at index
+
+Revision ID: 7c1e5b9a2f43
+Revises: 2940032ac666
+Create Date: 2026-10-18 09:12:40.512311
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e5b9a2f43'
+down_revision = '2940032ac666'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'building_created_at_idx',
+            'building',
+            ['created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'building_created_at_idx',
+            table_name='building',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,43 @@
+"""building updated_at trigger
+
+Revision ID: e58b1d7c4a90
+Revises: a3d84f1c6e27
+Create Date: 2026-10-18 14:02:41.517203
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e58b1d7c4a90'
+down_revision = 'a3d84f1c6e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Stamp updated_at on every UPDATE, not only ORM ones, so that the
+    # buildings version (and the ETags built on it) sees manual SQL too.
+    # clock_timestamp(), unlike now(), is not frozen at the transaction start
+    op.execute(
+        """
+        CREATE FUNCTION building_set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER building_updated_at
+        BEFORE UPDATE ON building
+        FOR EACH ROW EXECUTE FUNCTION building_set_updated_at()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER building_updated_at ON building")
+    op.execute("DROP FUNCTION building_set_updated_at()")
@@ -0,0 +1,47 @@
+"""building url unique index
+
+Revision ID: a3d84f1c6e27
+Revises: 7c1e5b9a2f43
+Create Date: 2026-10-18 10:03:15.208734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d84f1c6e27'
+down_revision = '7c1e5b9a2f43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not op.get_context().as_sql:
+        duplicates = op.get_bind().execute(sa.text(
+            "SELECT building_url FROM building WHERE building_url IS NOT NULL "
+            "GROUP BY building_url HAVING count(*) > 1 LIMIT 10"
+        )).scalars().all()
+        if duplicates:
+            raise RuntimeError(
+                f"Duplicate building_url values must be resolved first: {duplicates}"
+            )
+
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'building_building_url_idx',
+            'building',
+            ['building_url'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'building_building_url_idx',
+            table_name='building',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of the success envelope rendering.
+
+Compares the previous path (pydantic envelope -> jsonable_encoder ->
+JSONResponse) with `src.responses.success` on a fleet-sized payload.
+
+    python -m benchmarks.bench_responses --buildings 300 --users 50
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.responses import SucessResponseModel, headers, success
+
+
+def legacy_success(data):
+    content = SucessResponseModel(data=data, success=True)
+    return JSONResponse(
+        content=jsonable_encoder(content), status_code=200, headers=headers
+    )
+
+
+def make_payload(buildings: int, users: int) -> dict:
+    now = datetime(2025, 2, 17, 12, 19, 26)
+    return {
+        f"building-{b}": {
+            "id": b,
+            "type": "result",
+            "success": True,
+            "created_at": now + timedelta(minutes=b),
+            "result": [
+                {
+                    "id": f"{b:04x}{u:028x}",
+                    "username": f"user{u}",
+                    "name": f"User {u}",
+                    "is_owner": u == 0,
+                    "is_active": True,
+                    "local_only": False,
+                    "system_generated": False,
+                    "group_ids": ["system-users"],
+                    "credentials": [{"type": "homeassistant"}],
+                }
+                for u in range(users)
+            ],
+        }
+        for b in range(buildings)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--buildings", type=int, default=300)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=10)
+    args = parser.parse_args()
+
+    payload = make_payload(args.buildings, args.users)
+    assert legacy_success(payload).body == success(payload).body
+
+    results = {}
+    for name, render in (("legacy", legacy_success), ("orjson", success)):
+        timings = timeit.repeat(
+            lambda: render(payload), repeat=args.repeat, number=args.number
+        )
+        results[name] = min(timings) / args.number
+        print(f"{name:>8}: {results[name] * 1000:8.2f} ms/response")
+
+    size = len(success(payload).body) / 1024
+    speedup = results["legacy"] / results["orjson"]
+    print(f" payload: {size:8.0f} KiB, speedup x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    main()
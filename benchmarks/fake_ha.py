@@ -0,0 +1,307 @@
+"""
+Simulated Home Assistant fleet for benchmarks and tests.
+
+Each `FakeHomeAssistant` is a websocket server on an ephemeral localhost
+port speaking just enough of the Home Assistant API for ha-manager: the
+auth handshake, `config/auth/list`, `config/auth/create`,
+`config/auth_provider/homeassistant/create`, `ping`, `get_states` and
+`subscribe_events`/`unsubscribe_events`; `fire()` pushes an event to every
+subscriber and `fire_state_changed()` also updates the entity's state.
+Replies are delayed by `latency` +/- `jitter` seconds and fail with
+probability `failure_rate`.
+
+    python -m benchmarks.fake_ha --buildings 20 --latency 0.05 --jitter 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from typing import Optional
+
+import websockets
+
+HA_VERSION = "2024.1.0"
+
+
+class FakeHomeAssistant:
+    def __init__(
+        self,
+        access_token: str,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        users: int = 5,
+        entities: int = 10,
+        seed: Optional[int] = None,
+    ):
+        self.access_token = access_token
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.users = [self._user(f"user{i}", f"User {i}") for i in range(users)]
+        self.states = {
+            f"sensor.fake_{i}": self._state(
+                f"sensor.fake_{i}", str(i), {"unit_of_measurement": "W"}
+            )
+            for i in range(entities)
+        }
+        self.commands = 0
+        self._server = None
+        # websocket -> {subscription id: event type, None for all}
+        self._subscriptions: dict = {}
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        """`host:port` as it is registered as a building_url."""
+        return f"127.0.0.1:{self.port}"
+
+    async def start(self) -> "FakeHomeAssistant":
+        self._server = await websockets.serve(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @staticmethod
+    def _user(username: Optional[str], name: str) -> dict:
+        return {
+            "id": uuid.uuid4().hex,
+            "username": username,
+            "name": name,
+            "is_owner": False,
+            "is_active": True,
+            "local_only": False,
+            "system_generated": False,
+            "group_ids": ["system-users"],
+            "credentials": [{"type": "homeassistant"}] if username else [],
+        }
+
+    @staticmethod
+    def _state(entity_id: str, state: str, attributes: Optional[dict] = None) -> dict:
+        return {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": attributes or {},
+            "last_changed": "2024-01-01T00:00:00+00:00",
+            "last_updated": "2024-01-01T00:00:00+00:00",
+        }
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    async def fire(self, event_type: str, data: dict) -> None:
+        event = {
+            "event_type": event_type,
+            "data": data,
+            "origin": "LOCAL",
+            "time_fired": "2024-01-01T00:00:00+00:00",
+        }
+        for websocket, subscriptions in list(self._subscriptions.items()):
+            for subscription, wanted in list(subscriptions.items()):
+                if wanted in (None, event_type):
+                    try:
+                        await websocket.send(
+                            json.dumps(
+                                {"id": subscription, "type": "event", "event": event}
+                            )
+                        )
+                    except websockets.ConnectionClosed:
+                        pass
+
+    async def fire_state_changed(
+        self, entity_id: str, state: Optional[str], attributes: Optional[dict] = None
+    ) -> None:
+        """Change (or with `state=None`, remove) an entity and tell subscribers."""
+        old_state = self.states.pop(entity_id, None)
+        new_state = None
+        if state is not None:
+            new_state = self.states[entity_id] = self._state(
+                entity_id, state, attributes
+            )
+        await self.fire(
+            "state_changed",
+            {"entity_id": entity_id, "old_state": old_state, "new_state": new_state},
+        )
+
+    def _reply(self, message: dict, subscriptions: dict) -> dict:
+        reply = {
+            "id": message.get("id"),
+            "type": "result",
+            "success": True,
+            "result": None,
+        }
+        if self.random.random() < self.failure_rate:
+            return {
+                **reply,
+                "success": False,
+                "error": {"code": "unknown_error", "message": "Simulated failure"},
+            }
+
+        command = message.get("type")
+        if command == "ping":
+            return {"id": message.get("id"), "type": "pong"}
+        if command == "config/auth/list":
+            reply["result"] = self.users
+        elif command == "config/auth/create":
+            user = self._user(None, message.get("name", ""))
+            user["group_ids"] = message.get("group_ids", [])
+            self.users.append(user)
+            reply["result"] = {"user": user}
+        elif command == "get_states":
+            reply["result"] = list(self.states.values())
+        elif command == "subscribe_events":
+            subscriptions[message.get("id")] = message.get("event_type")
+        elif command == "unsubscribe_events":
+            if subscriptions.pop(message.get("subscription"), None) is None:
+                return {
+                    **reply,
+                    "success": False,
+                    "error": {
+                        "code": "not_found",
+                        "message": "Subscription not found.",
+                    },
+                }
+        elif command == "config/auth_provider/homeassistant/create":
+            user = next(
+                (u for u in self.users if u["id"] == message.get("user_id")), None
+            )
+            if user is None:
+                return {
+                    **reply,
+                    "success": False,
+                    "error": {"code": "not_found", "message": "User not found"},
+                }
+            user["username"] = message.get("username")
+            user["credentials"] = [{"type": "homeassistant"}]
+        else:
+            return {
+                **reply,
+                "success": False,
+                "error": {"code": "unknown_command", "message": "Unknown command."},
+            }
+        return reply
+
+    async def _handle(self, websocket) -> None:
+        await websocket.send(
+            json.dumps({"type": "auth_required", "ha_version": HA_VERSION})
+        )
+        auth = json.loads(await websocket.recv())
+        if auth.get("access_token") != self.access_token:
+            await websocket.send(
+                json.dumps({"type": "auth_invalid", "message": "Invalid access token"})
+            )
+            return
+        await websocket.send(json.dumps({"type": "auth_ok", "ha_version": HA_VERSION}))
+        subscriptions = self._subscriptions[websocket] = {}
+
+        async def answer(message: dict) -> None:
+            await asyncio.sleep(self._delay())
+            try:
+                await websocket.send(json.dumps(self._reply(message, subscriptions)))
+            except websockets.ConnectionClosed:
+                pass
+
+        replies = set()
+        try:
+            async for raw in websocket:
+                self.commands += 1
+                # Commands are answered concurrently, like Home Assistant does
+                task = asyncio.create_task(answer(json.loads(raw)))
+                replies.add(task)
+                task.add_done_callback(replies.discard)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._subscriptions.pop(websocket, None)
+            for task in replies:
+                task.cancel()
+
+
+class FakeFleet:
+    """N fake buildings; use as an async context manager."""
+
+    def __init__(self, buildings: int, seed: Optional[int] = None, **options):
+        self.homes = [
+            FakeHomeAssistant(
+                access_token=f"bench-token-{i}",
+                seed=None if seed is None else seed + i,
+                **options,
+            )
+            for i in range(buildings)
+        ]
+
+    async def __aenter__(self) -> "FakeFleet":
+        await asyncio.gather(*(home.start() for home in self.homes))
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await asyncio.gather(*(home.stop() for home in self.homes))
+
+    def __iter__(self):
+        return iter(self.homes)
+
+    def __len__(self) -> int:
+        return len(self.homes)
+
+    @property
+    def commands(self) -> int:
+        return sum(home.commands for home in self.homes)
+
+
+def fleet_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--buildings", type=int, default=20)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Mean reply delay, seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.01, help="Uniform +/- delay, seconds"
+    )
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--users", type=int, default=5, help="Users per building")
+    parser.add_argument(
+        "--entities", type=int, default=10, help="Entities per building"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def build_fleet(args: argparse.Namespace) -> FakeFleet:
+    return FakeFleet(
+        args.buildings,
+        seed=args.seed,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        users=args.users,
+        entities=args.entities,
+    )
+
+
+async def serve(args: argparse.Namespace) -> None:
+    async with build_fleet(args) as fleet:
+        for home in fleet:
+            print(
+                json.dumps(
+                    {"building_url": home.url, "access_token": home.access_token}
+                )
+            )
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    fleet_options(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
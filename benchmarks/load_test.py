@@ -0,0 +1,250 @@
+"""
+End-to-end load test of ha-manager against a simulated Home Assistant fleet.
+
+Starts a `FakeFleet`, registers every fake home as a building through the
+API, then drives the app in-process (httpx + ASGI, lifespan included) and
+measures throughput and p50/p95/p99 latency of
+
+    GET  /building/list
+    GET  /building/users
+    POST /building/create-user/{building_id}
+
+The app talks to the real DATABASE_URL and REDIS_URL from the environment;
+point them at disposable services, since `/building/users` covers every
+registered building. The seeded buildings are deleted afterwards.
+
+    python -m benchmarks.load_test --buildings 50 --latency 0.05 --requests 500 \\
+        --concurrency 20 --output results.json --baseline previous.json
+
+With `--baseline`, p95 latencies are compared with a previous results file
+and the run exits non-zero when any scenario regressed by more than
+`--max-regression`.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from benchmarks.fake_ha import FakeFleet, build_fleet, fleet_options
+
+Request = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(
+    latencies: list[float], elapsed: float, statuses: Counter, extra: Counter
+) -> dict:
+    latencies = sorted(latencies)
+    errors = sum(
+        count for status, count in statuses.items() if status >= 400 or status == 0
+    )
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        **({"cache_status": dict(extra)} if extra else {}),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "min": round(latencies[0] * 1000, 2) if latencies else 0.0,
+            "mean": (
+                round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0
+            ),
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, request: Request, requests: int, concurrency: int
+) -> dict:
+    counter = itertools.count()
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    cache_statuses: Counter = Counter()
+
+    async def worker() -> None:
+        while (index := next(counter)) < requests:
+            started = time.perf_counter()
+            try:
+                response = await request(client, index)
+            except Exception:
+                statuses[0] += 1
+            else:
+                statuses[response.status_code] += 1
+                if "cache-status" in response.headers:
+                    cache_statuses[response.headers["cache-status"]] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, statuses, cache_statuses)
+
+
+async def seed(
+    client: httpx.AsyncClient, fleet: FakeFleet, run_id: str, building_ids: list[int]
+) -> None:
+    for index, home in enumerate(fleet):
+        response = await client.post("/building/register", json={
+            "name": f"bench-{run_id}-{index}",
+            "building_url": home.url,
+            "access_token": home.access_token,
+        })
+        response.raise_for_status()
+        building_ids.append(response.json()["id"])
+
+
+async def cleanup(client: httpx.AsyncClient, building_ids: list[int]) -> None:
+    for building_id in building_ids:
+        await client.delete(f"/building/delete/{building_id}")
+
+
+def scenarios(building_ids: list[int], run_id: str) -> dict[str, Request]:
+    def list_buildings(client, _):
+        return client.get("/building/list", params={"limit": 100})
+
+    def list_users(client, _):
+        return client.get("/building/users")
+
+    def create_user(client, index):
+        building_id = building_ids[index % len(building_ids)]
+        return client.post(f"/building/create-user/{building_id}", json={
+            "username": f"bench-{run_id}-{index}",
+            "password": "bench-password",
+        })
+
+    return {
+        "building_list": list_buildings,
+        "building_users": list_users,
+        "create_user": create_user,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from src.main import app
+
+    run_id = uuid.uuid4().hex[:8]
+    selected = args.scenario or ["building_list", "building_users", "create_user"]
+    results: dict = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "run_id": run_id,
+            "args": vars(args),
+        },
+        "scenarios": {},
+    }
+
+    async with build_fleet(args) as fleet, app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            building_ids: list[int] = []
+            try:
+                await seed(client, fleet, run_id, building_ids)
+                requests = scenarios(building_ids, run_id)
+                for name in selected:
+                    if args.warmup:
+                        await run_scenario(
+                            client, requests[name], args.warmup, args.concurrency
+                        )
+                    results["scenarios"][name] = await run_scenario(
+                        client, requests[name], args.requests, args.concurrency
+                    )
+                    latency = results["scenarios"][name]["latency_ms"]
+                    print(f"{name}: {json.dumps(latency)}", file=sys.stderr)
+            finally:
+                await cleanup(client, building_ids)
+        results["fleet"] = {"buildings": len(fleet), "ha_commands": fleet.commands}
+    return results
+
+
+def regressions(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    found = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or not previous["latency_ms"]["p95"]:
+            continue
+        change = current["latency_ms"]["p95"] / previous["latency_ms"]["p95"] - 1
+        if change > max_regression:
+            found.append(
+                f"{name}: p95 {previous['latency_ms']['p95']}ms -> "
+                f"{current['latency_ms']['p95']}ms (+{change:.0%})"
+            )
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    fleet_options(parser)
+    parser.add_argument(
+        "--requests", type=int, default=200, help="Requests per scenario"
+    )
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--warmup", type=int, default=10, help="Unmeasured requests per scenario"
+    )
+    parser.add_argument(
+        "--scenario", action="append",
+        choices=["building_list", "building_users", "create_user"],
+        help="Run only these scenarios (repeatable)",
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument(
+        "--baseline", help="Previous results file to compare p95 latencies with"
+    )
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            found = regressions(results, json.load(baseline), args.max_regression)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -40,3 +40,23 @@ graceful_timeout = int(graceful_timeout_str)
 timeout = int(timeout_str)
 keepalive = int(keepalive_str)
 logconfig = os.getenv("LOG_CONFIG", "/src/logging_production.ini")
+
+# Prometheus multiprocess mode: workers write metrics to files in this
+# directory and /metrics aggregates them (see src/metrics.py)
+prometheus_multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/dev/shm/prometheus"
+)
+
+
+def on_starting(server):
+    # Samples of workers from a previous run must not be merged into this one
+    import shutil
+
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,5 @@
+import time
+
+# Importing any application module imports this package first, so start-up
+# timings (see src.main) include the time spent importing everything else
+IMPORT_STARTED = time.perf_counter()
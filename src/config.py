@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import PostgresDsn, RedisDsn, model_validator, field_validator
 from pydantic_settings import BaseSettings
@@ -9,6 +9,25 @@ import json
 
 class Config(BaseSettings):
     DATABASE_URL: PostgresDsn
+    # Optional read replicas (comma separated); reads fall back to the primary
+    DATABASE_REPLICA_URLS: list[PostgresDsn] | str = []
+    DATABASE_REPLICA_CHECK_INTERVAL: float = 10.0
+    # After a request that wrote, that client reads from the primary this long
+    DATABASE_READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Database connection pool, per process and per host (gunicorn runs
+    # cpu_count + 1 workers, each opening up to size + overflow connections).
+    # Pre-ping "idle" only checks connections unused for
+    # DATABASE_POOL_PRE_PING_IDLE seconds; "never" relies on recycling and
+    # on invalidating a connection when a query finds it dead.
+    # DATABASE_POOL_MODE "pgbouncer" leaves pooling to a transaction pooler:
+    # no pool in the process and no prepared statement caches
+    DATABASE_POOL_MODE: Literal["queue", "pgbouncer"] = "queue"
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT: float = 30.0
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: Literal["always", "idle", "never"] = "idle"
+    DATABASE_POOL_PRE_PING_IDLE: float = 30.0
     REDIS_URL: RedisDsn
 
     SITE_DOMAIN: str = "myapp.com"
@@ -23,6 +42,91 @@ class Config(BaseSettings):
     APP_VERSION: str = "1.0.0"
     ECHO_SQL: bool = False
 
+    # Logging: level defaults to DEBUG in debug environments, INFO otherwise;
+    # "auto" renders JSON when deployed and colored text elsewhere
+    LOG_LEVEL: str | None = None
+    LOG_RENDERER: Literal["auto", "json", "color", "plain"] = "auto"
+    LOG_QUEUE_SIZE: int = 10000
+
+    # Redis connection pool (per process); commands wait up to
+    # REDIS_POOL_TIMEOUT seconds for a free connection instead of failing
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+
+    # Startup warm-up: pooled connections opened before the worker reports
+    # ready, and how many of the most recently used buildings to pre-connect
+    WARMUP_DB_CONNECTIONS: int = 5
+    WARMUP_REDIS_CONNECTIONS: int = 5
+    WARMUP_BUILDINGS: int = 0
+    WARMUP_TIMEOUT: float = 30.0
+
+    # Server-Timing breakdown; requests slower than this are logged in full
+    SLOW_REQUEST_LOG_MS: float | None = None
+
+    # Home Assistant fan-out (multi-building operations)
+    HA_FANOUT_CONCURRENCY: int = 50
+    HA_BUILDING_TIMEOUT: float = 10.0
+    HA_FANOUT_DEADLINE: float = 30.0
+
+    # Home Assistant connection pool (per process)
+    HA_POOL_MAX_CONNECTIONS: int = 500
+    HA_POOL_IDLE_TIMEOUT: float = 300.0
+    HA_POOL_CONNECT_RETRIES: int = 2
+    HA_POOL_BACKOFF: float = 0.5
+    HA_POOL_BACKOFF_MAX: float = 5.0
+
+    # Home Assistant websocket commands; connect and command timeouts adapt to
+    # each building's latency, between HA_TIMEOUT_FLOOR and these ceilings
+    HA_CONNECT_TIMEOUT: float = 10.0
+    HA_COMMAND_TIMEOUT: float = 10.0
+    HA_TIMEOUT_FLOOR: float = 1.0
+    HA_LATENCY_EWMA_ALPHA: float = 0.125
+    HA_EVENT_QUEUE_SIZE: int = 1000
+
+    # Live events fanned out to dashboards: frames buffered per client, and
+    # seconds between SSE keepalive comments
+    HA_EVENT_CLIENT_BUFFER: int = 256
+    HA_EVENT_KEEPALIVE: float = 15.0
+
+    # In-memory entity states, kept current from state_changed events
+    HA_STATES_SYNC_TIMEOUT: float = 60.0
+    HA_STATES_IDLE_TIMEOUT: float = 900.0
+    HA_STATES_BACKLOG: int = 10000
+
+    # Per-building circuit breaker
+    HA_BREAKER_FAILURE_THRESHOLD: int = 5
+    HA_BREAKER_RESET_TIMEOUT: float = 30.0
+    HA_BREAKER_HALF_OPEN_PROBES: int = 1
+    # Buildings whose breaker and latency estimates are kept (least recently
+    # connected are dropped first)
+    HA_BREAKER_MAX_BUILDINGS: int = 10000
+
+    # Cached Home Assistant user listings (seconds)
+    HA_USERS_CACHE_TTL: int = 60
+    HA_USERS_CACHE_STALE_TTL: int = 300
+
+    # Cross-worker ownership of building connections. When enabled, each
+    # building is owned by one worker (Redis lease); the others forward to it
+    HA_COORDINATION_ENABLED: bool = False
+    HA_COORDINATION_HEARTBEAT: float = 5.0
+    HA_COORDINATION_LEASE_TTL: int = 15
+    HA_COORDINATION_FORWARD_TIMEOUT: float = 30.0
+    HA_COORDINATION_CONCURRENCY: int = 100
+
+    # Background fleet health monitor; one worker sweeps at a time
+    HA_HEALTH_ENABLED: bool = True
+    HA_HEALTH_INTERVAL: float = 60.0
+    HA_HEALTH_CONCURRENCY: int = 50
+    HA_HEALTH_TIMEOUT: float = 5.0
+
+    # Bulk user provisioning
+    HA_BULK_MAX_ITEMS: int = 10000
+    HA_BULK_PER_BUILDING_CONCURRENCY: int = 10
+    HA_BULK_BUILDING_TIMEOUT: float = 120.0
+    HA_BULK_DEADLINE: float = 300.0
+
     @model_validator(mode="after")
     def validate_sentry_non_local(self) -> "Config":
         if self.ENVIRONMENT.is_deployed and not self.SENTRY_DSN:
@@ -30,6 +134,12 @@ class Config(BaseSettings):
 
         return self
 
+    @field_validator('DATABASE_REPLICA_URLS', mode="before")
+    def parse_replica_urls(cls, value):
+        if isinstance(value, str):
+            return [x.strip() for x in value.split(',') if x.strip()]
+        return value
+
     @field_validator('CORS_ORIGINS', 'CORS_HEADERS', mode="before")
     def parse_cors_origins(cls, value):
         if isinstance(value, str):
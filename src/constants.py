@@ -18,6 +18,10 @@ FULL_DATE_FORMAT = f"{DATE_FORMAT} %H:%M:%S"
 LOG_WITHOUT_TIMESTAMP = "[%(levelname)s] %(name)s > %(funcName)s | %(message)s"
 LOG_WITH_TIMESTAMP = "[%(log_color)s%(levelname)s%(reset)s] %(asctime)s | %(yellow)s%(name)s > %(funcName)s%(reset)s | Line %(lineno)d | %(cyan)s%(message)s"
 LOG_FORMAT = LOG_WITH_TIMESTAMP
+LOG_PLAIN_FORMAT = (
+    "[%(levelname)s] %(asctime)s | %(name)s > %(funcName)s | Line %(lineno)d | "
+    "%(message)s"
+)
 
 class Environment(str, Enum):
     LOCAL = "LOCAL"
@@ -0,0 +1,204 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Iterator, Optional
+
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from src.config import settings
+from src.logger import get_logger
+from src.metrics import HA_CIRCUIT_STATE, HA_CIRCUIT_TRANSITIONS
+
+logger = get_logger(__name__)
+
+# Errors that say the building is unreachable or unhealthy. Anything else
+# (a rejected token, a cancelled request) says nothing about the building.
+FAILURES = (OSError, asyncio.TimeoutError, ConnectionClosed, InvalidHandshake)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+
+# Gauge values; the highest is the worst, so "max" across workers is meaningful
+_STATE_VALUES = {
+    CircuitState.CLOSED: 0,
+    CircuitState.HALF_OPEN: 1,
+    CircuitState.OPEN: 2,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting a building whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Trips after `failure_threshold` consecutive failures. While open every
+    call fails fast; after `reset_timeout` seconds up to `half_open_probes`
+    calls are let through, and the first result decides whether the circuit
+    closes again or re-opens.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        half_open_probes: Optional[int] = None,
+    ):
+        self.name = name
+        self.failure_threshold = (
+            failure_threshold or settings.HA_BREAKER_FAILURE_THRESHOLD
+        )
+        self.reset_timeout = reset_timeout or settings.HA_BREAKER_RESET_TIMEOUT
+        self.half_open_probes = half_open_probes or settings.HA_BREAKER_HALF_OPEN_PROBES
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def _transition(self, state: CircuitState) -> None:
+        previous, self.state = self.state, state
+        self.probes = 0
+        if state == CircuitState.OPEN:
+            self.opened_at = time.monotonic()
+            logger.warning(
+                f"[BREAKER]: Circuit for building {self.name} opened after "
+                f"{self.failures} failures ({previous.value} -> open)"
+            )
+        else:
+            logger.info(
+                f"[BREAKER]: Circuit for building {self.name} "
+                f"{previous.value} -> {state.value}"
+            )
+        HA_CIRCUIT_STATE.labels(building=self.name).set(_STATE_VALUES[state])
+        HA_CIRCUIT_TRANSITIONS.labels(building=self.name, state=state.value).inc()
+
+    def before_call(self) -> None:
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit for building {self.name} is open")
+            self._transition(CircuitState.HALF_OPEN)
+        if self.state == CircuitState.HALF_OPEN:
+            if self.probes >= self.half_open_probes:
+                raise CircuitOpenError(
+                    f"Circuit for building {self.name} is half-open, probe in flight"
+                )
+            self.probes += 1
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != CircuitState.CLOSED:
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == CircuitState.HALF_OPEN or (
+            self.state == CircuitState.CLOSED
+            and self.failures >= self.failure_threshold
+        ):
+            self._transition(CircuitState.OPEN)
+
+    def _release(self) -> None:
+        if self.state == CircuitState.HALF_OPEN and self.probes:
+            self.probes -= 1
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """Fail fast while open and record the outcome of the wrapped call."""
+        self.before_call()
+        try:
+            yield
+        except FAILURES:
+            self.record_failure()
+            raise
+        except BaseException:
+            self._release()
+            raise
+        else:
+            self.record_success()
+
+
+class LatencyEstimator:
+    """
+    Smoothed latency and deviation (as TCP estimates round-trip time), giving
+    a timeout of `smoothed + 4 * deviation` clamped to [floor, ceiling].
+    Until the first sample the ceiling is used.
+    """
+
+    __slots__ = ("ceiling", "floor", "alpha", "beta", "smoothed", "deviation")
+
+    def __init__(
+        self,
+        ceiling: float,
+        floor: Optional[float] = None,
+        alpha: Optional[float] = None,
+    ):
+        self.ceiling = ceiling
+        self.floor = min(floor or settings.HA_TIMEOUT_FLOOR, ceiling)
+        self.alpha = alpha or settings.HA_LATENCY_EWMA_ALPHA
+        self.beta = 2 * self.alpha
+        self.smoothed: Optional[float] = None
+        self.deviation = 0.0
+
+    def observe(self, seconds: float) -> None:
+        if self.smoothed is None:
+            self.smoothed, self.deviation = seconds, seconds / 2
+            return
+        self.deviation += self.beta * (abs(seconds - self.smoothed) - self.deviation)
+        self.smoothed += self.alpha * (seconds - self.smoothed)
+
+    def expired(self, waited: float) -> None:
+        """A call timed out: back off, so a building that got slower is not starved."""
+        self.observe(min(self.ceiling, waited * 2))
+
+    def timeout(self) -> float:
+        if self.smoothed is None:
+            return self.ceiling
+        return min(self.ceiling, max(self.floor, self.smoothed + 4 * self.deviation))
+
+
+class BuildingGuard:
+    """Breaker and latency estimates of one building, shared by all its clients."""
+
+    __slots__ = ("breaker", "connect_latency", "command_latency")
+
+    def __init__(self, building: str):
+        self.breaker = CircuitBreaker(building)
+        self.connect_latency = LatencyEstimator(settings.HA_CONNECT_TIMEOUT)
+        self.command_latency = LatencyEstimator(settings.HA_COMMAND_TIMEOUT)
+
+
+# Least recently connected first
+_guards: OrderedDict[str, BuildingGuard] = OrderedDict()
+
+
+def _reset_state_gauge(building: str) -> None:
+    # Report the circuit closed before dropping the label: in multiprocess
+    # mode the last value written stays in this worker's file, and "max"
+    # would keep showing a dropped building's circuit as open
+    HA_CIRCUIT_STATE.labels(building=building).set(_STATE_VALUES[CircuitState.CLOSED])
+    HA_CIRCUIT_STATE.remove(building)
+
+
+def guard_for(building: str) -> BuildingGuard:
+    guard = _guards.get(building)
+    if guard is None:
+        guard = _guards[building] = BuildingGuard(building)
+        while len(_guards) > settings.HA_BREAKER_MAX_BUILDINGS:
+            evicted, _ = _guards.popitem(last=False)
+            _reset_state_gauge(evicted)
+    else:
+        _guards.move_to_end(building)
+    return guard
+
+
+def forget_guard(building: str) -> None:
+    """Drop a building's breaker and latency estimates, e.g. once it is deleted."""
+    if _guards.pop(building, None) is not None:
+        _reset_state_gauge(building)
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import time
+from enum import Enum
+from typing import Awaitable, Callable, Iterable, Optional
+
+from src.config import settings
+from src.core.ha_websocket.coordination import coordinator
+from src.core.ha_websocket.pool import BuildingTarget
+from src.logger import get_logger
+from src.redis import RedisData, get_many, incr_and_delete, set_if_counter
+from src.responses import content_hash
+
+logger = get_logger(__name__)
+
+
+class CacheStatus(str, Enum):
+    HIT = "hit"
+    STALE = "stale"
+    MISS = "miss"
+
+    @classmethod
+    def combine(cls, statuses: Iterable["CacheStatus"]) -> "CacheStatus":
+        """The worst status wins: one miss makes the whole response a miss."""
+        statuses = set(statuses)
+        for status in (cls.MISS, cls.STALE):
+            if status in statuses:
+                return status
+        return cls.HIT
+
+
+Fetch = Callable[[], Awaitable[dict]]
+
+
+class HAUserListCache:
+    """
+    Redis cache of `config/auth/list` replies, one entry per building.
+
+    Entries are fresh for `ttl` seconds. For a further `stale_ttl` seconds they
+    are still served, while a background task fetches a new copy from Home
+    Assistant (stale-while-revalidate). Failed replies are never cached,
+    and neither are replies fetched before the building was invalidated, by
+    any worker: each invalidation bumps a per-building generation in Redis,
+    and a reply is only stored while the generation it was fetched under is
+    still current.
+    """
+
+    KEY = "ha:users:{building_id}"
+    GENERATION_KEY = "ha:users:gen:{building_id}"
+    # Long enough to outlive any fetch still in flight when a building was
+    # invalidated (a missing generation reads as 0)
+    GENERATION_TTL = 86400
+
+    def __init__(self, ttl: Optional[int] = None, stale_ttl: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else settings.HA_USERS_CACHE_TTL
+        self.stale_ttl = (
+            stale_ttl if stale_ttl is not None else settings.HA_USERS_CACHE_STALE_TTL
+        )
+        self._refreshing: dict[int, asyncio.Task] = {}
+
+    def key(self, building_id: int) -> str:
+        return self.KEY.format(building_id=building_id)
+
+    def generation_key(self, building_id: int) -> str:
+        return self.GENERATION_KEY.format(building_id=building_id)
+
+    async def _read(self, building_id: int) -> tuple[Optional[dict], Optional[int]]:
+        """The cached entry and the building's current generation, in one round trip."""
+        try:
+            raw, generation = await get_many(
+                [self.key(building_id), self.generation_key(building_id)]
+            )
+        except Exception as e:
+            logger.warning(f"[CACHE]: Read failed for building {building_id}: {e}")
+            return None, None
+        return json.loads(raw) if raw else None, int(generation or 0)
+
+    async def _store(
+        self, building_id: int, response: dict, generation: Optional[int]
+    ) -> None:
+        """Cache `response`, unless the building was invalidated since `generation`."""
+        if not response.get("success") or self.ttl + self.stale_ttl <= 0:
+            return
+        if generation is None:
+            return
+        entry = {
+            "fetched_at": time.time(),
+            "response": response,
+            "hash": content_hash(response),
+        }
+        try:
+            await set_if_counter(
+                RedisData(
+                    key=self.key(building_id),
+                    value=json.dumps(entry),
+                    ttl=self.ttl + self.stale_ttl,
+                ),
+                self.generation_key(building_id),
+                generation,
+            )
+        except Exception as e:
+            logger.warning(f"[CACHE]: Write failed for building {building_id}: {e}")
+
+    async def _refresh(
+        self, building_id: int, fetch: Fetch, generation: Optional[int]
+    ) -> None:
+        try:
+            response = await asyncio.wait_for(
+                fetch(), timeout=settings.HA_BUILDING_TIMEOUT
+            )
+            await self._store(building_id, response, generation)
+        except Exception as e:
+            logger.warning(
+                f"[CACHE]: Background refresh failed for building {building_id}: {e}"
+            )
+        finally:
+            self._refreshing.pop(building_id, None)
+
+    async def get_or_fetch(
+        self, building_id: int, fetch: Fetch
+    ) -> tuple[dict, CacheStatus]:
+        entry, generation = await self._read(building_id)
+        if entry is not None:
+            age = time.time() - entry["fetched_at"]
+            if age < self.ttl:
+                return entry["response"], CacheStatus.HIT
+            if building_id not in self._refreshing:
+                self._refreshing[building_id] = asyncio.create_task(
+                    self._refresh(building_id, fetch, generation)
+                )
+            return entry["response"], CacheStatus.STALE
+
+        response = await fetch()
+        await self._store(building_id, response, generation)
+        return response, CacheStatus.MISS
+
+    async def content_hashes(self, building_ids: list[int]) -> Optional[dict[int, str]]:
+        """
+        Content hash of each building's cached listing, in one round trip.
+        None unless every entry is present and fresh, as a full request
+        would fetch (or refresh) the rest.
+        """
+        try:
+            raws = await get_many(
+                [self.key(building_id) for building_id in building_ids]
+            )
+        except Exception as e:
+            logger.warning(
+                f"[CACHE]: Read failed for {len(building_ids)} buildings: {e}"
+            )
+            return None
+        hashes = {}
+        now = time.time()
+        for building_id, raw in zip(building_ids, raws):
+            entry = json.loads(raw) if raw else None
+            if (
+                entry is None
+                or "hash" not in entry
+                or now - entry["fetched_at"] >= self.ttl
+            ):
+                return None
+            hashes[building_id] = entry["hash"]
+        return hashes
+
+    async def invalidate(self, building_id: int) -> None:
+        await self.invalidate_many([building_id])
+
+    async def invalidate_many(self, building_ids: Iterable[int]) -> None:
+        building_ids = list(building_ids)
+        if not building_ids:
+            return
+        try:
+            await incr_and_delete(
+                [self.generation_key(building_id) for building_id in building_ids],
+                [self.key(building_id) for building_id in building_ids],
+                self.GENERATION_TTL,
+            )
+        except Exception as e:
+            logger.warning(
+                f"[CACHE]: Invalidation failed for {len(building_ids)} buildings: {e}"
+            )
+
+
+user_cache = HAUserListCache()
+
+
+async def list_users_cached(target: BuildingTarget) -> tuple[dict, CacheStatus]:
+    """`config/auth/list` for one building, served from the cache when possible."""
+    return await user_cache.get_or_fetch(
+        target.id,
+        lambda: coordinator.run(target, "list_persons"),
+    )
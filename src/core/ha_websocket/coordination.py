@@ -0,0 +1,484 @@
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from src.config import settings
+from src.core.ha_websocket.breaker import CircuitOpenError
+from src.core.ha_websocket.main import HomeAssistantAuthError
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+from src.database import warn_if_holding
+from src.logger import get_logger
+from src.redis import acquire_lease, get_by_key, get_redis, release_lease
+
+logger = get_logger(__name__)
+
+# HomeAssistantWS methods that may be run on behalf of another worker
+OPERATIONS = frozenset({"command", "create_user", "list_persons"})
+
+# Re-raised on the requesting side, so callers see the owner's error type
+_ERRORS = {
+    "TimeoutError": asyncio.TimeoutError,
+    "CircuitOpenError": CircuitOpenError,
+    "HomeAssistantAuthError": HomeAssistantAuthError,
+}
+
+
+def rendezvous(building_id: int, workers: Iterable[str]) -> Optional[str]:
+    """
+    Highest-random-weight owner of a building. Every worker computes the same
+    answer from the same member list, and a worker joining or leaving only
+    moves its own share of the buildings.
+    """
+    best, best_score = None, -1
+    for worker in workers:
+        key = f"{worker}:{building_id}".encode()
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        score = int.from_bytes(digest, "big")
+        if score > best_score:
+            best, best_score = worker, score
+    return best
+
+
+def _error_kind(error: Exception) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "TimeoutError"
+    return type(error).__name__
+
+
+class _Relay:
+    """Event hub subscriber publishing one building's frames to other workers."""
+
+    def __init__(self, coordinator: "BuildingCoordinator", building_id: int):
+        self.coordinator = coordinator
+        self.channel = coordinator.EVENTS_CHANNEL.format(building_id=building_id)
+        self.expires_at = 0.0
+
+    def wants(self, frame: dict) -> bool:
+        return True
+
+    def push(self, frame: dict, key=None) -> None:
+        self.coordinator._outbox_put(self.channel, frame)
+
+
+class RemoteClient:
+    """
+    Stand-in for the pooled client of a building owned by another worker;
+    every supported operation is forwarded to the owner, without retries.
+    """
+
+    def __init__(
+        self, coordinator: "BuildingCoordinator", owner: str, target: BuildingTarget
+    ):
+        self.coordinator = coordinator
+        self.owner = owner
+        self.target = target
+
+    def __getattr__(self, op: str) -> Callable[..., Awaitable[Any]]:
+        if op not in OPERATIONS:
+            raise AttributeError(op)
+
+        async def forward(**kwargs) -> Any:
+            return await self.coordinator._forward(
+                self.owner, self.target, op, False, kwargs
+            )
+
+        return forward
+
+
+class BuildingCoordinator:
+    """
+    Shards building connections across gunicorn workers.
+
+    Workers announce themselves with heartbeats in a Redis sorted set. Each
+    building belongs to the worker chosen by rendezvous hashing over the
+    live workers, which holds a Redis lease on it and is the only one
+    connected to the building. Other workers forward HomeAssistantWS
+    operations to the owner through its Redis request list and get the
+    reply on their pub/sub channel; live events reach them through a
+    per-building pub/sub channel the owner relays to while anyone follows.
+
+    When workers start or die the hashing moves buildings: owners hand over
+    buildings that now belong to someone else, and leases of dead workers
+    expire after HA_COORDINATION_LEASE_TTL seconds.
+
+    Disabled (the default), every operation runs on the local pool.
+    """
+
+    WORKERS_KEY = "ha:workers"
+    OWNER_KEY = "ha:owner:{building_id}"
+    REQUESTS_KEY = "ha:rpc:{worker_id}"
+    REPLIES_CHANNEL = "ha:rpc:reply:{worker_id}"
+    EVENTS_CHANNEL = "ha:events:{building_id}"
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = settings.HA_COORDINATION_ENABLED if enabled is None else enabled
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ttl = settings.HA_COORDINATION_LEASE_TTL
+        self.workers: list[str] = []
+        self.owned: dict[int, BuildingTarget] = {}
+        self._replies: dict[str, asyncio.Future] = {}
+        self._channels: dict[str, Callable[[dict], None]] = {}
+        self._relays: dict[int, _Relay] = {}
+        self._outbox: Optional[asyncio.Queue] = None
+        self._pubsub = None
+        self._handlers: set[asyncio.Task] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def owner_key(self, building_id: int) -> str:
+        return self.OWNER_KEY.format(building_id=building_id)
+
+    # Membership
+
+    async def _heartbeat(self) -> None:
+        now = time.time()
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.zadd(self.WORKERS_KEY, {self.worker_id: now})
+            pipe.zremrangebyscore(self.WORKERS_KEY, "-inf", now - self.lease_ttl)
+            pipe.zrange(self.WORKERS_KEY, 0, -1)
+            *_, workers = await pipe.execute()
+        self.workers = sorted(worker.decode() for worker in workers)
+
+    def preferred(self, building_id: int) -> str:
+        return rendezvous(building_id, self.workers) or self.worker_id
+
+    async def _rebalance(self) -> None:
+        for building_id in list(self.owned):
+            preferred = self.preferred(building_id)
+            if preferred == self.worker_id and await acquire_lease(
+                self.owner_key(building_id), self.worker_id, self.lease_ttl
+            ):
+                continue
+            logger.info(
+                f"[COORDINATION]: Handing building {building_id} over to {preferred}"
+            )
+            self.owned.pop(building_id, None)
+            with contextlib.suppress(Exception):
+                await release_lease(self.owner_key(building_id), self.worker_id)
+            await self._stop_relay(building_id)
+            # Local subscriptions notice the drop and switch to the new owner
+            await ha_pool.invalidate(building_id)
+
+    async def _maintain(self) -> None:
+        while True:
+            try:
+                await self._heartbeat()
+                await self._rebalance()
+                now = time.monotonic()
+                for building_id, relay in list(self._relays.items()):
+                    if relay.expires_at < now:
+                        await self._stop_relay(building_id)
+            except Exception as e:
+                logger.error(f"[COORDINATION]: Heartbeat failed: {e}")
+            await asyncio.sleep(settings.HA_COORDINATION_HEARTBEAT)
+
+    # Ownership
+
+    async def owner_of(self, target: BuildingTarget) -> str:
+        """
+        The worker that should talk to the building, taking it over when it
+        is ours.
+        """
+        if target.id in self.owned:
+            return self.worker_id
+
+        owner = await get_by_key(self.owner_key(target.id))
+        if owner:
+            owner = owner.decode()
+            if owner == self.worker_id:
+                self.owned[target.id] = target
+                return owner
+            if owner in self.workers:
+                return owner
+            # Lease of a dead worker that has not expired yet: serve it ourselves
+            return self.worker_id
+
+        preferred = self.preferred(target.id)
+        if preferred == self.worker_id:
+            key = self.owner_key(target.id)
+            if await acquire_lease(key, self.worker_id, self.lease_ttl):
+                logger.debug(
+                    f"[COORDINATION]: Took ownership of building {target.id}"
+                )
+                self.owned[target.id] = target
+                return self.worker_id
+            # Lost a race; whoever won owns it now
+            owner = await get_by_key(self.owner_key(target.id))
+            return owner.decode() if owner else self.worker_id
+        return preferred
+
+    # Operations
+
+    async def run(
+        self, target: BuildingTarget, op: str, *, retry: bool = True, **kwargs
+    ) -> Any:
+        """
+        Run `HomeAssistantWS.<op>(**kwargs)` for the building on whichever
+        worker owns it. With `retry`, the operation is repeated once on a
+        fresh socket if the pooled one dropped, so only pass it for
+        operations that are safe to repeat.
+        """
+        if op not in OPERATIONS:
+            raise ValueError(f"Unsupported operation {op!r}")
+        if self.enabled:
+            owner = await self.owner_of(target)
+            if owner != self.worker_id:
+                return await self._forward(owner, target, op, retry, kwargs)
+        return await self._run_local(target, op, retry, kwargs)
+
+    def remote(self, owner: str, target: BuildingTarget) -> RemoteClient:
+        return RemoteClient(self, owner, target)
+
+    @staticmethod
+    async def _run_local(
+        target: BuildingTarget, op: str, retry: bool, kwargs: dict
+    ) -> Any:
+        if retry:
+            return await ha_pool.run(
+                target, lambda client: getattr(client, op)(**kwargs)
+            )
+        async with ha_pool.acquire(target) as client:
+            return await getattr(client, op)(**kwargs)
+
+    async def _forward(
+        self,
+        owner: str,
+        target: BuildingTarget,
+        op: str,
+        retry: bool = True,
+        kwargs: Optional[dict] = None,
+    ) -> Any:
+        warn_if_holding("a forwarded Home Assistant call")
+        timeout = settings.HA_COORDINATION_FORWARD_TIMEOUT
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._replies[request_id] = future
+        request = {
+            "id": request_id,
+            "reply_to": self.worker_id,
+            "deadline": time.time() + timeout,
+            "target": dataclasses.asdict(target),
+            "op": op,
+            "retry": retry,
+            "kwargs": kwargs or {},
+        }
+        key = self.REQUESTS_KEY.format(worker_id=owner)
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.rpush(key, json.dumps(request))
+                # Requests for a worker that died disappear with its list
+                pipe.expire(key, int(timeout * 2))
+                await pipe.execute()
+            reply = await asyncio.wait_for(future, timeout)
+        finally:
+            self._replies.pop(request_id, None)
+
+        if reply["ok"]:
+            return reply["result"]
+        raise _ERRORS.get(reply["kind"], Exception)(reply["error"])
+
+    async def _serve(self) -> None:
+        semaphore = asyncio.Semaphore(settings.HA_COORDINATION_CONCURRENCY)
+        key = self.REQUESTS_KEY.format(worker_id=self.worker_id)
+        while True:
+            try:
+                item = await get_redis().blpop([key], timeout=1)
+            except Exception as e:
+                logger.error(f"[COORDINATION]: Reading forwarded requests failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if item is None:
+                continue
+            await semaphore.acquire()
+            task = asyncio.create_task(self._handle(json.loads(item[1])))
+            self._handlers.add(task)
+            task.add_done_callback(self._handlers.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+
+    async def _handle(self, request: dict) -> None:
+        if request["deadline"] < time.time():
+            return  # The requester has given up
+        target = BuildingTarget(**request["target"])
+        try:
+            if request["op"] == "follow":
+                self._follow(target)
+                result = None
+            elif request["op"] not in OPERATIONS:
+                raise ValueError(f"Unsupported operation {request['op']!r}")
+            else:
+                if target.id not in self.owned:
+                    await self.owner_of(target)
+                result = await self._run_local(
+                    target, request["op"], request["retry"], request["kwargs"]
+                )
+            reply = {"id": request["id"], "ok": True, "result": result}
+        except Exception as e:
+            reply = {
+                "id": request["id"],
+                "ok": False,
+                "error": str(e),
+                "kind": _error_kind(e),
+            }
+        try:
+            channel = self.REPLIES_CHANNEL.format(worker_id=request["reply_to"])
+            await get_redis().publish(channel, json.dumps(reply, default=str))
+        except Exception as e:
+            logger.error(
+                f"[COORDINATION]: Could not reply to {request['reply_to']}: {e}"
+            )
+
+    # Events
+
+    def _follow(self, target: BuildingTarget) -> None:
+        # Imported here: the event hub itself routes through the coordinator
+        from src.core.ha_websocket.events import event_hub
+
+        relay = self._relays.get(target.id)
+        if relay is None:
+            relay = self._relays[target.id] = _Relay(self, target.id)
+            event_hub.add(target, relay)
+        relay.expires_at = time.monotonic() + self.lease_ttl
+
+    async def _stop_relay(self, building_id: int) -> None:
+        from src.core.ha_websocket.events import event_hub
+
+        relay = self._relays.pop(building_id, None)
+        if relay is not None:
+            await event_hub.remove(building_id, relay)
+
+    async def follow(self, owner: str, target: BuildingTarget) -> None:
+        """
+        Ask the owner to keep relaying the building's events; repeat before
+        the lease TTL.
+        """
+        await self._forward(owner, target, "follow")
+
+    async def subscribe_events(
+        self, building_id: int, callback: Callable[[dict], None]
+    ) -> None:
+        channel = self.EVENTS_CHANNEL.format(building_id=building_id)
+        self._channels[channel] = callback
+        if self._pubsub is not None:
+            await self._pubsub.subscribe(channel)
+
+    async def unsubscribe_events(self, building_id: int) -> None:
+        channel = self.EVENTS_CHANNEL.format(building_id=building_id)
+        if self._channels.pop(channel, None) is not None and self._pubsub is not None:
+            with contextlib.suppress(Exception):
+                await self._pubsub.unsubscribe(channel)
+
+    def _outbox_put(self, channel: str, frame: dict) -> None:
+        if self._outbox is None:
+            return
+        if self._outbox.full():
+            # Never let other workers' listeners slow down the upstream socket
+            self._outbox.get_nowait()
+        self._outbox.put_nowait((channel, frame))
+
+    async def _publish_events(self) -> None:
+        while True:
+            channel, frame = await self._outbox.get()
+            try:
+                await get_redis().publish(channel, json.dumps(frame, default=str))
+            except Exception as e:
+                logger.warning(f"[COORDINATION]: Relaying an event failed: {e}")
+
+    def _dispatch(self, replies: str, message: dict) -> None:
+        # One bad message or subscriber must not take down the connection
+        # that every forwarded call is waiting for its reply on
+        channel = message["channel"].decode()
+        try:
+            data = json.loads(message["data"])
+            if channel == replies:
+                future = self._replies.get(data["id"])
+                if future is not None and not future.done():
+                    future.set_result(data)
+            elif channel in self._channels:
+                self._channels[channel](data)
+        except Exception as e:
+            logger.error(f"[COORDINATION]: Handling a message on {channel} failed: {e}")
+
+    def _replies_channel(self) -> str:
+        return self.REPLIES_CHANNEL.format(worker_id=self.worker_id)
+
+    async def _subscribe(self) -> None:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self._replies_channel(), *self._channels)
+        except BaseException:
+            with contextlib.suppress(Exception):
+                await pubsub.close()
+            raise
+        self._pubsub = pubsub
+
+    async def _listen(self) -> None:
+        # start() subscribes before any call can be forwarded; this only
+        # consumes, subscribing again after the connection failed
+        replies = self._replies_channel()
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                while True:
+                    message = await self._pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._dispatch(replies, message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[COORDINATION]: Pub/sub connection failed: {e}")
+                await asyncio.sleep(1)
+            finally:
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    with contextlib.suppress(Exception):
+                        await pubsub.close()
+
+    # Lifecycle
+
+    async def start(self) -> None:
+        if not self.enabled or self._tasks:
+            return
+        await self._heartbeat()
+        try:
+            await self._subscribe()
+        except Exception as e:
+            # _listen keeps retrying
+            logger.error(f"[COORDINATION]: Pub/sub connection failed: {e}")
+        self._outbox = asyncio.Queue(maxsize=settings.HA_EVENT_QUEUE_SIZE)
+        self._tasks = [
+            asyncio.create_task(self._maintain()),
+            asyncio.create_task(self._serve()),
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._publish_events()),
+        ]
+        logger.info(
+            f"[COORDINATION]: Worker {self.worker_id} joined "
+            f"{len(self.workers)} workers"
+        )
+
+    async def close(self) -> None:
+        if not self._tasks:
+            return
+        for task in [*self._tasks, *self._handlers]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._handlers, return_exceptions=True)
+        self._tasks = []
+        for building_id in list(self._relays):
+            await self._stop_relay(building_id)
+        try:
+            for building_id in list(self.owned):
+                await release_lease(self.owner_key(building_id), self.worker_id)
+            await get_redis().zrem(self.WORKERS_KEY, self.worker_id)
+        except Exception as e:
+            logger.warning(f"[COORDINATION]: Could not leave cleanly: {e}")
+        self.owned.clear()
+
+
+coordinator = BuildingCoordinator()
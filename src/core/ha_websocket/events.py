@@ -0,0 +1,248 @@
+import asyncio
+import contextlib
+import itertools
+from collections import OrderedDict
+from typing import AsyncIterator, Collection, Hashable, Iterable, Optional
+
+from src.config import settings
+from src.core.ha_websocket.coordination import coordinator
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class EventSubscriber:
+    """
+    One downstream consumer (an SSE stream, a websocket client).
+
+    Frames wait in a bounded buffer. A newer `state_changed` for an entity
+    replaces the one still queued for it, and when the buffer is full the
+    oldest frame is dropped, so a slow consumer loses intermediate updates
+    instead of slowing down the building's subscription.
+    """
+
+    def __init__(
+        self,
+        entity_ids: Optional[Collection[str]] = None,
+        event_types: Optional[Collection[str]] = None,
+        maxsize: Optional[int] = None,
+    ):
+        self.entity_ids = frozenset(entity_ids) if entity_ids else None
+        self.event_types = frozenset(event_types) if event_types else None
+        self.maxsize = maxsize or settings.HA_EVENT_CLIENT_BUFFER
+        self.dropped = 0
+        self.coalesced = 0
+        self._buffer: OrderedDict[Hashable, dict] = OrderedDict()
+        self._ready = asyncio.Event()
+        self._sequence = itertools.count()
+
+    def wants(self, frame: dict) -> bool:
+        if frame["type"] != "event":
+            return True
+        if self.event_types is not None and frame["event_type"] not in self.event_types:
+            return False
+        if (
+            self.entity_ids is not None
+            and frame["data"].get("entity_id") not in self.entity_ids
+        ):
+            return False
+        return True
+
+    def push(self, frame: dict, key: Optional[Hashable] = None) -> None:
+        if key is None:
+            key = next(self._sequence)
+        if key in self._buffer:
+            self._buffer[key] = frame
+            self._buffer.move_to_end(key)
+            self.coalesced += 1
+        else:
+            if len(self._buffer) >= self.maxsize:
+                self._buffer.popitem(last=False)
+                self.dropped += 1
+            self._buffer[key] = frame
+        self._ready.set()
+
+    async def get(self) -> dict:
+        while not self._buffer:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._buffer.popitem(last=False)[1]
+
+
+def coalesce_key(frame: dict) -> Optional[Hashable]:
+    """Frames sharing a key replace each other in a subscriber's buffer."""
+    if frame["type"] == "status":
+        return ("status", frame["building_id"])
+    if frame["event_type"] == "state_changed":
+        return ("state", frame["building_id"], frame["data"].get("entity_id"))
+    return None
+
+
+class BuildingEventHub:
+    """
+    The single `subscribe_events` subscription of one building, held on its
+    pooled session while anyone is listening and re-established with backoff
+    when the connection drops. Subscribers are told with a `status` frame
+    whenever the subscription is (re)connected or lost.
+
+    With cross-worker coordination, only the building's owner subscribes;
+    other workers receive the owner's frames over Redis pub/sub.
+    """
+
+    def __init__(self, target: BuildingTarget):
+        self.target = target
+        self.subscribers: set[EventSubscriber] = set()
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self.connected = False
+
+    def _publish(self, frame: dict) -> None:
+        if frame["type"] == "status":
+            self.connected = frame["status"] == "connected"
+        key = coalesce_key(frame)
+        for subscriber in self.subscribers:
+            if subscriber.wants(frame):
+                subscriber.push(frame, key)
+
+    def _status(self, status: str, error: Optional[str] = None) -> None:
+        frame = {"type": "status", "building_id": self.target.id, "status": status}
+        if error:
+            frame["error"] = error
+        self._publish(frame)
+
+    async def _run_remote(self, owner: str) -> None:
+        """Relay the owner's frames until this worker becomes the owner."""
+        await coordinator.subscribe_events(self.target.id, self._publish)
+        try:
+            while owner != coordinator.worker_id:
+                await coordinator.follow(owner, self.target)
+                await asyncio.sleep(settings.HA_COORDINATION_HEARTBEAT)
+                owner = await coordinator.owner_of(self.target)
+        finally:
+            await coordinator.unsubscribe_events(self.target.id)
+
+    async def _run(self) -> None:
+        delay = settings.HA_POOL_BACKOFF
+        while True:
+            try:
+                if coordinator.enabled:
+                    owner = await coordinator.owner_of(self.target)
+                    if owner != coordinator.worker_id:
+                        await self._run_remote(owner)
+                        continue
+                async with ha_pool.acquire(self.target) as client:
+                    reply = await client.command({"type": "subscribe_events"})
+                    if not reply.get("success"):
+                        raise Exception(
+                            f"subscribe_events failed: {reply.get('error')}"
+                        )
+                    subscription = reply["id"]
+                    self._status("connected")
+                    delay = settings.HA_POOL_BACKOFF
+                    try:
+                        while True:
+                            message = await client.next_event()
+                            if message.get("id") != subscription:
+                                continue
+                            event = message["event"]
+                            self._publish({
+                                "type": "event",
+                                "building_id": self.target.id,
+                                "event_type": event.get("event_type"),
+                                "data": event.get("data", {}),
+                                "time_fired": event.get("time_fired"),
+                            })
+                    finally:
+                        if client.connected:
+                            with contextlib.suppress(Exception):
+                                await client.command(
+                                    {
+                                        "type": "unsubscribe_events",
+                                        "subscription": subscription,
+                                    }
+                                )
+            except Exception as e:
+                logger.warning(
+                    f"[EVENTS]: Subscription to building {self.target.id} lost ({e}), "
+                    f"retrying in {delay}s"
+                )
+                self._status("disconnected", str(e))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.HA_POOL_BACKOFF_MAX)
+
+
+class EventHub:
+    """
+    Per-process registry of building subscriptions. However many clients
+    follow a building, it sees one subscription from this process; the
+    subscription ends when its last subscriber leaves.
+    """
+
+    def __init__(self):
+        self._hubs: dict[int, BuildingEventHub] = {}
+
+    def __len__(self) -> int:
+        return len(self._hubs)
+
+    def add(self, target: BuildingTarget, subscriber) -> None:
+        """
+        Follow a building. `subscriber` may be anything with `wants(frame)`
+        and `push(frame, key)`, like `EventSubscriber`.
+        """
+        hub = self._hubs.get(target.id)
+        if hub is None:
+            hub = self._hubs[target.id] = BuildingEventHub(target)
+        # Picks up edits to the building on the next reconnect
+        hub.target = target
+        hub.subscribers.add(subscriber)
+        hub.start()
+        if hub.connected:
+            frame = {"type": "status", "building_id": target.id, "status": "connected"}
+            if subscriber.wants(frame):
+                subscriber.push(frame, coalesce_key(frame))
+
+    async def remove(self, building_id: int, subscriber) -> None:
+        hub = self._hubs.get(building_id)
+        if hub is None:
+            return
+        hub.subscribers.discard(subscriber)
+        if not hub.subscribers:
+            del self._hubs[building_id]
+            await hub.stop()
+
+    @contextlib.asynccontextmanager
+    async def subscribe(
+        self,
+        targets: Iterable[BuildingTarget],
+        entity_ids: Optional[Collection[str]] = None,
+        event_types: Optional[Collection[str]] = None,
+        maxsize: Optional[int] = None,
+    ) -> AsyncIterator[EventSubscriber]:
+        targets = list(targets)
+        subscriber = EventSubscriber(entity_ids, event_types, maxsize)
+        for target in targets:
+            self.add(target, subscriber)
+        try:
+            yield subscriber
+        finally:
+            for target in targets:
+                await self.remove(target.id, subscriber)
+
+    async def close(self) -> None:
+        for building_id in list(self._hubs):
+            await self._hubs.pop(building_id).stop()
+
+
+event_hub = EventHub()
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Collection,
+    Iterable,
+    Optional,
+)
+
+from src.config import settings
+from src.core.ha_websocket.pool import BuildingTarget, Work, ha_pool
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BuildingStatus(str, Enum):
+    OK = "ok"
+    ERROR = "error"
+    TIMEOUT = "timeout"
+    SKIPPED = "skipped"
+
+
+@dataclass
+class BuildingOutcome:
+    target: BuildingTarget
+    status: BuildingStatus
+    result: Any = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == BuildingStatus.OK
+
+    def as_response(self) -> Any:
+        if self.ok:
+            return self.result
+        return {"error": self.error, "status": self.status.value}
+
+
+TargetWork = Callable[[BuildingTarget], Awaitable[Any]]
+
+
+class FanOut:
+    """
+    Runs the same Home Assistant operation against many buildings at once.
+
+    At most `concurrency` buildings are worked on simultaneously, each one is
+    bounded by `timeout` seconds (connect + work) and the whole run is bounded
+    by `deadline` seconds. Buildings that have not answered by the deadline are
+    cancelled and reported as timed out, so callers always get partial results.
+    Buildings in `skip` (e.g. known to be down) are reported without being
+    contacted.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        skip: Collection[int] = (),
+    ):
+        self.concurrency = concurrency or settings.HA_FANOUT_CONCURRENCY
+        self.timeout = timeout if timeout is not None else settings.HA_BUILDING_TIMEOUT
+        self.deadline = (
+            deadline if deadline is not None else settings.HA_FANOUT_DEADLINE
+        )
+        self.skip = skip
+
+    async def _run_one(
+        self, target: BuildingTarget, work: TargetWork
+    ) -> BuildingOutcome:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(work(target), timeout=self.timeout)
+            status, error = BuildingStatus.OK, None
+        except asyncio.TimeoutError:
+            result, status = None, BuildingStatus.TIMEOUT
+            error = f"Timed out after {self.timeout}s"
+        except Exception as e:
+            result, status, error = None, BuildingStatus.ERROR, str(e)
+
+        elapsed = time.perf_counter() - started
+        if status != BuildingStatus.OK:
+            logger.error(f"Building {target.name!r} failed ({status.value}): {error}")
+        return BuildingOutcome(target, status, result, error, elapsed)
+
+    async def run(
+        self, targets: Iterable[BuildingTarget], work: Work
+    ) -> list[BuildingOutcome]:
+        """Run `work` with a pooled client for every building."""
+        return await self.map(targets, lambda target: ha_pool.run(target, work))
+
+    async def map(
+        self, targets: Iterable[BuildingTarget], work: TargetWork
+    ) -> list[BuildingOutcome]:
+        """Run `work(target)` for every building, e.g. to consult a cache first."""
+        targets = list(targets)
+        outcomes = {}
+        async for outcome in self.stream(targets, work):
+            outcomes[outcome.target] = outcome
+
+        # Keep the caller's ordering regardless of completion order
+        return [outcomes[target] for target in targets]
+
+    async def stream(
+        self, targets: Iterable[BuildingTarget], work: TargetWork
+    ) -> AsyncIterator[BuildingOutcome]:
+        """
+        Yield each building's outcome as soon as it completes.
+
+        Targets are pulled lazily and at most `concurrency` tasks exist at any
+        time, so memory does not grow with the size of the fleet. When the
+        deadline passes, running and not yet started buildings are yielded as
+        timed out.
+        """
+        targets = iter(targets)
+        if self.skip:
+            skipped = []
+            targets = self._without_skipped(targets, skipped)
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        running: dict[asyncio.Task, BuildingTarget] = {}
+        expired = False
+
+        try:
+            while True:
+                for target in itertools.islice(
+                    targets, self.concurrency - len(running)
+                ):
+                    running[asyncio.create_task(self._run_one(target, work))] = target
+                if self.skip:
+                    for outcome in skipped:
+                        yield outcome
+                    skipped.clear()
+                if not running:
+                    break
+
+                remaining = deadline_at - loop.time()
+                if remaining <= 0:
+                    expired = True
+                    break
+                done, _ = await asyncio.wait(
+                    running, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    running.pop(task)
+                    yield task.result()
+        finally:
+            # Also reached when the consumer stops early, e.g. a client disconnect
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        if expired:
+            logger.warning(f"Fan-out deadline of {self.deadline}s hit")
+            for target in itertools.chain(running.values(), targets):
+                yield BuildingOutcome(
+                    target,
+                    BuildingStatus.TIMEOUT,
+                    error=f"Deadline of {self.deadline}s exceeded",
+                    elapsed=self.deadline,
+                )
+            if self.skip:
+                for outcome in skipped:
+                    yield outcome
+
+    def _without_skipped(
+        self, targets: Iterable[BuildingTarget], skipped: list[BuildingOutcome]
+    ) -> Iterable[BuildingTarget]:
+        """Pass through runnable targets, collecting outcomes for skipped ones."""
+        for target in targets:
+            if target.id in self.skip:
+                skipped.append(BuildingOutcome(
+                    target, BuildingStatus.SKIPPED, error="Building is unreachable"
+                ))
+            else:
+                yield target
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from src.config import settings
+from src.core.ha_websocket.fanout import BuildingOutcome, FanOut
+from src.core.ha_websocket.main import HomeAssistantWS
+from src.core.ha_websocket.pool import BuildingTarget
+from src.core.models.building import Building
+from src.database import sessionmanager
+from src.logger import get_logger
+from src.redis import RedisData, acquire_lease, get_many, release_lease, set_many
+
+logger = get_logger(__name__)
+
+
+async def probe(target: BuildingTarget) -> dict:
+    """Open a fresh session (connect + auth) and report how long it took."""
+    client = HomeAssistantWS(
+        target.building_url, target.access_token, building_id=target.id
+    )
+    started = time.perf_counter()
+    try:
+        await client.connect()
+        return {
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "ha_version": client.ha_version,
+        }
+    finally:
+        await client.close()
+
+
+class FleetHealthMonitor:
+    """
+    Periodically handshakes with every building and records the outcome in
+    Redis, so requests can tell which buildings are down without waiting on
+    them.
+
+    Every worker runs the loop, but only the holder of a Redis lease sweeps;
+    the lease expires if its holder dies, and another worker takes over.
+    Records expire after a few missed sweeps, so an idle monitor never
+    reports stale reachability.
+    """
+
+    KEY = "ha:health:{building_id}"
+    LEADER_KEY = "ha:health:leader"
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.interval = interval or settings.HA_HEALTH_INTERVAL
+        self.concurrency = concurrency or settings.HA_HEALTH_CONCURRENCY
+        self.timeout = timeout or settings.HA_HEALTH_TIMEOUT
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def record_ttl(self) -> int:
+        return max(1, int(self.interval * 3))
+
+    @property
+    def lease_ttl(self) -> int:
+        return max(1, int(self.interval * 3))
+
+    def key(self, building_id: int) -> str:
+        return self.KEY.format(building_id=building_id)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await release_lease(self.LEADER_KEY, self.worker_id)
+            except Exception as e:
+                logger.warning(f"[HEALTH]: Could not release the sweep lease: {e}")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                if await acquire_lease(self.LEADER_KEY, self.worker_id, self.lease_ttl):
+                    await self.sweep()
+            except Exception as e:
+                logger.error(f"[HEALTH]: Sweep failed: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+
+    async def _targets(self) -> list[BuildingTarget]:
+        async with sessionmanager.read_session() as session:
+            rows = await session.execute(select(
+                Building.id, Building.name, Building.building_url, Building.access_token
+            ))
+            return [BuildingTarget.from_building(row) for row in rows]
+
+    async def sweep(self) -> list[dict]:
+        """Probe every building once and store the results."""
+        started = time.perf_counter()
+        targets = await self._targets()
+        outcomes = await FanOut(
+            concurrency=self.concurrency, timeout=self.timeout, deadline=self.interval
+        ).map(targets, probe)
+
+        previous = await self.statuses(target.id for target in targets)
+        records = [
+            self._record(outcome, previous.get(outcome.target.id))
+            for outcome in outcomes
+        ]
+        await set_many(
+            [
+                RedisData(
+                    key=self.key(record["building_id"]),
+                    value=json.dumps(record),
+                    ttl=self.record_ttl,
+                )
+                for record in records
+            ]
+        )
+
+        down = sum(1 for record in records if not record["reachable"])
+        logger.info(
+            f"[HEALTH]: Swept {len(records)} buildings in "
+            f"{time.perf_counter() - started:.1f}s, {down} unreachable"
+        )
+        return records
+
+    @staticmethod
+    def _record(outcome: BuildingOutcome, previous: Optional[dict]) -> dict:
+        now = time.time()
+        previous = previous or {}
+        record = {
+            "building_id": outcome.target.id,
+            "reachable": outcome.ok,
+            "latency_ms": None,
+            "ha_version": previous.get("ha_version"),
+            "error": outcome.error,
+            "checked_at": now,
+            "last_ok_at": previous.get("last_ok_at"),
+            "consecutive_failures": 0,
+        }
+        if outcome.ok:
+            record.update(outcome.result, last_ok_at=now)
+        else:
+            record["consecutive_failures"] = previous.get("consecutive_failures", 0) + 1
+        return record
+
+    async def statuses(self, building_ids: Iterable[int]) -> dict[int, dict]:
+        """
+        Latest record per building; buildings never (or not recently) checked
+        are absent.
+        """
+        building_ids = list(building_ids)
+        try:
+            raw = await get_many(
+                [self.key(building_id) for building_id in building_ids]
+            )
+        except Exception as e:
+            logger.warning(f"[HEALTH]: Could not read health records: {e}")
+            return {}
+        return {
+            building_id: json.loads(value)
+            for building_id, value in zip(building_ids, raw)
+            if value
+        }
+
+    async def unreachable(self, building_ids: Iterable[int]) -> set[int]:
+        """Buildings whose last check failed."""
+        statuses = await self.statuses(building_ids)
+        return {
+            building_id for building_id, record in statuses.items()
+            if not record["reachable"]
+        }
+
+
+health_monitor = FleetHealthMonitor()
@@ -1,78 +1,276 @@
+import asyncio
 import json
+import time
 import websockets
-import logging
+from websockets.exceptions import ConnectionClosed
 from typing import Optional
+from src.config import settings
+from src.database import warn_if_holding
+from src.core.ha_websocket.breaker import CircuitOpenError, guard_for
 from src.logger import get_logger
+from src.metrics import HA_COMMAND_DURATION, HA_CONNECT_DURATION, HA_ERRORS, observe
+from src.timing import span
 logger = get_logger(__name__)
 
+HA_WEBSOCKET_PORT = 8002
+
+
+def websocket_url(domain: str) -> str:
+    """
+    Websocket endpoint for a building_url: a bare host uses the default
+    port, `host:port` keeps its port and ws(s):// URLs are used as given.
+    """
+    if domain.startswith(("ws://", "wss://")):
+        return domain
+    if ":" in domain:
+        return f"ws://{domain}/api/websocket"
+    return f"ws://{domain}:{HA_WEBSOCKET_PORT}/api/websocket"
+
+
+class HomeAssistantAuthError(Exception):
+    """Raised when Home Assistant rejects the access token."""
+
+
 class HomeAssistantWS:
-    def __init__(self, domain: str, access_token: str):
+    """
+    Websocket client for the Home Assistant API.
+
+    After `connect()` a background reader task owns the socket: replies are
+    routed to the command awaiting their `id`, so any number of commands can
+    be in flight at once, and everything else (events, unknown frames) is put
+    on the bounded `events` queue.
+
+    Connects and commands go through the building's circuit breaker and use
+    timeouts adapted to its observed latency (see `breaker.py`).
+    """
+
+    def __init__(
+        self, domain: str, access_token: str, building_id: Optional[int] = None
+    ):
         self.domain = domain
         self.access_token = access_token
+        # Metrics label; the pool always knows the building, ad-hoc clients may not
+        self.building = str(building_id) if building_id is not None else domain
+        self.guard = guard_for(self.building)
         self.websocket: Optional[websockets.WebSocketClientProtocol] = None
+        self.ha_version: Optional[str] = None
         self.message_id = 1
+        self.events: asyncio.Queue = asyncio.Queue(maxsize=settings.HA_EVENT_QUEUE_SIZE)
+        self.events_dropped = 0
+        self._pending: dict[int, asyncio.Future] = {}
+        self._send_lock = asyncio.Lock()
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return (
+            self.websocket is not None
+            and self.websocket.state.name == "OPEN"
+            and self._reader is not None
+            and not self._reader.done()
+        )
+
+    async def _handshake(self) -> dict:
+        auth_required = json.loads(await self.websocket.recv())
+        self.ha_version = auth_required.get("ha_version")
+        logger.info("Authentication required")
+        auth_message = {"type": "auth", "access_token": self.access_token}
+        await self.websocket.send(json.dumps(auth_message))
+        return json.loads(await self.websocket.recv())
 
     async def connect(self) -> None:
+        # Each phase is bounded by the building's adaptive connect timeout, and
+        # buildings whose circuit is open fail fast with CircuitOpenError
+        warn_if_holding("Home Assistant connect")
+        latency = self.guard.connect_latency
+        timeout = latency.timeout()
+        phase = "connect"
+        started = time.perf_counter()
         try:
-            print('------connecting----')
-            self.websocket = await websockets.connect(f"ws://{self.domain}:8002/api/websocket")
-            print('----test--',self.websocket)
-            auth_required = await self.websocket.recv()
-            logger.info("Authentication required")
-            auth_message = {"type": "auth", "access_token": self.access_token}
-            await self.websocket.send(json.dumps(auth_message))
-            auth_response = json.loads(await self.websocket.recv())
+            with self.guard.breaker.guard():
+                logger.debug("Connecting to %s", self.domain)
+                with observe(
+                    HA_CONNECT_DURATION, building=self.building, phase="connect"
+                ), span("ha-connect"):
+                    self.websocket = await asyncio.wait_for(
+                        websockets.connect(websocket_url(self.domain)), timeout
+                    )
+                phase = "auth"
+                with observe(
+                    HA_CONNECT_DURATION, building=self.building, phase="auth"
+                ), span("ha-auth"):
+                    auth_response = await asyncio.wait_for(self._handshake(), timeout)
+            latency.observe(time.perf_counter() - started)
             if auth_response.get("type") == "auth_ok":
                 logger.info("Authentication successful")
             else:
-                raise Exception("Authentication failed")
+                raise HomeAssistantAuthError("Authentication failed")
+        except CircuitOpenError:
+            raise
         except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                latency.expired(timeout)
+            HA_ERRORS.labels(building=self.building, phase=phase).inc()
             logger.error(f"Connection failed: {e}")
             if self.websocket:
                 await self.websocket.close()
             raise
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        error: Exception = Exception("Connection closed")
+        try:
+            while True:
+                message = json.loads(await self.websocket.recv())
+                self._dispatch(message)
+        except ConnectionClosed as e:
+            error = e
+        except Exception as e:
+            logger.error(f"Websocket reader for {self.domain} failed: {e}")
+            error = e
+        finally:
+            # Nobody else will ever answer the commands still in flight
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
 
-    async def create_user(self, username: str, password: str, display_name: Optional[str] = None,
-                          local_only: bool = False, administrator: bool = False) -> dict:
-        if not self.websocket:
+    def _dispatch(self, message: dict) -> None:
+        future = None
+        if message.get("type") != "event":
+            future = self._pending.pop(message.get("id"), None)
+        if future is not None:
+            if not future.done():
+                future.set_result(message)
+            return
+        if message.get("type") in ("result", "pong"):
+            # Late reply to a command that already timed out
+            logger.debug(
+                "Dropping unmatched reply %s from %s", message.get("id"), self.domain
+            )
+            return
+
+        if self.events.full():
+            self.events.get_nowait()
+            self.events_dropped += 1
+        self.events.put_nowait(message)
+
+    async def next_event(self) -> dict:
+        """
+        Next frame from the `events` queue. Raises ConnectionError once the
+        connection is gone and the queue has been drained.
+        """
+        if not self.events.empty():
+            return self.events.get_nowait()
+        if self._reader is None or self._reader.done():
+            raise ConnectionError(f"Connection to {self.domain} closed")
+
+        getter = asyncio.ensure_future(self.events.get())
+        try:
+            await asyncio.wait(
+                {getter, self._reader}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if getter.done() and not getter.cancelled():
+            return getter.result()
+        raise ConnectionError(f"Connection to {self.domain} closed")
+
+    async def command(self, message: dict, timeout: Optional[float] = None) -> dict:
+        """Send a command and wait for the reply carrying its `id`."""
+        if not self.connected:
             raise Exception("Not connected")
+
+        warn_if_holding("Home Assistant command")
+        latency = self.guard.command_latency
+        wait = timeout or latency.timeout()
+        with self.guard.breaker.guard():
+            future = asyncio.get_running_loop().create_future()
+            # Home Assistant requires ids to increase in the order they are sent
+            async with self._send_lock:
+                message_id = self.message_id
+                self.message_id += 1
+                self._pending[message_id] = future
+                try:
+                    with span("ha-send"):
+                        await self.websocket.send(
+                            json.dumps({**message, "id": message_id})
+                        )
+                except BaseException:
+                    self._pending.pop(message_id, None)
+                    raise
+
+            started = time.perf_counter()
+            try:
+                with span("ha-recv"):
+                    reply = await asyncio.wait_for(future, timeout=wait)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and timeout is None:
+                    latency.expired(wait)
+                HA_ERRORS.labels(building=self.building, phase="command").inc()
+                raise
+            finally:
+                self._pending.pop(message_id, None)
+                HA_COMMAND_DURATION.labels(
+                    building=self.building, command=message.get("type")
+                ).observe(time.perf_counter() - started)
+            # An explicit timeout marks an unusual command (a large get_states),
+            # which would skew the building's estimate for everyday ones
+            if timeout is None:
+                latency.observe(time.perf_counter() - started)
+            return reply
+
+    async def create_user(
+        self,
+        username: str,
+        password: str,
+        display_name: Optional[str] = None,
+        local_only: bool = False,
+        administrator: bool = False,
+        timeout: Optional[float] = None,
+    ) -> dict:
         try:
             name = display_name if display_name else username
             group_ids = ["system-admin"] if administrator else ["system-users"]
-            create_user_message = {"id": self.message_id, "type": "config/auth/create", "name": name, "group_ids": group_ids, "local_only": local_only}
-            await self.websocket.send(json.dumps(create_user_message))
-            user_response = await self.websocket.recv()
-            logger.info("Create User Response: %s", user_response)
-            user_data = json.loads(user_response)
+            create_user_message = {
+                "type": "config/auth/create",
+                "name": name,
+                "group_ids": group_ids,
+                "local_only": local_only,
+            }
+            user_data = await self.command(create_user_message, timeout=timeout)
+            logger.info("Create User Response: %s", user_data)
+            if "error" in user_data:
+                raise Exception(f"Error creating user: {user_data['error']}")
             user_id = user_data.get("result", {}).get("user", {}).get("id")
-            self.message_id += 1
-            message = {"id": self.message_id, "type": "config/auth_provider/homeassistant/create", "user_id": user_id, "username": username, "password": password}
-            self.message_id += 1
-            await self.websocket.send(json.dumps(message))
-            response = json.loads(await self.websocket.recv())
+            message = {
+                "type": "config/auth_provider/homeassistant/create",
+                "user_id": user_id,
+                "username": username,
+                "password": password,
+            }
+            response = await self.command(message, timeout=timeout)
             if "error" in response:
                 raise Exception(f"Error creating user: {response['error']}")
             return response
         except Exception as e:
             logger.error(f"Failed to create user: {e}")
             raise
-    async def list_persons(self) -> dict:
+
+    async def list_persons(self, timeout: Optional[float] = None) -> dict:
         """
-        Connects to the Home Assistant websocket to request a list of persons.
+        Requests the list of users from the Home Assistant websocket.
         """
-        if not self.websocket:
-            raise Exception("Not connected")
         try:
-            # Construct the person/list message.
-            message = {"id": self.message_id, "type": "config/auth/list"}
-            self.message_id += 1
-            await self.websocket.send(json.dumps(message))
-            # Wait for and return the response.
-            response = json.loads(await self.websocket.recv())
-            return response
+            return await self.command({"type": "config/auth/list"}, timeout=timeout)
         except Exception as e:
             logger.error(f"Failed to list persons: {e}")
             raise
+
     async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
         if self.websocket:
             await self.websocket.close()
@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from websockets.exceptions import ConnectionClosed
+
+from src.config import settings
+from src.core.ha_websocket.breaker import CircuitOpenError, forget_guard
+from src.core.ha_websocket.main import HomeAssistantAuthError, HomeAssistantWS
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class BuildingTarget:
+    """Plain snapshot of a building, safe to share between concurrent tasks."""
+
+    id: int
+    name: str
+    building_url: str
+    access_token: str
+
+    @classmethod
+    def from_building(cls, building) -> "BuildingTarget":
+        return cls(
+            id=building.id,
+            name=building.name,
+            building_url=building.building_url,
+            access_token=building.access_token,
+        )
+
+
+Work = Callable[[HomeAssistantWS], Awaitable[Any]]
+
+
+class _PooledSession:
+    def __init__(self, target: BuildingTarget, client: HomeAssistantWS):
+        self.client = client
+        self.fingerprint = (target.building_url, target.access_token)
+        self.last_used = time.monotonic()
+        self.in_use = 0
+
+    def matches(self, target: BuildingTarget) -> bool:
+        return self.fingerprint == (target.building_url, target.access_token)
+
+
+class HAConnectionPool:
+    """
+    Per-process pool of authenticated Home Assistant websocket sessions.
+
+    Sessions are keyed by building id and reused across requests. The pool
+    holds at most `max_connections` sockets, evicting the least recently used
+    idle one when full, and closes sessions idle for longer than
+    `idle_timeout` seconds. Dropped sockets are reconnected with exponential
+    backoff the next time the building is used.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        connect_retries: Optional[int] = None,
+    ):
+        self.max_connections = max_connections or settings.HA_POOL_MAX_CONNECTIONS
+        self.idle_timeout = idle_timeout or settings.HA_POOL_IDLE_TIMEOUT
+        self.connect_retries = (
+            connect_retries if connect_retries is not None
+            else settings.HA_POOL_CONNECT_RETRIES
+        )
+        self._sessions: OrderedDict[int, _PooledSession] = OrderedDict()
+        self._connect_locks: dict[int, asyncio.Lock] = {}
+        self._janitor: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def _connect_with_backoff(self, target: BuildingTarget) -> HomeAssistantWS:
+        delay = settings.HA_POOL_BACKOFF
+        for attempt in range(self.connect_retries + 1):
+            client = HomeAssistantWS(
+                domain=target.building_url,
+                access_token=target.access_token,
+                building_id=target.id,
+            )
+            try:
+                await client.connect()
+                return client
+            except (HomeAssistantAuthError, CircuitOpenError):
+                raise
+            except Exception as e:
+                if attempt == self.connect_retries:
+                    raise
+                logger.warning(
+                    f"[HA POOL]: Connecting to building {target.id} failed ({e}), "
+                    f"retrying in {delay}s"
+                )
+            except BaseException:
+                await client.close()
+                raise
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.HA_POOL_BACKOFF_MAX)
+
+    async def _get_session(self, target: BuildingTarget) -> _PooledSession:
+        """
+        The building's session, connecting it if needed, already counted as
+        in use (so enforcing the limit can't evict it); the caller releases it.
+        """
+        session = self._sessions.get(target.id)
+        if session and session.matches(target) and session.client.connected:
+            self._sessions.move_to_end(target.id)
+            session.in_use += 1
+            return session
+
+        lock = self._connect_locks.setdefault(target.id, asyncio.Lock())
+        async with lock:
+            # Another coroutine may have reconnected while we were waiting
+            session = self._sessions.get(target.id)
+            if session and session.matches(target) and session.client.connected:
+                self._sessions.move_to_end(target.id)
+                session.in_use += 1
+                return session
+            if session:
+                await self._discard(target.id)
+
+            client = await self._connect_with_backoff(target)
+            session = _PooledSession(target, client)
+            session.in_use += 1
+            self._sessions[target.id] = session
+            logger.debug("[HA POOL]: Opened session for building %s", target.id)
+
+        try:
+            await self._enforce_limit()
+        except BaseException:
+            session.in_use -= 1
+            raise
+        return session
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, target: BuildingTarget) -> AsyncIterator[HomeAssistantWS]:
+        """
+        Yield an authenticated client for the building, reusing a pooled
+        socket. The socket is shared: concurrent holders may have commands in
+        flight on it at the same time.
+        """
+        session = await self._get_session(target)
+        try:
+            yield session.client
+        except ConnectionClosed:
+            await self.invalidate(target.id)
+            raise
+        finally:
+            session.in_use -= 1
+            session.last_used = time.monotonic()
+
+    async def run(self, target: BuildingTarget, work: Work) -> Any:
+        """
+        Run `work` on a pooled client. If the pooled socket turns out to have
+        dropped, the work is retried once on a fresh connection, so `work` must
+        be safe to repeat.
+        """
+        try:
+            async with self.acquire(target) as client:
+                return await work(client)
+        except ConnectionClosed:
+            logger.info(
+                f"[HA POOL]: Session for building {target.id} dropped, reconnecting"
+            )
+        async with self.acquire(target) as client:
+            return await work(client)
+
+    def recently_used(self) -> dict[int, float]:
+        """Wall-clock time each pooled building was last used."""
+        offset = time.time() - time.monotonic()
+        return {
+            building_id: session.last_used + offset
+            for building_id, session in self._sessions.items()
+        }
+
+    async def _discard(self, building_id: int) -> None:
+        session = self._sessions.pop(building_id, None)
+        if session:
+            with contextlib.suppress(Exception):
+                await session.client.close()
+
+    async def invalidate(self, building_id: int) -> None:
+        """Drop the pooled session, e.g. after the building was edited or deleted."""
+        if building_id in self._sessions:
+            logger.debug("[HA POOL]: Dropping session for building %s", building_id)
+        # The connect lock stays: another coroutine may be holding or waiting
+        # on it, and a fresh one would let a second connect run alongside
+        await self._discard(building_id)
+
+    async def forget(self, building_id: int) -> None:
+        """
+        Drop the pooled session and the breaker and latency estimates, after
+        the building was edited or deleted.
+        """
+        await self.invalidate(building_id)
+        forget_guard(str(building_id))
+
+    async def _enforce_limit(self) -> None:
+        # Oldest entries first; sessions serving a request are never evicted
+        for building_id in list(self._sessions):
+            if len(self._sessions) <= self.max_connections:
+                break
+            if self._sessions[building_id].in_use == 0:
+                await self._discard(building_id)
+
+    async def evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        for building_id, session in list(self._sessions.items()):
+            if session.in_use == 0 and session.last_used < cutoff:
+                await self._discard(building_id)
+
+    async def _janitor_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"[HA POOL]: Idle eviction failed: {e}")
+
+    def start(self) -> None:
+        if self._janitor is None:
+            self._janitor = asyncio.create_task(self._janitor_loop())
+
+    async def close(self) -> None:
+        if self._janitor:
+            self._janitor.cancel()
+            self._janitor = None
+        for building_id in list(self._sessions):
+            await self._discard(building_id)
+        self._connect_locks.clear()
+        logger.info("[HA POOL]: All Home Assistant sessions closed.")
+
+
+ha_pool = HAConnectionPool()
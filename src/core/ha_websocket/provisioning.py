@@ -0,0 +1,92 @@
+import asyncio
+from collections import defaultdict
+from typing import Optional
+
+from src.config import settings
+from src.core.ha_websocket.coordination import coordinator
+from src.core.ha_websocket.fanout import FanOut
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+from src.core.schemas.user_schema import BulkBuildingUserInputField
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _report(index: int, item: BulkBuildingUserInputField,
+            error: Optional[str] = None) -> dict:
+    return {
+        "index": index,
+        "building_id": item.building_id,
+        "username": item.username,
+        "success": error is None,
+        "error": error,
+    }
+
+
+async def provision_users(
+    targets: dict[int, BuildingTarget],
+    items: list[BulkBuildingUserInputField],
+) -> list[dict]:
+    """
+    Create many users across many buildings.
+
+    Buildings are worked on concurrently through the fan-out engine. Each
+    building uses one pooled connection (on the worker owning it, with
+    coordination enabled), with up to HA_BULK_PER_BUILDING_CONCURRENCY
+    creations in flight on it at once.
+    Returns one report per input item, in input order.
+    """
+    reports: list[Optional[dict]] = [None] * len(items)
+    by_building: dict[int, list[int]] = defaultdict(list)
+    for index, item in enumerate(items):
+        if item.building_id in targets:
+            by_building[item.building_id].append(index)
+        else:
+            reports[index] = _report(index, item, error="Building not found.")
+
+    async def provision_building(target: BuildingTarget) -> None:
+        if coordinator.enabled:
+            owner = await coordinator.owner_of(target)
+            if owner != coordinator.worker_id:
+                await create_all(target, coordinator.remote(owner, target))
+                return
+        async with ha_pool.acquire(target) as client:
+            await create_all(target, client)
+
+    async def create_all(target: BuildingTarget, client) -> None:
+        semaphore = asyncio.Semaphore(settings.HA_BULK_PER_BUILDING_CONCURRENCY)
+
+        async def create(index: int) -> None:
+            item = items[index]
+            async with semaphore:
+                try:
+                    await client.create_user(
+                        username=item.username,
+                        password=item.password,
+                        display_name=item.display_name,
+                        local_only=bool(item.local_access_only),
+                        administrator=bool(item.administrator),
+                    )
+                    reports[index] = _report(index, item)
+                except Exception as e:
+                    reports[index] = _report(index, item, error=str(e))
+
+        await asyncio.gather(*(create(index) for index in by_building[target.id]))
+
+    fanout = FanOut(
+        timeout=settings.HA_BULK_BUILDING_TIMEOUT,
+        deadline=settings.HA_BULK_DEADLINE,
+    )
+    outcomes = await fanout.map(
+        [targets[building_id] for building_id in by_building], provision_building
+    )
+
+    # Items of a building that failed or timed out as a whole
+    for outcome in outcomes:
+        for index in by_building[outcome.target.id]:
+            if reports[index] is None:
+                reports[index] = _report(
+                    index, items[index], error=outcome.error or "Not attempted"
+                )
+
+    return reports
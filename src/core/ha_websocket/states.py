@@ -0,0 +1,248 @@
+import asyncio
+import contextlib
+import time
+from sys import intern
+from typing import Optional
+
+import orjson
+
+from src.config import settings
+from src.core.ha_websocket.coordination import coordinator
+from src.core.ha_websocket.events import event_hub
+from src.core.ha_websocket.pool import BuildingTarget
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class EntityState:
+    """
+    One entity's current state. Entity ids and state values are interned
+    (a fleet has few distinct "on"/"off"/"unavailable" values) and the
+    attributes are kept as one JSON blob instead of a dict per entity.
+    """
+
+    __slots__ = ("entity_id", "state", "attributes", "last_changed", "last_updated")
+
+    def __init__(
+        self,
+        entity_id: str,
+        state: str,
+        attributes: bytes,
+        last_changed: str,
+        last_updated: str,
+    ):
+        self.entity_id = entity_id
+        self.state = state
+        self.attributes = attributes
+        self.last_changed = last_changed
+        self.last_updated = last_updated
+
+    @classmethod
+    def from_ha(cls, raw: dict) -> "EntityState":
+        last_changed = raw.get("last_changed")
+        last_updated = raw.get("last_updated")
+        return cls(
+            intern(raw["entity_id"]),
+            intern(raw.get("state") or ""),
+            orjson.dumps(raw.get("attributes") or {}),
+            last_changed,
+            # Usually identical; share the string
+            last_changed if last_updated == last_changed else last_updated,
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "entity_id": self.entity_id,
+            "state": self.state,
+            "attributes": orjson.loads(self.attributes),
+            "last_changed": self.last_changed,
+            "last_updated": self.last_updated,
+        }
+
+
+class BuildingStateCache:
+    """
+    All entity states of one building, seeded with `get_states` and then
+    kept current from `state_changed` events (it subscribes to the
+    building's event hub). Every (re)connect of the subscription triggers a
+    resync, as events may have been missed; events arriving during a resync
+    are replayed on top of the snapshot.
+
+    `status` is "syncing" until the first snapshot, "live" while events
+    flow, and "disconnected" when the served states may be out of date.
+    """
+
+    def __init__(self, target: BuildingTarget):
+        self.target = target
+        self.entities: dict[str, EntityState] = {}
+        self.status = "syncing"
+        self.synced_at: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self.last_read = time.monotonic()
+        self.ready = asyncio.Event()
+        self._backlog: Optional[list[dict]] = None
+        self._sync_task: Optional[asyncio.Task] = None
+
+    @property
+    def stale(self) -> bool:
+        return self.status != "live"
+
+    def meta(self) -> dict:
+        return {
+            "building_id": self.target.id,
+            "status": self.status,
+            "stale": self.stale,
+            "synced_at": self.synced_at,
+            "updated_at": self.updated_at,
+        }
+
+    # Event hub subscriber interface
+    def wants(self, frame: dict) -> bool:
+        return frame["type"] == "status" or frame["event_type"] == "state_changed"
+
+    def push(self, frame: dict, key=None) -> None:
+        if frame["type"] == "status":
+            if frame["status"] == "connected":
+                self.resync()
+            elif self.status == "live":
+                self.status = "disconnected"
+            return
+        if self._backlog is not None:
+            self._backlog.append(frame["data"])
+            if len(self._backlog) > settings.HA_STATES_BACKLOG:
+                # A newer snapshot covers everything buffered so far
+                self.resync()
+            return
+        self._apply(frame["data"])
+
+    def _apply(self, data: dict) -> None:
+        entity_id = data.get("entity_id")
+        new_state = data.get("new_state")
+        if new_state is None:
+            self.entities.pop(entity_id, None)
+        else:
+            self.entities[intern(entity_id)] = EntityState.from_ha(new_state)
+        self.updated_at = time.time()
+
+    def resync(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+        if self.status == "live":
+            self.status = "disconnected"
+        self._backlog = []
+        self._sync_task = asyncio.create_task(self._sync())
+
+    async def _sync(self) -> None:
+        delay = settings.HA_POOL_BACKOFF
+        while True:
+            started = time.perf_counter()
+            try:
+                reply = await coordinator.run(
+                    self.target,
+                    "command",
+                    message={"type": "get_states"},
+                    timeout=settings.HA_STATES_SYNC_TIMEOUT,
+                )
+                if not reply.get("success"):
+                    raise Exception(f"get_states failed: {reply.get('error')}")
+                break
+            except Exception as e:
+                logger.warning(
+                    f"[STATES]: Sync of building {self.target.id} failed ({e}), "
+                    f"retrying in {delay}s"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.HA_POOL_BACKOFF_MAX)
+
+        self.entities = {
+            intern(raw["entity_id"]): EntityState.from_ha(raw)
+            for raw in reply["result"]
+        }
+        backlog, self._backlog = self._backlog, None
+        for data in backlog:
+            self._apply(data)
+        self.status = "live"
+        self.synced_at = self.updated_at = time.time()
+        self.ready.set()
+        self._sync_task = None
+        logger.info(
+            f"[STATES]: Synced {len(self.entities)} entities of building "
+            f"{self.target.id} in {time.perf_counter() - started:.2f}s"
+        )
+
+    async def close(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sync_task
+            self._sync_task = None
+
+
+class EntityStateRegistry:
+    """
+    Per-process state caches, created on first read and dropped (ending
+    their event subscription) after `idle_timeout` seconds without reads.
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = None):
+        self.idle_timeout = idle_timeout or settings.HA_STATES_IDLE_TIMEOUT
+        self._caches: dict[int, BuildingStateCache] = {}
+        self._janitor: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._caches)
+
+    async def get(self, target: BuildingTarget) -> BuildingStateCache:
+        """The building's cache, waiting for its first snapshot if needed."""
+        cache = self._caches.get(target.id)
+        if cache is not None and cache.target != target:
+            # The building was edited
+            await self._drop(target.id)
+            cache = None
+        if cache is None:
+            cache = self._caches[target.id] = BuildingStateCache(target)
+            event_hub.add(target, cache)
+
+        cache.last_read = time.monotonic()
+        await asyncio.wait_for(
+            cache.ready.wait(), timeout=settings.HA_STATES_SYNC_TIMEOUT
+        )
+        return cache
+
+    async def _drop(self, building_id: int) -> None:
+        cache = self._caches.pop(building_id, None)
+        if cache is not None:
+            await event_hub.remove(building_id, cache)
+            await cache.close()
+
+    async def evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        for building_id, cache in list(self._caches.items()):
+            if cache.last_read < cutoff:
+                logger.debug(
+                    "[STATES]: Dropping idle state cache of building %s", building_id
+                )
+                await self._drop(building_id)
+
+    async def _janitor_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"[STATES]: Idle eviction failed: {e}")
+
+    def start(self) -> None:
+        if self._janitor is None:
+            self._janitor = asyncio.create_task(self._janitor_loop())
+
+    async def close(self) -> None:
+        if self._janitor:
+            self._janitor.cancel()
+            self._janitor = None
+        for building_id in list(self._caches):
+            await self._drop(building_id)
+
+
+state_cache = EntityStateRegistry()
@@ -1,12 +1,25 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import Column, Integer, func, DateTime
+from sqlalchemy import Column, Integer, func, DateTime, delete, insert, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
 from src.constants import DB_NAMING_CONVENTION
+from src.exceptions import BadRequest
 from sqlalchemy import MetaData
 from sqlalchemy.ext.declarative import declarative_base
 
+# Orderings `list` can paginate by, with the columns making up each key
+KEYSET_ORDERINGS = {
+    "id": ("id",),
+    "created_at": ("created_at", "id"),
+}
+
 
 @as_declarative()
 class BaseModel:
@@ -20,10 +33,26 @@ class BaseModel:
 
     @classmethod
     async def create(cls, db: AsyncSession, **kwargs):
-        instance = cls(**kwargs)
-        db.add(instance)
+        # INSERT ... RETURNING loads server defaults without a refresh
+        instance = await db.scalar(insert(cls).values(**kwargs).returning(cls))
+        await db.commit()
+        return instance
+
+    @classmethod
+    async def create_if_absent(
+        cls, db: AsyncSession, index_elements: Sequence[str], **kwargs
+    ):
+        """
+        INSERT ... ON CONFLICT DO NOTHING RETURNING, in one round trip.
+        Returns None when a row with the same unique `index_elements` exists.
+        """
+        instance = await db.scalar(
+            pg_insert(cls)
+            .values(**kwargs)
+            .on_conflict_do_nothing(index_elements=list(index_elements))
+            .returning(cls)
+        )
         await db.commit()
-        await db.refresh(instance)
         return instance
 
     @classmethod
@@ -34,33 +63,189 @@ class BaseModel:
             return None
         return instance
 
+    @classmethod
+    async def get_many(cls, db: AsyncSession, ids):
+        result = await db.execute(select(cls).where(cls.id.in_(ids)))
+        return result.scalars().all()
+
     @classmethod
     async def update(cls, db: AsyncSession, id: int, **kwargs):
-        try:
-            instance = await db.get(cls, id)
-        except NoResultFound:
+        instance = await db.scalar(
+            update(cls)
+            .where(cls.id == id)
+            .values(**kwargs)
+            .returning(cls)
+            .execution_options(populate_existing=True)
+        )
+        if instance is None:
             return None
-        for key, value in kwargs.items():
-            setattr(instance, key, value)
-        await db.merge(instance)
         await db.commit()
-        await db.refresh(instance)
         return instance
 
     @classmethod
     async def delete(cls, db: AsyncSession, id: int):
-        try:
-            instance = await db.get(cls, id)
-        except NoResultFound:
+        deleted_id = await db.scalar(
+            delete(cls).where(cls.id == id).returning(cls.id)
+        )
+        if deleted_id is None:
             return False
-        await db.delete(instance)
         await db.commit()
         return True
 
     @classmethod
-    async def list(cls, db: AsyncSession):
-        result = await db.execute(select(cls))
-        return result.scalars().all()
+    async def bulk_create(
+        cls, db: AsyncSession, rows: Sequence[dict], *, returning: bool = True
+    ):
+        """
+        Insert many rows at once. SQLAlchemy batches the parameter sets into
+        multi-row INSERT ... VALUES statements instead of one per row.
+        """
+        if not rows:
+            return []
+        statement = insert(cls)
+        if returning:
+            instances = (await db.scalars(statement.returning(cls), rows)).all()
+        else:
+            await db.execute(statement, rows)
+            instances = []
+        await db.commit()
+        return instances
+
+    @classmethod
+    async def bulk_upsert(
+        cls,
+        db: AsyncSession,
+        rows: Sequence[dict],
+        *,
+        index_elements: Sequence[str] = ("id",),
+        update_fields: Optional[Sequence[str]] = None,
+        returning: bool = True,
+    ):
+        """
+        INSERT ... ON CONFLICT (index_elements) DO UPDATE for many rows at
+        once. By default every column given in the first row, other than the
+        conflict target, is overwritten.
+        """
+        if not rows:
+            return []
+        statement = pg_insert(cls)
+        fields = update_fields or [key for key in rows[0] if key not in index_elements]
+        assignments = {field: statement.excluded[field] for field in fields}
+        assignments.setdefault("updated_at", func.now())
+        statement = statement.on_conflict_do_update(
+            index_elements=list(index_elements), set_=assignments
+        )
+
+        if returning:
+            result = await db.scalars(
+                statement.returning(cls).execution_options(populate_existing=True), rows
+            )
+            instances = result.all()
+        else:
+            await db.execute(statement, rows)
+            instances = []
+        await db.commit()
+        return instances
+
+    @classmethod
+    async def version(cls, db: AsyncSession) -> tuple:
+        """
+        Cheap marker that changes whenever rows are added, edited or deleted:
+        the row count and the highest id, creation and update times.
+        """
+        result = await db.execute(
+            select(
+                func.count(cls.id),
+                func.max(cls.id),
+                func.max(cls.created_at),
+                func.max(cls.updated_at),
+            )
+        )
+        return tuple(result.one())
+
+    @classmethod
+    def column_names(cls):
+        return [column.name for column in cls.__table__.columns]
+
+    @classmethod
+    def _column(cls, name: str):
+        if name not in cls.__table__.columns:
+            raise BadRequest(f"Unknown field {name!r}.")
+        return cls.__table__.columns[name]
+
+    @classmethod
+    def _keyset(cls, order_by: str):
+        descending = order_by.startswith("-")
+        name = order_by.lstrip("-")
+        if name not in KEYSET_ORDERINGS:
+            raise BadRequest(f"Cannot paginate by {name!r}.")
+        return [cls._column(key) for key in KEYSET_ORDERINGS[name]], descending
+
+    @classmethod
+    def encode_cursor(cls, row, order_by: str = "id") -> str:
+        """Opaque cursor pointing just past `row` in the given ordering."""
+        keys, _ = cls._keyset(order_by)
+        values = [getattr(row, key.name) for key in keys]
+        values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    @classmethod
+    def decode_cursor(cls, cursor: str, order_by: str = "id") -> list:
+        keys, _ = cls._keyset(order_by)
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            assert isinstance(values, list) and len(values) == len(keys)
+            return [
+                datetime.fromisoformat(v) if isinstance(key.type, DateTime) else v
+                for key, v in zip(keys, values)
+            ]
+        except Exception:
+            raise BadRequest("Invalid cursor.")
+
+    @classmethod
+    async def list(
+        cls,
+        db: AsyncSession,
+        *,
+        columns: Optional[Sequence[str]] = None,
+        filters: Optional[dict[str, Any]] = None,
+        order_by: str = "id",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ):
+        """
+        List rows, optionally one keyset page at a time.
+
+        `order_by` is `id` or `created_at`, prefixed with `-` for descending
+        order, and `cursor` comes from `encode_cursor` on the last row of the
+        previous page, so every page is an index range scan instead of an
+        OFFSET. `filters` are equality matches. With `columns`, lightweight
+        rows holding just those columns (plus the ordering keys) are returned
+        instead of ORM entities.
+        """
+        keys, descending = cls._keyset(order_by)
+
+        if columns:
+            selected = [cls._column(name) for name in columns]
+            selected += [key for key in keys if key.name not in columns]
+            query = select(*selected)
+        else:
+            query = select(cls)
+
+        for name, value in (filters or {}).items():
+            query = query.where(cls._column(name) == value)
+
+        if cursor:
+            position = tuple_(*keys)
+            after = tuple_(*cls.decode_cursor(cursor, order_by))
+            query = query.where(position < after if descending else position > after)
+
+        query = query.order_by(*[key.desc() if descending else key for key in keys])
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await db.execute(query)
+        return result.all() if columns else result.scalars().all()
 
     @classmethod
     async def filter_by(cls, db: AsyncSession, **kwargs):
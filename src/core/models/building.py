@@ -1,9 +1,14 @@
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Index, String
 from src.core.models.base_model import Model
 
 
 class Building(Model):
     __tablename__ = 'building'
+    __table_args__ = (
+        # Keyset pagination by creation time
+        Index("building_created_at_idx", "created_at", "id"),
+        Index("building_building_url_idx", "building_url", unique=True),
+    )
 
     name = Column(String, nullable=True)
     building_url = Column(String, nullable=True)
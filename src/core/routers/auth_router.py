@@ -1,12 +1,46 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import AsyncIterator, List, Literal, Optional
+
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, Request, Path, HTTPException
-from src.core.ha_websocket.main import HomeAssistantWS
+from fastapi import APIRouter, Depends, Request, Path, HTTPException, Query, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocketDisconnect
+from src.core.ha_websocket.cache import CacheStatus, list_users_cached, user_cache
+from src.core.ha_websocket.coordination import coordinator
+from src.core.ha_websocket.events import event_hub
+from src.core.ha_websocket.fanout import BuildingStatus, FanOut
+from src.core.ha_websocket.health import health_monitor
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+from src.core.ha_websocket.states import BuildingStateCache, state_cache
+from src.core.ha_websocket.provisioning import provision_users
 from src.core.models.building import Building
-from src.database import yield_db_session
+from src.core.versioning import buildings_version
+from src.config import settings
+from src.database import (
+    db_scope,
+    sessionmanager,
+    yield_db_read_session,
+    yield_db_session,
+)
 from src.exceptions import BadRequest, NotFound
-from src.responses import success
+from src.responses import (
+    content_hash,
+    etag_matches,
+    make_etag,
+    not_modified,
+    success,
+    with_etag,
+)
 from src.logger import get_logger
-from src.core.schemas.user_schema import BuildingInputField,BuildingUserInputField
+from src.core.schemas.user_schema import (
+    BuildingInputField,
+    BuildingUserInputField,
+    BulkUserProvisionInputField,
+)
 
 logger = get_logger(__name__)
 
@@ -15,10 +49,51 @@ router = APIRouter()
 
 @router.get('/building/list', description="List All Buildings")
 async def list_buildings(
-    db_session: AsyncSession = Depends(yield_db_session)
+    request: Request,
+    limit: Optional[int] = Query(
+        None, ge=1, le=1000, description="Page size, all rows when omitted"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor of the previous page"
+    ),
+    order_by: Literal["id", "-id", "created_at", "-created_at"] = Query("id"),
+    fields: Optional[str] = Query(
+        None, description="Comma separated columns to return"
+    ),
+    name: Optional[str] = Query(None),
+    building_url: Optional[str] = Query(None),
+    db_session: AsyncSession = Depends(yield_db_read_session),
 ):
-    buildings = await Building.list(db_session)
-    return success([building.to_dict for building in buildings])
+    # The page is determined by the table version and the query string
+    version = await buildings_version(db_session)
+    etag = make_etag(version, sorted(request.query_params.multi_items()))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    columns = [column.strip() for column in (fields or "").split(",") if column.strip()]
+    columns = columns or Building.column_names()
+    filters = {
+        key: value
+        for key, value in {"name": name, "building_url": building_url}.items()
+        if value is not None
+    }
+
+    # One extra row tells us whether there is a next page
+    rows = await Building.list(
+        db_session,
+        columns=columns,
+        filters=filters,
+        order_by=order_by,
+        limit=limit + 1 if limit else None,
+        cursor=cursor,
+    )
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit] if limit else rows
+
+    response = with_etag(success([dict(row._mapping) for row in rows]), etag)
+    if has_more:
+        response.headers["X-Next-Cursor"] = Building.encode_cursor(rows[-1], order_by)
+    return response
 
 @router.post('/building/register', description="Register a New Building")
 async def register_building(
@@ -26,12 +101,15 @@ async def register_building(
     body: BuildingInputField,
     db_session: AsyncSession = Depends(yield_db_session)
 ):
-    the_user = await Building.filter_by(
+    new_building = await Building.create_if_absent(
         db_session,
-        building_url=body.building_url
+        ("building_url",),
+        name=body.name,
+        building_url=body.building_url,
+        access_token=body.access_token
     )
 
-    if the_user:
+    if new_building is None:
         logger.info(
             f"{body.building_url!r} is  registered in the system."
         )
@@ -40,8 +118,6 @@ async def register_building(
             "Sorry, but the building is already registered in the system."
         )
 
-    new_building = await Building.create(db_session, name=body.name, building_url=body.building_url, access_token=body.access_token)
-
     return new_building.to_dict
 
 @router.put('/building/edit/{building_id}', description="Edit an Existing Building")
@@ -51,20 +127,27 @@ async def edit_building(
     body: BuildingInputField = Depends(),
     db_session: AsyncSession = Depends(yield_db_session)
 ):
-    building = await Building.get_by_id(db_session, building_id)
-    
+    try:
+        building = await Building.update(
+            db_session,
+            building_id,
+            name=body.name,
+            building_url=body.building_url,
+            access_token=body.access_token
+        )
+    except IntegrityError:
+        await db_session.rollback()
+        raise BadRequest(
+            "Sorry, but another building is already registered with this URL."
+        )
+
     if not building:
        raise HTTPException(status_code=404, detail="Building not found.")
 
+    await ha_pool.forget(building_id)
+    await user_cache.invalidate(building_id)
 
-    await building.update(
-        db_session,
-        name=body.name,
-        building_url=body.building_url,
-        access_token=body.access_token
-    )
-    
-    return success(building.to_dict())
+    return success(building.to_dict)
 
 @router.delete('/building/delete/{building_id}', description="Delete a Building")
 async def delete_building(
@@ -74,6 +157,8 @@ async def delete_building(
     success_flag = await Building.delete(db_session, building_id)
     if not success_flag:
         raise HTTPException(status_code=404, detail="Building not found.")
+    await ha_pool.forget(building_id)
+    await user_cache.invalidate(building_id)
     return success({"message": "Building deleted successfully."})
 
 @router.post("/building/create-user/{building_id}", description="Create User via WebSocket")
@@ -83,52 +168,353 @@ async def create_user_via_ws(
     db_session: AsyncSession = Depends(yield_db_session)
 ):
 
-    print(building_id)
-    building = await Building.get(db_session, building_id)
-    print(building.building_url,building.access_token,'---------')
+    # Don't hold a pooled connection while Home Assistant answers
+    async with db_scope(db_session):
+        building = await Building.get(db_session, building_id)
     if not building:
         raise HTTPException(status_code=404, detail="Building not found.")
 
-    print(body)
-    client = HomeAssistantWS(domain=building.building_url, access_token=building.access_token)
-    
     try:
-        await client.connect()
-        response = await client.create_user(
+        response = await coordinator.run(
+            BuildingTarget.from_building(building),
+            "create_user",
+            retry=False,
             username=body.username,
             password=body.password,
             display_name=body.display_name,
-            local_only=body.local_access_only if body.local_access_only is not None else False,
-            administrator=body.administrator if body.administrator is not None else False
+            local_only=(
+                body.local_access_only if body.local_access_only is not None else False
+            ),
+            administrator=(
+                body.administrator if body.administrator is not None else False
+            ),
         )
+        await user_cache.invalidate(building_id)
         return success(response)
     except Exception as e:
         logger.error(f"Error in create_user_via_ws: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create user: {e}")
-    finally:
-        await client.close()
-        logger.info("WebSocket connection closed")
+
+@router.post("/building/create-users", description="Create Many Users Across Buildings")
+async def bulk_create_users(
+    body: BulkUserProvisionInputField,
+    db_session: AsyncSession = Depends(yield_db_session)
+):
+    if len(body.users) > settings.HA_BULK_MAX_ITEMS:
+        raise BadRequest(
+            f"Sorry, but at most {settings.HA_BULK_MAX_ITEMS} users can be created "
+            "at once."
+        )
+
+    building_ids = {item.building_id for item in body.users}
+    async with db_scope(db_session):
+        buildings = await Building.get_many(db_session, building_ids)
+    targets = {
+        building.id: BuildingTarget.from_building(building) for building in buildings
+    }
+
+    reports = await provision_users(targets, body.users)
+
+    await user_cache.invalidate_many(
+        {report["building_id"] for report in reports if report["success"]}
+    )
+
+    created = sum(1 for report in reports if report["success"])
+    return success({
+        "created": created,
+        "failed": len(reports) - created,
+        "results": reports,
+    })
+
+
+async def unreachable_buildings(
+    targets: list[BuildingTarget], skip_unreachable: bool
+) -> set[int]:
+    if not skip_unreachable:
+        return set()
+    return await health_monitor.unreachable(target.id for target in targets)
+
+
+@router.get(
+    "/building/health",
+    description="Reachability of each building from the last health sweep",
+)
+async def building_health(db_session: AsyncSession = Depends(yield_db_read_session)):
+    rows = await Building.list(db_session, columns=["id", "name"])
+    statuses = await health_monitor.statuses(row.id for row in rows)
+
+    buildings = []
+    counts = Counter()
+    for row in rows:
+        record = statuses.get(row.id)
+        if record is None:
+            counts["unknown"] += 1
+            buildings.append(
+                {"building_id": row.id, "name": row.name, "reachable": None}
+            )
+            continue
+        counts["reachable" if record["reachable"] else "unreachable"] += 1
+        buildings.append({**record, "name": row.name})
+
+    return success(
+        {
+            "summary": {
+                key: counts[key] for key in ("reachable", "unreachable", "unknown")
+            },
+            "buildings": buildings,
+        }
+    )
+
+
+# Targets of the latest buildings version, so that revalidating
+# /building/users takes one aggregate query and no Home Assistant call
+_targets_by_version: dict[str, list[BuildingTarget]] = {}
+
+
+def users_etag(version: str, skip: set[int], hashes: dict[int, str]) -> str:
+    return make_etag(version, sorted(skip), sorted(hashes.items()))
+
 
 @router.get("/building/users", description="List all users from each building")
-async def list_building_users(db_session: AsyncSession = Depends(yield_db_session)):
-    buildings = await Building.list(db_session)
+async def list_building_users(
+    request: Request,
+    skip_unreachable: bool = Query(
+        False, description="Skip buildings the health monitor found down"
+    ),
+    db_session: AsyncSession = Depends(yield_db_read_session),
+):
+    # The connection goes back to the pool before the fleet is contacted
+    async with db_scope(db_session):
+        version = await buildings_version(db_session)
+        targets = _targets_by_version.get(version)
+        if targets is not None and request.headers.get("if-none-match"):
+            skip = await unreachable_buildings(targets, skip_unreachable)
+            hashes = await user_cache.content_hashes(
+                [target.id for target in targets if target.id not in skip]
+            )
+            if hashes is not None:
+                etag = users_etag(version, skip, hashes)
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+
+        if targets is None:
+            buildings = await Building.list(db_session)
+            targets = [BuildingTarget.from_building(building) for building in buildings]
+            _targets_by_version.clear()
+            _targets_by_version[version] = targets
+    skip = await unreachable_buildings(targets, skip_unreachable)
+
+    outcomes = await FanOut(skip=skip).map(targets, list_users_cached)
+
+    # Use the building name as the top-level key.
     results = {}
+    statuses = []
+    for outcome in outcomes:
+        if outcome.ok:
+            response, cache_status = outcome.result
+            results[outcome.target.name] = response
+            statuses.append(cache_status)
+        else:
+            results[outcome.target.name] = outcome.as_response()
+            statuses.append(CacheStatus.MISS)
 
-    for building in buildings:
-        client = HomeAssistantWS(
-            domain=building.building_url,
-            access_token=building.access_token
-        )
+    response = success(results)
+    response.headers["Cache-Status"] = CacheStatus.combine(statuses).value
+    # Only complete answers are worth revalidating; errors should be retried
+    if version in _targets_by_version and all(
+        outcome.ok or outcome.status == BuildingStatus.SKIPPED for outcome in outcomes
+    ):
+        hashes = {
+            outcome.target.id: content_hash(outcome.result[0])
+            for outcome in outcomes
+            if outcome.ok
+        }
+        with_etag(response, users_etag(version, skip, hashes))
+    return response
+
+
+@router.get(
+    "/building/users/stream",
+    description="Stream users from each building as they arrive",
+)
+async def stream_building_users(
+    format: Literal["ndjson", "sse"] = Query("ndjson", description="ndjson or sse"),
+    skip_unreachable: bool = Query(
+        False, description="Skip buildings the health monitor found down"
+    ),
+    db_session: AsyncSession = Depends(yield_db_read_session),
+):
+    # The stream outlives the DB work by far
+    async with db_scope(db_session):
+        buildings = await Building.list(db_session)
+    targets = [BuildingTarget.from_building(building) for building in buildings]
+    skip = await unreachable_buildings(targets, skip_unreachable)
+
+    def encode(kind: str, record: dict) -> str:
+        payload = json.dumps({"type": kind, **record}, default=str)
+        if format == "sse":
+            return f"event: {kind}\ndata: {payload}\n\n"
+        return payload + "\n"
+
+    async def records() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        counts = Counter()
+        statuses = []
+        async for outcome in FanOut(skip=skip).stream(targets, list_users_cached):
+            counts[outcome.status.value] += 1
+            record = {
+                "building_id": outcome.target.id,
+                "building": outcome.target.name,
+                "status": outcome.status.value,
+            }
+            if outcome.ok:
+                record["data"], cache_status = outcome.result
+                record["cache"] = cache_status.value
+                statuses.append(cache_status)
+            else:
+                record["error"] = outcome.error
+                statuses.append(CacheStatus.MISS)
+            yield encode("building", record)
+
+        yield encode("summary", {
+            "total": len(targets),
+            **{status.value: counts[status.value] for status in BuildingStatus},
+            "cache": CacheStatus.combine(statuses).value,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        records(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def load_targets(building_ids: List[int]) -> list[BuildingTarget]:
+    # Event streams outlive the request, so don't hold a DB connection for them
+    async with sessionmanager.read_session() as db_session:
+        buildings = await Building.get_many(db_session, set(building_ids))
+        return [BuildingTarget.from_building(building) for building in buildings]
+
+
+@router.get("/building/events", description="Stream live events from buildings (SSE)")
+async def stream_building_events(
+    building_id: List[int] = Query(..., description="Buildings to follow (repeatable)"),
+    entity_id: Optional[List[str]] = Query(None, description="Only these entities"),
+    event_type: Optional[List[str]] = Query(None, description="Only these event types"),
+):
+    targets = await load_targets(building_id)
+    if len(targets) != len(set(building_id)):
+        raise HTTPException(status_code=404, detail="Building not found.")
+
+    async def frames() -> AsyncIterator[str]:
+        async with event_hub.subscribe(targets, entity_id, event_type) as subscriber:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        subscriber.get(), timeout=settings.HA_EVENT_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                kind = (
+                    frame["event_type"] if frame["type"] == "event" else frame["type"]
+                )
+                yield f"event: {kind}\ndata: {json.dumps(frame, default=str)}\n\n"
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/building/events/ws")
+async def building_events_websocket(
+    websocket: WebSocket,
+    building_id: List[int] = Query(...),
+    entity_id: Optional[List[str]] = Query(None),
+    event_type: Optional[List[str]] = Query(None),
+):
+    targets = await load_targets(building_id)
+    if len(targets) != len(set(building_id)):
+        await websocket.close(code=1008, reason="Building not found.")
+        return
+    await websocket.accept()
+
+    async def until_disconnect() -> None:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    async with event_hub.subscribe(targets, entity_id, event_type) as subscriber:
+        disconnected = asyncio.create_task(until_disconnect())
         try:
-            await client.connect()
-            # Send the person/list command and await the response.
-            response = await client.list_persons()
-            # Use the building name as the top-level key.
-            results[building.name] = response
-        except Exception as e:
-            logger.error(f"Error retrieving users from building {building.name}: {e}")
-            results[building.name] = {"error": str(e)}
+            while True:
+                frame = asyncio.ensure_future(subscriber.get())
+                await asyncio.wait(
+                    {frame, disconnected}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected.done():
+                    frame.cancel()
+                    break
+                await websocket.send_text(json.dumps(frame.result(), default=str))
+        except WebSocketDisconnect:
+            pass
         finally:
-            await client.close()
+            disconnected.cancel()
+
 
-    return success(results)
+async def building_state_cache(
+    building_id: int, db_session: AsyncSession
+) -> BuildingStateCache:
+    # The first read of a building may wait for its whole state snapshot
+    async with db_scope(db_session):
+        building = await Building.get(db_session, building_id)
+    if not building:
+        raise HTTPException(status_code=404, detail="Building not found.")
+    try:
+        return await state_cache.get(BuildingTarget.from_building(building))
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504, detail="Timed out loading states from the building."
+        )
+
+
+@router.get(
+    "/building/{building_id}/states",
+    description="Current entity states, served from memory",
+)
+async def list_building_states(
+    building_id: int = Path(..., description="The ID of the building"),
+    domain: Optional[str] = Query(
+        None, description="Only entities of this domain, e.g. light"
+    ),
+    db_session: AsyncSession = Depends(yield_db_read_session),
+):
+    cache = await building_state_cache(building_id, db_session)
+    entities = cache.entities.values()
+    if domain:
+        prefix = f"{domain}."
+        entities = [
+            entity for entity in entities if entity.entity_id.startswith(prefix)
+        ]
+
+    states = [entity.as_dict() for entity in entities]
+    return success({**cache.meta(), "count": len(states), "states": states})
+
+
+@router.get(
+    "/building/{building_id}/states/{entity_id}",
+    description="Current state of one entity",
+)
+async def get_building_state(
+    building_id: int = Path(..., description="The ID of the building"),
+    entity_id: str = Path(..., description="e.g. light.kitchen"),
+    db_session: AsyncSession = Depends(yield_db_read_session)
+):
+    cache = await building_state_cache(building_id, db_session)
+    entity = cache.entities.get(entity_id)
+    if entity is None:
+        raise HTTPException(status_code=404, detail="Entity not found.")
+    return success({**cache.meta(), "state": entity.as_dict()})
@@ -1,7 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response, status
 
+from src.database import sessionmanager
 from src.logger import get_logger
-from src.responses import success
+from src.metrics import render_latest
+from src.redis import redis_health
+from src.responses import error, success
+from src.warmup import warmup
 
 logger = get_logger(__name__)
 
@@ -12,3 +16,25 @@ router = APIRouter()
 @router.get("/healthcheck", include_in_schema=False)
 async def healthcheck():
     return success(data={"status": "OK"})
+
+
+@router.get("/readiness", include_in_schema=False)
+async def readiness():
+    """Ready once start-up warm-up has finished; load balancers should wait for it."""
+    if not warmup.ready:
+        return error(
+            [{"message": "Warming up", "code": "NOT_READY"}],
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return success(data={
+        "status": "READY",
+        "startup": warmup.timings,
+        "redis": await redis_health(),
+        "database": sessionmanager.pool_stats(),
+    })
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = render_latest()
+    return Response(content=content, headers={"Content-Type": content_type})
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from src.core.schemas.base_schema import CustomModel
 
 
@@ -49,4 +49,11 @@ class BuildingUserInputField(CustomModel):
     class Config:
         exclude_defaults = True
         from_attributes = True
-        exclude_unset = True
\ No newline at end of file
+        exclude_unset = True
+
+class BulkBuildingUserInputField(BuildingUserInputField):
+    building_id: int
+
+
+class BulkUserProvisionInputField(CustomModel):
+    users: List[BulkBuildingUserInputField]
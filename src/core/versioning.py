@@ -0,0 +1,17 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.models.building import Building
+
+
+async def buildings_version(db: AsyncSession) -> str:
+    """
+    Current version of the building table: its row count and highest id,
+    creation and update times, in one aggregate query. Every insert, edit
+    or delete changes it, whichever code path made the change: updates
+    outside the ORM (migrations, manual SQL) are stamped too, by the
+    `building_updated_at` trigger. It stays the same as long as the table
+    does.
+    Read it with the session that reads the rows it versions, so that a
+    replica's version describes that replica's rows.
+    """
+    return ":".join(str(part) for part in await Building.version(db))
@@ -1,27 +1,298 @@
+import asyncio
 import contextlib
+import itertools
+from contextvars import ContextVar
+from logging import DEBUG
+import time
+import uuid
 from src.config import settings
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, DisconnectionError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from typing import Any, AsyncIterator, Annotated
+from typing import Any, AsyncIterator, Annotated, Optional, Sequence
 from fastapi import Depends
 from src.logger import get_logger
+from src.metrics import (
+    DB_CONNECTIONS_HELD_ACROSS_IO,
+    DB_POOL_CAPACITY,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_WAIT,
+)
+from src.timing import record
 
 logger = get_logger(__name__)
 
 
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            elapsed = time.perf_counter() - started
+            DB_POOL_WAIT.observe(elapsed)
+            record("db-checkout", started, elapsed)
+
+
+def pool_options() -> dict[str, Any]:
+    """Engine arguments for the pool configured in `Config` (DATABASE_POOL_*)."""
+    if settings.DATABASE_POOL_MODE == "pgbouncer":
+        # A transaction pooler hands each transaction any server connection,
+        # where statements prepared through another one do not exist
+        return {
+            "poolclass": NullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            },
+        }
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING == "always",
+    }
+
+
+def ping_idle_connections(engine, idle: float) -> None:
+    """
+    Pre-ping only connections that sat unused for `idle` seconds; those that
+    were just checked in are almost surely alive and skip the round trip.
+    """
+
+    def checked_in(dbapi_connection, record):
+        record.info["idle_since"] = time.monotonic()
+
+    def checked_out(dbapi_connection, record, proxy):
+        idle_since = record.info.pop("idle_since", None)
+        if idle_since is None or time.monotonic() - idle_since < idle:
+            return
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            # The pool discards the connection and checks out another one
+            raise DisconnectionError(f"Idle connection is dead: {e}") from e
+
+    event.listen(engine.pool, "checkout", checked_out)
+    event.listen(engine.pool, "checkin", checked_in)
+
+
+def pool_stats(pool) -> dict[str, Any]:
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "timeout": pool.timeout(),
+    }
+
+
+def instrument_pool(pool) -> None:
+    if not isinstance(pool, QueuePool):
+        return
+    DB_POOL_CAPACITY.set(pool.size() + max(pool._max_overflow, 0))
+
+    def update_gauges(*_):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    event.listen(pool, "checkout", update_gauges)
+    event.listen(pool, "checkin", update_gauges)
+
+
+class HeldConnections(set):
+    """
+    Pool connections checked out by sessions of one task (and the tasks it
+    spawned).
+    """
+
+    warned = False
+
+
+_held: ContextVar[Optional[HeldConnections]] = ContextVar(
+    "held_connections", default=None
+)
+
+
+def _track_connections() -> None:
+    if _held.get() is None:
+        _held.set(HeldConnections())
+
+
+def track_connections(pool) -> None:
+    def checked_out(dbapi_connection, record, proxy):
+        held = _held.get()
+        if held is not None:
+            held.add(record)
+            record.info["held_by"] = held
+
+    def checked_in(dbapi_connection, record):
+        held = record.info.pop("held_by", None)
+        if held is not None:
+            held.discard(record)
+
+    event.listen(pool, "checkout", checked_out)
+    event.listen(pool, "checkin", checked_in)
+
+
+def warn_if_holding(activity: str) -> None:
+    """
+    Call before slow external I/O: warns (once per task) when the task's
+    sessions still hold pooled connections that other requests may be
+    waiting for.
+    """
+    held = _held.get()
+    if held and not held.warned:
+        held.warned = True
+        DB_CONNECTIONS_HELD_ACROSS_IO.labels(activity=activity).inc()
+        logger.warning(
+            f"[DATABASE]: {len(held)} pooled connection(s) held across {activity}; "
+            "finish DB work in a db_scope() block first"
+        )
+
+
+@contextlib.asynccontextmanager
+async def db_scope(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Scope a unit of DB work: on exit the session hands its connection back to
+    the pool, so it is not held during slow I/O that follows. Commit writes
+    inside the block. Loaded objects stay usable, and the session checks a
+    connection out again (lazily, on the next query) if it is used later.
+    """
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+def instrument_sql(engine) -> None:
+    """Time every statement for the request's Server-Timing header."""
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        record("sql", started, time.perf_counter() - started)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    event.listen(engine, "after_cursor_execute", after_execute)
+
+
+class ReadRouting:
+    """
+    Per-request read routing. `primary` is set for clients that wrote
+    recently (read-your-writes); `wrote` once this request commits.
+    """
+
+    __slots__ = ("primary", "wrote")
+
+    def __init__(self, primary: bool = False):
+        self.primary = primary
+        self.wrote = False
+
+    @property
+    def use_primary(self) -> bool:
+        return self.primary or self.wrote
+
+
+_routing: ContextVar[Optional[ReadRouting]] = ContextVar("read_routing", default=None)
+
+
+def start_routing(primary: bool = False) -> tuple[ReadRouting, object]:
+    routing = ReadRouting(primary)
+    return routing, _routing.set(routing)
+
+
+def end_routing(token) -> None:
+    _routing.reset(token)
+
+
+def _mark_write(*_) -> None:
+    routing = _routing.get()
+    if routing is not None:
+        routing.wrote = True
+
+
+def configure_engine(engine) -> None:
+    instrument_sql(engine.sync_engine)
+    track_connections(engine.pool)
+    if settings.DATABASE_POOL_PRE_PING == "idle" and isinstance(engine.pool, QueuePool):
+        ping_idle_connections(engine.sync_engine, settings.DATABASE_POOL_PRE_PING_IDLE)
+
+
+class _Replica:
+    def __init__(self, url: str, engine_kwargs: dict[str, Any]):
+        self.name = make_url(url).host
+        self.engine = create_async_engine(url=url, **engine_kwargs)
+        configure_engine(self.engine)
+        self.sessionmaker = async_sessionmaker(
+            bind=self.engine, autocommit=False, expire_on_commit=False
+        )
+        self.healthy = True
+        self._recheck: Optional[asyncio.Task] = None
+
+    def mark(self, healthy: bool, reason: str = "") -> None:
+        if healthy != self.healthy:
+            if healthy:
+                logger.info(f"[DATABASE]: Replica {self.name} is back")
+            else:
+                logger.warning(
+                    f"[DATABASE]: Replica {self.name} is down, reading from the "
+                    f"primary: {reason}"
+                )
+        self.healthy = healthy
+
+    async def check(self) -> None:
+        try:
+            async with self.engine.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=5)
+            self.mark(True)
+        except Exception as e:
+            self.mark(False, str(e))
+
+    def recheck(self) -> None:
+        """Check the replica now, in the background (once at a time)."""
+        if self._recheck is None:
+            self._recheck = asyncio.create_task(self.check())
+            self._recheck.add_done_callback(lambda _: setattr(self, "_recheck", None))
+
+    async def close(self) -> None:
+        if self._recheck is not None:
+            self._recheck.cancel()
+        await self.engine.dispose()
+
+
 class DatabaseService:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
+    def __init__(
+        self,
+        host: str,
+        engine_kwargs: dict[str, Any] = {},
+        replica_hosts: Sequence[str] = (),
+    ):
+        engine_kwargs = {**pool_options(), **engine_kwargs}
         # Initialize the async engine with the provided host and additional arguments
-        self._engine = create_async_engine(
-            url=host,
-            pool_pre_ping=True,
-            pool_size=10,  # Increase the pool size
-            max_overflow=20,  # Increase the overflow limit
-            **engine_kwargs
-        )
+        self._engine = create_async_engine(url=host, **engine_kwargs)
+        instrument_pool(self._engine.pool)
+        configure_engine(self._engine)
+        # Requests that committed read their own writes from the primary
+        event.listen(self._engine.sync_engine, "commit", _mark_write)
 
         # Create a session maker using the initialized engine
         self._sessionmaker = async_sessionmaker(
@@ -30,6 +301,10 @@ class DatabaseService:
             expire_on_commit=False,
         )
 
+        self._replicas = [_Replica(str(url), engine_kwargs) for url in replica_hosts]
+        self._next_replica = itertools.count()
+        self._replica_checks: Optional[asyncio.Task] = None
+
         # Register models
         self.register_models()
 
@@ -46,23 +321,113 @@ class DatabaseService:
             logger.info("[DATABASE]: Creating tables based on the metadata...")
             await conn.run_sync(Model.metadata.create_all, checkfirst=True)
 
+    async def warm_up(self, connections: int) -> int:
+        """
+        Open up to `connections` pooled connections to the primary and to each
+        replica ahead of traffic. The first one also runs the dialect's type
+        introspection.
+        """
+        opened = 0
+        for engine in [self._engine, *(replica.engine for replica in self._replicas)]:
+            if not isinstance(engine.pool, QueuePool):
+                continue  # Nothing is kept open without a pool
+            count = min(connections, engine.pool.size())
+            async with contextlib.AsyncExitStack() as stack:
+                conns = await asyncio.gather(*(
+                    stack.enter_async_context(engine.connect()) for _ in range(count)
+                ))
+                await asyncio.gather(
+                    *(conn.execute(text("SELECT 1")) for conn in conns)
+                )
+            opened += len(conns)
+        return opened
+
+    def pool_stats(self) -> dict[str, dict[str, Any]]:
+        """Live usage of the primary's and each replica's pool, to size them from."""
+        engines = {
+            "primary": self._engine,
+            **{replica.name: replica.engine for replica in self._replicas},
+        }
+        return {name: pool_stats(engine.pool) for name, engine in engines.items()}
+
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncIterator[AsyncSession]:
+        # Runs on every request, so check the level once instead of per call
+        debug = logger.isEnabledFor(DEBUG)
+        _track_connections()
         async with self._sessionmaker() as session:
             try:
-                logger.debug("[DATABASE]: Yielding a new session")
+                if debug:
+                    logger.debug("[DATABASE]: Yielding a new session")
                 yield session
             except Exception as e:
-                logger.error(f"[DATABASE]: DB Exception: {e}")
+                logger.error("[DATABASE]: DB Exception: %s", e)
                 await session.rollback()  # Rollback on exception
                 raise
             finally:
                 if session:
-                    logger.debug("[DATABASE]: Closing session")
                     await session.close()
-                    logger.debug("[DATABASE]: Session closed")
+                    if debug:
+                        logger.debug("[DATABASE]: Session closed")
+
+    def _pick_replica(self) -> Optional[_Replica]:
+        routing = _routing.get()
+        if routing is not None and routing.use_primary:
+            return None
+        healthy = [replica for replica in self._replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next_replica) % len(healthy)]
+
+    @contextlib.asynccontextmanager
+    async def read_session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Session for reads, on a healthy replica (round-robin) unless the
+        client wrote recently, else on the primary. Like any session it only
+        checks a connection out at its first query. A replica whose
+        connection turns out dead is taken out of rotation; one that cannot
+        be reached is checked right away, and the background checks bring
+        replicas back.
+        """
+        replica = self._pick_replica()
+        _track_connections()
+        if replica is None:
+            async with self.session() as session:
+                yield session
+            return
+
+        async with replica.sessionmaker() as session:
+            session.info["replica"] = replica.name
+            try:
+                yield session
+            except DBAPIError as e:
+                if e.connection_invalidated:
+                    replica.mark(False, str(e))
+                raise
+            except (OSError, asyncio.TimeoutError):
+                # Connecting failed, or something else did: let a check decide
+                replica.recheck()
+                raise
+
+    async def check_replicas(self) -> None:
+        await asyncio.gather(*(replica.check() for replica in self._replicas))
+
+    async def _check_replicas_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DATABASE_REPLICA_CHECK_INTERVAL)
+            await self.check_replicas()
+
+    def start(self) -> None:
+        if self._replicas and self._replica_checks is None:
+            self._replica_checks = asyncio.create_task(self._check_replicas_loop())
 
     async def close(self):
+        if self._replica_checks is not None:
+            self._replica_checks.cancel()
+            self._replica_checks = None
+        for replica in self._replicas:
+            await replica.close()
+
         # Properly dispose of the engine and clear session maker
         if self._engine:
             await self._engine.dispose()
@@ -74,7 +439,8 @@ class DatabaseService:
 # Initialize the database service with configuration settings
 sessionmanager = DatabaseService(
     str(settings.DATABASE_URL),
-    {"echo": settings.ECHO_SQL}
+    {"echo": settings.ECHO_SQL},
+    settings.DATABASE_REPLICA_URLS,
 )
 
 
@@ -89,5 +455,11 @@ async def yield_db_session() -> AsyncIterator[AsyncSession]:
     async with sessionmanager.session() as session:
         yield session
 
+# Dependency for routes that only read; see DatabaseService.read_session
+async def yield_db_read_session() -> AsyncIterator[AsyncSession]:
+    async with sessionmanager.read_session() as session:
+        yield session
+
 # Annotated dependency for use within FastAPI routes
 DBSession = Annotated[AsyncSession, Depends(yield_db_session)]
+DBReadSession = Annotated[AsyncSession, Depends(yield_db_read_session)]
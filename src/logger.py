@@ -1,24 +1,136 @@
-from logging import DEBUG, StreamHandler, getLogger
+import atexit
+import json
+import queue
+import threading
+from logging import (
+    Formatter,
+    Handler,
+    LogRecord,
+    StreamHandler,
+    getLevelName,
+    getLogger,
+)
+from logging.handlers import QueueHandler, QueueListener
 from sys import stdout
+from typing import Optional
 
-from colorlog import ColoredFormatter
+from src.config import settings
+from src.constants import FULL_DATE_FORMAT, LOG_FORMAT, LOG_PLAIN_FORMAT
+from src.metrics import LOG_RECORDS_DROPPED
 
-from src.constants import FULL_DATE_FORMAT, LOG_FORMAT
+# Every module logger lives under this one, so handlers are attached once here
+APP_LOGGER = "src"
 
+_lock = threading.Lock()
+_handler: Optional["DroppingQueueHandler"] = None
+_listener: Optional[QueueListener] = None
 
-def get_logger(name):
 
-    handler = StreamHandler(stdout)
-    handler.setFormatter(
-        ColoredFormatter(
-            fmt=LOG_FORMAT,
-            datefmt=FULL_DATE_FORMAT,
+class DroppingQueueHandler(QueueHandler):
+    """Hands records to the writer thread, dropping them when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record: LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JsonFormatter(Formatter):
+    """Fallback JSON formatter for when python-json-logger is not installed."""
+
+    def format(self, record: LogRecord) -> str:
+        entry = {
+            "asctime": self.formatTime(record, self.datefmt),
+            "levelname": record.levelname,
+            "name": record.name,
+            "funcName": record.funcName,
+            "lineno": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def _renderer() -> str:
+    if settings.LOG_RENDERER != "auto":
+        return settings.LOG_RENDERER
+    return "json" if settings.ENVIRONMENT.is_deployed else "color"
+
+
+def _formatter() -> Formatter:
+    renderer = _renderer()
+    if renderer == "json":
+        try:
+            from pythonjsonlogger.jsonlogger import JsonFormatter as _JsonFormatter
+        except ImportError:
+            return JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S")
+        return _JsonFormatter(
+            "%(asctime)s %(levelname)s %(name)s %(funcName)s %(lineno)d %(message)s",
+            datefmt="%Y-%m-%dT%H:%M:%S",
         )
-    )
+    if renderer == "color":
+        try:
+            from colorlog import ColoredFormatter
+        except ImportError:
+            pass
+        else:
+            return ColoredFormatter(fmt=LOG_FORMAT, datefmt=FULL_DATE_FORMAT)
+    return Formatter(fmt=LOG_PLAIN_FORMAT, datefmt=FULL_DATE_FORMAT)
+
+
+def log_level() -> str:
+    if settings.LOG_LEVEL:
+        return settings.LOG_LEVEL.upper()
+    return "DEBUG" if settings.ENVIRONMENT.is_debug else "INFO"
+
+
+def _configure() -> DroppingQueueHandler:
+    global _handler, _listener
+    with _lock:
+        if _handler is not None:
+            return _handler
+
+        writer: Handler = StreamHandler(stdout)
+        writer.setFormatter(_formatter())
+
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+        _listener = QueueListener(_handler.queue, writer, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+        app_logger = getLogger(APP_LOGGER)
+        app_logger.addHandler(_handler)
+        app_logger.setLevel(getLevelName(log_level()))
+        app_logger.propagate = False
+        return _handler
+
+
+def stop_logging() -> None:
+    """Flush the queue and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    handler = _configure()
 
     logger = getLogger(name)
-    logger.addHandler(handler)
-    logger.setLevel(DEBUG)
-    logger.propagate = False
+    if name != APP_LOGGER and not name.startswith(f"{APP_LOGGER}."):
+        # Outside the app hierarchy, e.g. "__main__": share the same queue
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+            logger.setLevel(getLevelName(log_level()))
+            logger.propagate = False
 
     return logger
@@ -1,18 +1,30 @@
+import time
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-import sentry_sdk
 from fastapi import FastAPI, status
 from fastapi.exceptions import HTTPException, RequestValidationError
 from starlette.middleware.cors import CORSMiddleware
 
-from src import logger
+from src import IMPORT_STARTED, logger
 from src.config import app_configs, settings
 from src.database import sessionmanager
+from src.redis import close_redis, init_redis
+from src.core.ha_websocket.coordination import coordinator
+from src.core.ha_websocket.events import event_hub
+from src.core.ha_websocket.health import health_monitor
+from src.core.ha_websocket.pool import ha_pool
+from src.core.ha_websocket.states import state_cache
+from src.middlewares import (
+    MetricsMiddleware,
+    ReadYourWritesMiddleware,
+    ServerTimingMiddleware,
+)
 from src.exceptions import BadRequest, InternalServerError, AuthenticationError
 from src.core.routers.base_router import router as base_router
 from src.core.routers.auth_router import router as auth_router
-from src.responses import error
+from src.responses import FastJSONResponse, error
+from src.warmup import warmup
 
 from src.logger import get_logger
 
@@ -23,9 +35,30 @@ logger = get_logger(__name__)
 async def lifespan(_application: FastAPI) -> AsyncGenerator:
 
     # Startup
+    init_redis()
+    sessionmanager.start()
+    ha_pool.start()
+    await coordinator.start()
+    await warmup.start(IMPORTS_DONE - IMPORT_STARTED)
+    state_cache.start()
+    if settings.HA_HEALTH_ENABLED:
+        health_monitor.start()
 
     yield
 
+    await warmup.stop()
+    await health_monitor.stop()
+    await state_cache.close()
+    await event_hub.close()
+    await coordinator.close()
+
+    # Home Assistant sessions
+    await warmup.remember_buildings()
+    await ha_pool.close()
+
+    # Redis
+    await close_redis()
+
     if settings.ENVIRONMENT.is_testing:
         return
 
@@ -34,7 +67,11 @@ async def lifespan(_application: FastAPI) -> AsyncGenerator:
         await sessionmanager.close()
 
 
-app = FastAPI(**app_configs, lifespan=lifespan)
+app = FastAPI(
+    **app_configs,
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,8 +81,17 @@ app.add_middleware(
     allow_methods=("GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"),
     allow_headers=settings.CORS_HEADERS,
 )
+if settings.DATABASE_REPLICA_URLS:
+    app.add_middleware(
+        ReadYourWritesMiddleware, window=settings.DATABASE_READ_YOUR_WRITES_SECONDS
+    )
+app.add_middleware(ServerTimingMiddleware, slow_request_ms=settings.SLOW_REQUEST_LOG_MS)
+app.add_middleware(MetricsMiddleware, router=app.router)
 
 if settings.ENVIRONMENT.is_deployed:
+    # Only deployed environments report to Sentry; don't pay its import elsewhere
+    import sentry_sdk
+
     sentry_sdk.init(
         dsn=settings.SENTRY_DSN,
         environment=settings.ENVIRONMENT,
@@ -54,6 +100,8 @@ if settings.ENVIRONMENT.is_deployed:
 app.include_router(base_router)
 app.include_router(auth_router)
 
+IMPORTS_DONE = time.perf_counter()
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(_, exception):
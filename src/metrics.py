@@ -0,0 +1,136 @@
+import contextlib
+import os
+import time
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Gunicorn workers write their samples to files in this directory (see
+# gunicorn/gunicorn_conf.py) and /metrics merges them, so every worker's
+# requests are counted no matter which worker serves the scrape.
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+# Startup
+STARTUP_DURATION = Gauge(
+    "app_startup_seconds",
+    "Worker start-up time by phase (imports, connection warm-up, total)",
+    ["phase"],
+    multiprocess_mode="max",
+)
+
+# Logging
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records discarded because the writer thread could not keep up",
+)
+
+# Database pool
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the SQLAlchemy pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity_connections",
+    "Connections the SQLAlchemy pool may open (pool_size + max_overflow)",
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened beyond pool_size",
+    multiprocess_mode="livesum",
+)
+DB_CONNECTIONS_HELD_ACROSS_IO = Counter(
+    "db_connections_held_across_io_total",
+    "Requests that kept a pooled connection checked out during external I/O",
+    ["activity"],
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent obtaining a connection from the pool",
+    buckets=LATENCY_BUCKETS,
+)
+
+# Redis
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency",
+    ["command"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Home Assistant
+HA_CONNECT_DURATION = Histogram(
+    "ha_connect_duration_seconds",
+    "Home Assistant websocket connect and auth latency",
+    ["building", "phase"],
+    buckets=LATENCY_BUCKETS,
+)
+HA_COMMAND_DURATION = Histogram(
+    "ha_command_duration_seconds",
+    "Home Assistant websocket command latency",
+    ["building", "command"],
+    buckets=LATENCY_BUCKETS,
+)
+HA_ERRORS = Counter(
+    "ha_errors_total",
+    "Home Assistant connect, auth and command failures",
+    ["building", "phase"],
+)
+HA_CIRCUIT_STATE = Gauge(
+    "ha_circuit_state",
+    "Circuit breaker state per building: 0 closed, 1 half-open, 2 open",
+    ["building"],
+    multiprocess_mode="max",
+)
+HA_CIRCUIT_TRANSITIONS = Counter(
+    "ha_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ["building", "state"],
+)
+
+
+@contextlib.contextmanager
+def observe(histogram: Histogram, **labels) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric = histogram.labels(**labels) if labels else histogram
+        metric.observe(time.perf_counter() - started)
+
+
+def render_latest() -> tuple[bytes, str]:
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,143 @@
+import time
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.routing import Match, Router
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.database import end_routing, start_routing
+from src.logger import get_logger
+from src.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+from src.timing import end_request, start_request
+
+logger = get_logger(__name__)
+
+
+def route_template(router: Router, scope: Scope) -> str:
+    """
+    `/building/edit/{building_id}` rather than the raw path, to bound label
+    cardinality.
+    """
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, router: Router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.router, scope)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method=method, route=route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_DURATION.labels(
+                method=method, route=route, status=status_code
+            ).observe(time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header with per-phase totals (SQL, pool checkout,
+    Home Assistant connect/auth/commands, rendering) to every response, and
+    optionally logs the full span breakdown of requests slower than
+    `slow_request_ms`.
+    """
+
+    def __init__(self, app: ASGIApp, slow_request_ms: Optional[float] = None):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings, token = start_request()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_request(token)
+            if self.slow_request_ms is not None:
+                elapsed_ms = timings.elapsed * 1000
+                if elapsed_ms >= self.slow_request_ms:
+                    logger.warning(
+                        "Slow request %s %s took %.1fms\n%s",
+                        scope["method"], scope["path"], elapsed_ms, timings.breakdown(),
+                    )
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins clients to the primary database for `window` seconds after a
+    request of theirs wrote, so replica lag never hides their own changes.
+    The deadline travels in a cookie; every worker honours it.
+    """
+
+    COOKIE = "db_primary_until"
+
+    def __init__(self, app: ASGIApp, window: float):
+        self.app = app
+        self.window = window
+
+    def _pinned(self, scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                until = cookie_parser(value.decode("latin-1")).get(self.COOKIE)
+                try:
+                    return until is not None and float(until) > time.time()
+                except ValueError:
+                    return False
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        routing, token = start_routing(primary=self._pinned(scope))
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and routing.wrote:
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Set-Cookie",
+                    f"{self.COOKIE}={time.time() + self.window:.3f}; "
+                    f"Max-Age={int(self.window) or 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_routing(token)
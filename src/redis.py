@@ -1,13 +1,88 @@
+import asyncio
+import time
 from datetime import timedelta
 from typing import Optional
 
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, Redis
 
+from src.config import settings
+from src.metrics import REDIS_COMMAND_DURATION, observe
 from src.models import ZPModel
 
 redis_client: Redis = None  # type: ignore
 
 
+def init_redis() -> None:
+    """Create the process-wide client on a bounded connection pool (app lifespan)."""
+    global redis_client
+    pool = BlockingConnectionPool.from_url(
+        str(settings.REDIS_URL),
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+    redis_client = Redis(connection_pool=pool)
+
+
+def get_redis() -> Redis:
+    """
+    The shared client, for commands the helpers below don't cover (pub/sub,
+    lists).
+    """
+    if redis_client is None:
+        raise RuntimeError("Redis is not initialised")
+    return redis_client
+
+
+async def warm_redis(connections: int) -> int:
+    """Open `connections` pooled connections ahead of traffic."""
+    pool = redis_client.connection_pool
+    connections = min(connections, pool.max_connections)
+    opened = await asyncio.gather(
+        *(pool.get_connection("PING") for _ in range(connections)),
+        return_exceptions=True
+    )
+    for connection in opened:
+        if not isinstance(connection, BaseException):
+            await pool.release(connection)
+    for connection in opened:
+        if isinstance(connection, BaseException):
+            raise connection
+    return len(opened)
+
+
+async def redis_health() -> dict:
+    """Round-trip a PING and report the pool's usage."""
+    if redis_client is None:
+        return {"healthy": False, "error": "Redis is not initialised"}
+    pool = redis_client.connection_pool
+    started = time.perf_counter()
+    try:
+        await redis_client.ping()
+        healthy, error = True, None
+    except Exception as e:
+        healthy, error = False, str(e)
+    return {
+        "healthy": healthy,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "connections_in_use": len(pool._in_use_connections),
+        "connections_idle": len(pool._available_connections),
+        "max_connections": pool.max_connections,
+    }
+
+
+async def close_redis() -> None:
+    global redis_client
+    if redis_client is not None:
+        # The pool was passed in explicitly, so the client won't close it
+        await redis_client.aclose()
+        await redis_client.connection_pool.disconnect()
+        redis_client = None
+
+
 class RedisData(ZPModel):
     key: bytes | str
     value: bytes | str
@@ -15,17 +90,112 @@ class RedisData(ZPModel):
 
 
 async def set_redis_key(redis_data: RedisData, *, is_transaction: bool = False) -> None:
-    async with redis_client.pipeline(transaction=is_transaction) as pipe:
-        await pipe.set(redis_data.key, redis_data.value)
-        if redis_data.ttl:
-            await pipe.expire(redis_data.key, redis_data.ttl)
-
-        await pipe.execute()
+    # A single SET ... EX is atomic, so `is_transaction` no longer changes anything
+    with observe(REDIS_COMMAND_DURATION, command="set"):
+        await redis_client.set(
+            redis_data.key, redis_data.value, ex=redis_data.ttl or None
+        )
 
 
 async def get_by_key(key: str) -> Optional[str]:
-    return await redis_client.get(key)
+    with observe(REDIS_COMMAND_DURATION, command="get"):
+        return await redis_client.get(key)
 
 
 async def delete_by_key(key: str) -> None:
-    return await redis_client.delete(key)
+    with observe(REDIS_COMMAND_DURATION, command="delete"):
+        return await redis_client.delete(key)
+
+
+async def delete_many(keys: list[str]) -> int:
+    if not keys:
+        return 0
+    with observe(REDIS_COMMAND_DURATION, command="delete_many"):
+        return await redis_client.delete(*keys)
+
+
+async def get_many(keys: list[str]) -> list[Optional[bytes]]:
+    if not keys:
+        return []
+    with observe(REDIS_COMMAND_DURATION, command="mget"):
+        return await redis_client.mget(keys)
+
+
+async def set_many(items: list[RedisData]) -> None:
+    """SET ... EX every item in one pipelined round trip."""
+    if not items:
+        return
+    with observe(REDIS_COMMAND_DURATION, command="set_many"):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for item in items:
+                pipe.set(item.key, item.value, ex=item.ttl or None)
+            await pipe.execute()
+
+
+async def incr_and_delete(counters: list[str], keys: list[str], ttl: int) -> None:
+    """
+    INCR every counter (each kept for `ttl` seconds) and DEL `keys`, in one
+    transaction.
+    """
+    with observe(REDIS_COMMAND_DURATION, command="incr_and_delete"):
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for counter in counters:
+                pipe.incr(counter)
+                pipe.expire(counter, ttl)
+            if keys:
+                pipe.delete(*keys)
+            await pipe.execute()
+
+
+# SET KEYS[1] only while the counter KEYS[2] (0 when missing) still reads ARGV[3]
+_SET_IF_COUNTER = """
+if (redis.call('get', KEYS[2]) or '0') == ARGV[3] then
+    redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+async def set_if_counter(redis_data: RedisData, counter: str, expected: int) -> bool:
+    """
+    SET ... EX `redis_data` unless `counter` has moved on from `expected`,
+    atomically; False when the counter had moved and nothing was written.
+    """
+    ttl = redis_data.ttl
+    if isinstance(ttl, timedelta):
+        ttl = int(ttl.total_seconds())
+    with observe(REDIS_COMMAND_DURATION, command="set_if_counter"):
+        return bool(await redis_client.eval(
+            _SET_IF_COUNTER, 2, redis_data.key, counter, redis_data.value, ttl, expected
+        ))
+
+
+# Take the lease when it is free, extend it when we already hold it
+_ACQUIRE_LEASE = """
+local holder = redis.call('get', KEYS[1])
+if holder == false then
+    return redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2]) and 1 or 0
+elseif holder == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+async def acquire_lease(key: str, owner: str, ttl: int) -> bool:
+    """Expiring lock held by `owner`; call again before `ttl` runs out to keep it."""
+    with observe(REDIS_COMMAND_DURATION, command="acquire_lease"):
+        return bool(await redis_client.eval(_ACQUIRE_LEASE, 1, key, owner, ttl))
+
+
+async def release_lease(key: str, owner: str) -> None:
+    with observe(REDIS_COMMAND_DURATION, command="release_lease"):
+        await redis_client.eval(_RELEASE_LEASE, 1, key, owner)
@@ -1,10 +1,16 @@
-from typing import Dict, List, Optional, Union
+import hashlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Union
 
-from fastapi import status
+import orjson
+from fastapi import Request, status
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 
+from src.timing import span
+
 headers = {
     'Content-Type': 'application/json',
     'Access-Control-Allow-Origin': '*',
@@ -32,23 +38,46 @@ class ErrorResponseModel(RootResponseModel):
     success: bool = False
 
 
+def _default(obj: Any) -> Any:
+    """Fallback for types orjson does not encode the way jsonable_encoder does."""
+    if isinstance(obj, BaseModel):
+        # Honours the model's own json_encoders, e.g. convert_datetime_to_gmt
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    return jsonable_encoder(obj)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered in a single orjson pass, producing the same bytes as
+    running jsonable_encoder first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with span("render"):
+            return orjson.dumps(
+                content,
+                default=_default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+
+
 def response(data, success, status_code: int, **kwargs):
-    content = {}
-
-    if success:
-        content = SucessResponseModel(
-            data=data,
-            success=success
-        )
-
-    else:
-        content = ErrorResponseModel(
-            errors=data,
-            success=success
-        )
-
-    return JSONResponse(
-        content=jsonable_encoder(content, **kwargs),
+    if kwargs:
+        # jsonable_encoder options such as exclude_none
+        data = jsonable_encoder(data, **kwargs)
+
+    content = {"success": success, "data" if success else "errors": data}
+
+    return FastJSONResponse(
+        content=content,
         status_code=status_code,
         headers=headers
     )
@@ -69,3 +98,43 @@ def error(data, status_code=status.HTTP_400_BAD_REQUEST):
         success=False,
         status_code=status_code
     )
+
+
+def content_hash(data: Any) -> str:
+    """Stable digest of JSON-able data (key order does not matter)."""
+    encoded = orjson.dumps(
+        data,
+        default=_default,
+        option=(
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_SORT_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+        ),
+    )
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag for a response determined entirely by `parts`."""
+    return f'"{content_hash(parts)}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return etag in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    # Clients may keep the body but must revalidate before using it
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def not_modified(etag: str) -> Response:
+    return with_etag(Response(status_code=status.HTTP_304_NOT_MODIFIED), etag)
@@ -0,0 +1,81 @@
+import contextlib
+import time
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Keep a bounded span list; per-phase totals are always complete
+MAX_SPANS = 500
+
+
+class RequestTimings:
+    """Per-request collector of named phase durations, in seconds."""
+
+    __slots__ = ("started", "totals", "spans", "dropped")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.totals: dict[str, float] = {}
+        self.spans: list[tuple[str, float, float]] = []
+        self.dropped = 0
+
+    def add(self, name: str, started: float, duration: float) -> None:
+        self.totals[name] = self.totals.get(name, 0.0) + duration
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append((name, started - self.started, duration))
+        else:
+            self.dropped += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        entries = [
+            f"{name};dur={total * 1000:.1f}" for name, total in self.totals.items()
+        ]
+        entries.append(f"total;dur={self.elapsed * 1000:.1f}")
+        return ", ".join(entries)
+
+    def breakdown(self) -> str:
+        lines = [
+            f"  +{offset * 1000:8.1f}ms {name:<12} {duration * 1000:8.1f}ms"
+            for name, offset, duration in self.spans
+        ]
+        if self.dropped:
+            lines.append(f"  ... {self.dropped} more spans")
+        return "\n".join(lines)
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request() -> tuple[RequestTimings, object]:
+    timings = RequestTimings()
+    return timings, _timings.set(timings)
+
+
+def end_request(token) -> None:
+    _timings.reset(token)
+
+
+def record(name: str, started: float, duration: float) -> None:
+    """Add an already measured phase to the current request, if any."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, started, duration)
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, started, time.perf_counter() - started)
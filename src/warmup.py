@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Awaitable, Optional
+
+from sqlalchemy import select
+
+from src.config import settings
+from src.core.ha_websocket.coordination import coordinator
+from src.core.ha_websocket.fanout import FanOut
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+from src.core.models.building import Building
+from src.database import sessionmanager
+from src.logger import get_logger
+from src.metrics import STARTUP_DURATION
+from src.redis import get_redis, warm_redis
+
+logger = get_logger(__name__)
+
+
+async def _connect(target: BuildingTarget) -> None:
+    async with ha_pool.acquire(target):
+        pass
+
+
+class WarmUp:
+    """
+    Startup warm-up of a worker. Database and Redis connections are opened
+    before the worker takes traffic; the buildings used most recently before
+    the last shutdown are pre-connected in the background, and the worker
+    reports ready once that is done too. Failures are logged, never fatal:
+    a cold pool is slower, not broken.
+    """
+
+    RECENT_KEY = "ha:recent-buildings"
+    RECENT_KEPT = 1000
+
+    def __init__(self):
+        self.ready = False
+        self.timings: dict[str, float] = {}
+        self._started = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _timed(self, phase: str, work: Awaitable) -> None:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(work, timeout=settings.WARMUP_TIMEOUT)
+            logger.debug(f"[WARMUP]: {phase} warm ({result})")
+        except Exception as e:
+            logger.warning(f"[WARMUP]: Warming up {phase} failed: {e}")
+        self.timings[phase] = round(time.perf_counter() - started, 3)
+
+    async def start(self, import_seconds: float) -> None:
+        """Warm the connection pools, then pre-connect buildings in the background."""
+        self._started = time.perf_counter()
+        self.timings["imports"] = round(import_seconds, 3)
+        phases = []
+        if settings.WARMUP_DB_CONNECTIONS:
+            phases.append(
+                self._timed(
+                    "database", sessionmanager.warm_up(settings.WARMUP_DB_CONNECTIONS)
+                )
+            )
+        if settings.WARMUP_REDIS_CONNECTIONS:
+            phases.append(
+                self._timed("redis", warm_redis(settings.WARMUP_REDIS_CONNECTIONS))
+            )
+        await asyncio.gather(*phases)
+
+        if settings.WARMUP_BUILDINGS:
+            self._task = asyncio.create_task(self._warm_buildings())
+        else:
+            self._done()
+
+    async def _warm_buildings(self) -> None:
+        await self._timed("buildings", self.buildings(settings.WARMUP_BUILDINGS))
+        self._task = None
+        self._done()
+
+    def _done(self) -> None:
+        self.ready = True
+        total = self.timings["imports"] + time.perf_counter() - self._started
+        self.timings["total"] = round(total, 3)
+        for phase, seconds in self.timings.items():
+            STARTUP_DURATION.labels(phase=phase).set(seconds)
+        phases = ", ".join(
+            f"{phase} {seconds}s"
+            for phase, seconds in self.timings.items()
+            if phase != "total"
+        )
+        logger.info(f"[WARMUP]: Ready in {total:.2f}s ({phases})")
+
+    async def buildings(self, limit: int) -> int:
+        """Pre-connect the `limit` most recently used buildings this worker owns."""
+        recent = await get_redis().zrevrange(self.RECENT_KEY, 0, limit - 1)
+        ids = [int(building_id) for building_id in recent]
+        if not ids:
+            return 0
+        async with sessionmanager.read_session() as session:
+            rows = await session.execute(select(
+                Building.id, Building.name, Building.building_url, Building.access_token
+            ).where(Building.id.in_(ids)))
+            targets = [BuildingTarget.from_building(row) for row in rows]
+        if coordinator.enabled:
+            targets = [
+                target for target in targets
+                if await coordinator.owner_of(target) == coordinator.worker_id
+            ]
+        outcomes = await FanOut(
+            timeout=settings.HA_CONNECT_TIMEOUT, deadline=settings.WARMUP_TIMEOUT
+        ).map(targets, _connect)
+        return sum(outcome.ok for outcome in outcomes)
+
+    async def remember_buildings(self) -> None:
+        """Record the pooled buildings, for the next start to pre-connect."""
+        recent = ha_pool.recently_used()
+        if not recent:
+            return
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.zadd(self.RECENT_KEY, recent)
+                pipe.zremrangebyrank(self.RECENT_KEY, 0, -self.RECENT_KEPT - 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"[WARMUP]: Could not record recently used buildings: {e}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+warmup = WarmUp()
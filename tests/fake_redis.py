@@ -0,0 +1,223 @@
+import asyncio
+import time
+from datetime import timedelta
+from typing import Any, Optional
+
+
+def _bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class FakePipeline:
+    """Queues commands and runs them in one round trip on `execute`."""
+
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.queued: list[tuple[str, tuple, dict]] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.queued = []
+
+    def __getattr__(self, command: str):
+        def queue(*args, **kwargs) -> "FakePipeline":
+            self.queued.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> list:
+        self.redis.round_trips += 1
+        queued, self.queued = self.queued, []
+        return [
+            self.redis._run(command, args, kwargs) for command, args, kwargs in queued
+        ]
+
+
+class FakePubSub:
+    def __init__(self, redis: "FakeRedis", ignore_subscribe_messages: bool = False):
+        self.redis = redis
+        self.channels: set[bytes] = set()
+        self.messages: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, *channels) -> None:
+        self.channels.update(_bytes(channel) for channel in channels)
+        self.redis.pubsubs.add(self)
+
+    async def unsubscribe(self, *channels) -> None:
+        self.channels.difference_update(_bytes(channel) for channel in channels)
+
+    async def get_message(self, timeout: float = 0.0) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        self.redis.pubsubs.discard(self)
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the part of `redis.asyncio.Redis` the app uses.
+    Every awaited command, and every pipeline, counts as one round trip.
+    """
+
+    def __init__(self):
+        self.data: dict[bytes, bytes] = {}
+        self.expires: dict[bytes, float] = {}
+        self.lists: dict[bytes, list[bytes]] = {}
+        self.zsets: dict[bytes, dict[bytes, float]] = {}
+        self.pubsubs: set[FakePubSub] = set()
+        self.round_trips = 0
+        self.commands: list[str] = []
+
+    def _live(self, key: Any) -> Optional[bytes]:
+        key = _bytes(key)
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _run(self, command: str, args: tuple, kwargs: dict) -> Any:
+        self.commands.append(command)
+        return getattr(self, f"_{command}")(*args, **kwargs)
+
+    def __getattr__(self, command: str):
+        if not hasattr(type(self), f"_{command}"):
+            raise AttributeError(command)
+
+        async def run(*args, **kwargs) -> Any:
+            self.round_trips += 1
+            return self._run(command, args, kwargs)
+
+        return run
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def pubsub(self, **kwargs) -> FakePubSub:
+        return FakePubSub(self, **kwargs)
+
+    async def blpop(self, keys, timeout: float = 0) -> Optional[tuple[bytes, bytes]]:
+        self.round_trips += 1
+        deadline = time.monotonic() + timeout
+        while True:
+            for key in map(_bytes, keys):
+                if self.lists.get(key):
+                    return key, self.lists[key].pop(0)
+            if timeout and time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(0.005)
+
+    # Commands
+
+    def _ping(self) -> bool:
+        return True
+
+    def _get(self, key) -> Optional[bytes]:
+        return self._live(key)
+
+    def _mget(self, keys, *more) -> list[Optional[bytes]]:
+        keys = [keys, *more] if isinstance(keys, (str, bytes)) else list(keys)
+        return [self._live(key) for key in keys]
+
+    def _set(self, key, value, ex=None, nx: bool = False) -> Optional[bool]:
+        key = _bytes(key)
+        if nx and self._live(key) is not None:
+            return None
+        self.data[key] = _bytes(value)
+        self.expires.pop(key, None)
+        if ex is not None:
+            seconds = ex.total_seconds() if isinstance(ex, timedelta) else ex
+            self.expires[key] = time.monotonic() + seconds
+        return True
+
+    def _delete(self, *keys) -> int:
+        deleted = 0
+        for key in keys:
+            if self._live(key) is not None:
+                deleted += 1
+                self.data.pop(_bytes(key))
+                self.expires.pop(_bytes(key), None)
+        return deleted
+
+    def _expire(self, key, seconds) -> bool:
+        if _bytes(key) in self.lists:
+            return True  # Lists never expire here
+        if self._live(key) is None:
+            return False
+        self.expires[_bytes(key)] = time.monotonic() + seconds
+        return True
+
+    def _ttl(self, key) -> int:
+        if self._live(key) is None:
+            return -2
+        if _bytes(key) not in self.expires:
+            return -1
+        return round(self.expires[_bytes(key)] - time.monotonic())
+
+    def _rpush(self, key, *values) -> int:
+        items = self.lists.setdefault(_bytes(key), [])
+        items.extend(map(_bytes, values))
+        return len(items)
+
+    def _publish(self, channel, message) -> int:
+        channel = _bytes(channel)
+        listeners = [pubsub for pubsub in self.pubsubs if channel in pubsub.channels]
+        for pubsub in listeners:
+            pubsub.messages.put_nowait(
+                {"type": "message", "channel": channel, "data": _bytes(message)}
+            )
+        return len(listeners)
+
+    def _zadd(self, key, mapping: dict) -> int:
+        zset = self.zsets.setdefault(_bytes(key), {})
+        added = sum(_bytes(member) not in zset for member in mapping)
+        zset.update({_bytes(member): score for member, score in mapping.items()})
+        return added
+
+    def _zrem(self, key, *members) -> int:
+        zset = self.zsets.get(_bytes(key), {})
+        return sum(zset.pop(_bytes(member), None) is not None for member in members)
+
+    def _zremrangebyscore(self, key, low, high) -> int:
+        low, high = float(low), float(high)
+        zset = self.zsets.get(_bytes(key), {})
+        removed = [member for member, score in zset.items() if low <= score <= high]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    def _zrange(self, key, start: int, end: int) -> list[bytes]:
+        zset = self.zsets.get(_bytes(key), {})
+        members = sorted(zset, key=lambda member: (zset[member], member))
+        return members[start:None if end == -1 else end + 1]
+
+    def _incr(self, key) -> int:
+        value = int(self._live(key) or 0) + 1
+        self.data[_bytes(key)] = _bytes(value)
+        return value
+
+    def _eval(self, script: str, numkeys: int, *args) -> int:
+        # Only the scripts of src.redis are understood
+        from src import redis
+
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == redis._SET_IF_COUNTER:
+            if (self._live(keys[1]) or b"0") != _bytes(argv[2]):
+                return 0
+            return int(self._set(keys[0], argv[0], ex=int(argv[1])))
+
+        holder, owner = self._live(keys[0]), _bytes(argv[0])
+        if script == redis._ACQUIRE_LEASE:
+            if holder is None:
+                return int(self._set(keys[0], owner, ex=int(argv[1])))
+            return int(holder == owner and self._expire(keys[0], int(argv[1])))
+        if script == redis._RELEASE_LEASE:
+            return self._delete(keys[0]) if holder == owner else 0
+        raise NotImplementedError(script)
@@ -0,0 +1,11 @@
+import pytest
+
+from src.core.ha_websocket import breaker
+
+
+@pytest.fixture(autouse=True)
+def fresh_guards() -> None:
+    # Breakers and latency estimates are per process; keep tests independent
+    breaker._guards.clear()
+    yield
+    breaker._guards.clear()
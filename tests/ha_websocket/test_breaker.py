@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_ha import FakeFleet
+from src.config import settings
+from src.core.ha_websocket.breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    LatencyEstimator,
+    _guards,
+    forget_guard,
+    guard_for,
+)
+from src.core.ha_websocket.main import HomeAssistantWS
+from src.metrics import HA_CIRCUIT_STATE
+
+
+def fail(breaker: CircuitBreaker) -> None:
+    with pytest.raises(ConnectionRefusedError):
+        with breaker.guard():
+            raise ConnectionRefusedError()
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_a_probe() -> None:
+    breaker = CircuitBreaker(
+        "b", failure_threshold=3, reset_timeout=0.05, half_open_probes=1
+    )
+
+    for _ in range(3):
+        fail(breaker)
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.opened_at -= 1
+    with breaker.guard():
+        assert breaker.state == CircuitState.HALF_OPEN
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_failed_probe_reopens_and_unrelated_errors_do_not_count() -> None:
+    breaker = CircuitBreaker("b", failure_threshold=1, reset_timeout=0.05)
+    fail(breaker)
+    breaker.opened_at -= 1
+
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError()
+    assert breaker.state == CircuitState.HALF_OPEN and breaker.probes == 0
+
+    fail(breaker)
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_latency_estimator_adapts_and_clamps() -> None:
+    estimator = LatencyEstimator(ceiling=10.0, floor=0.5)
+    assert estimator.timeout() == 10.0
+
+    for _ in range(50):
+        estimator.observe(0.1)
+    assert estimator.timeout() == 0.5
+
+    for _ in range(50):
+        estimator.observe(2.0)
+    assert 2.0 <= estimator.timeout() < 10.0
+
+    estimator.expired(8.0)
+    assert estimator.timeout() == 10.0
+
+
+@pytest.mark.asyncio
+async def test_unreachable_building_trips_its_circuit() -> None:
+    async with FakeFleet(1) as fleet:
+        url = fleet.homes[0].url
+    # The fleet is stopped, so connecting is refused
+    for _ in range(5):
+        with pytest.raises(OSError):
+            await HomeAssistantWS(url, "token", building_id=7).connect()
+
+    client = HomeAssistantWS(url, "token", building_id=7)
+    with pytest.raises(CircuitOpenError):
+        await asyncio.wait_for(client.connect(), timeout=0.1)
+    assert client.guard.breaker.state == CircuitState.OPEN
+
+
+def test_building_guards_are_bounded_and_forgotten(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "HA_BREAKER_MAX_BUILDINGS", 3)
+    first = guard_for("1")
+    for building in ("2", "3"):
+        guard_for(building)
+    assert guard_for("1") is first
+
+    # "2" was connected least recently
+    guard_for("4")
+    assert list(_guards) == ["3", "1", "4"]
+
+    forget_guard("1")
+    assert guard_for("1") is not first
+
+
+def circuit_states() -> dict[str, float]:
+    (metric,) = HA_CIRCUIT_STATE.collect()
+    return {sample.labels["building"]: sample.value for sample in metric.samples}
+
+
+def test_forgotten_buildings_leave_the_circuit_gauge(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "HA_BREAKER_MAX_BUILDINGS", 2)
+    for building in ("gauge-1", "gauge-2"):
+        breaker = guard_for(building).breaker
+        breaker.failure_threshold = 1
+        fail(breaker)
+    assert circuit_states()["gauge-1"] == 2
+
+    forget_guard("gauge-1")
+    assert "gauge-1" not in circuit_states()
+
+    # Evicting the least recently connected building drops its label too
+    guard_for("gauge-3")
+    guard_for("gauge-4")
+    assert "gauge-2" not in circuit_states()
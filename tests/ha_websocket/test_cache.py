@@ -0,0 +1,175 @@
+import asyncio
+import json
+
+import pytest
+
+from src import redis
+from src.core.ha_websocket.cache import CacheStatus, HAUserListCache
+from tests.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def fake_redis(monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    fake = FakeRedis()
+    monkeypatch.setattr(redis, "redis_client", fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_miss_then_hit_then_invalidate(fake_redis: FakeRedis) -> None:
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"success": True, "result": []}
+
+    users = HAUserListCache(ttl=60, stale_ttl=60)
+
+    assert (await users.get_or_fetch(1, fetch))[1] == CacheStatus.MISS
+    assert (await users.get_or_fetch(1, fetch))[1] == CacheStatus.HIT
+    await users.invalidate(1)
+    assert (await users.get_or_fetch(1, fetch))[1] == CacheStatus.MISS
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_and_refreshed(fake_redis: FakeRedis) -> None:
+    async def fetch():
+        return {"success": True, "result": ["fresh"]}
+
+    users = HAUserListCache(ttl=60, stale_ttl=60)
+    await fake_redis.set(users.key(1), json.dumps(
+        {"fetched_at": 0, "response": {"success": True, "result": ["old"]}}
+    ))
+
+    response, status = await users.get_or_fetch(1, fetch)
+    assert status == CacheStatus.STALE
+    assert response["result"] == ["old"]
+
+    await asyncio.sleep(0.01)
+    response, status = await users.get_or_fetch(1, fetch)
+    assert status == CacheStatus.HIT
+    assert response["result"] == ["fresh"]
+
+
+@pytest.mark.asyncio
+async def test_failed_replies_are_not_cached(fake_redis: FakeRedis) -> None:
+    async def fetch():
+        return {"success": False, "error": {"code": "unauthorized"}}
+
+    users = HAUserListCache(ttl=60, stale_ttl=60)
+    await users.get_or_fetch(1, fetch)
+
+    assert fake_redis.data == {}
+
+
+@pytest.mark.asyncio
+async def test_reply_fetched_before_an_invalidation_is_not_cached(
+    fake_redis: FakeRedis,
+) -> None:
+    users = HAUserListCache(ttl=60, stale_ttl=60)
+
+    async def fetch():
+        # A user is created while the listing is in flight
+        await users.invalidate(1)
+        return {"success": True, "result": ["old"]}
+
+    response, status = await users.get_or_fetch(1, fetch)
+    assert status == CacheStatus.MISS and response["result"] == ["old"]
+    assert await fake_redis.get(users.key(1)) is None
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_does_not_undo_an_invalidation(
+    fake_redis: FakeRedis,
+) -> None:
+    users = HAUserListCache(ttl=60, stale_ttl=60)
+    await fake_redis.set(users.key(1), json.dumps(
+        {"fetched_at": 0, "response": {"success": True, "result": ["old"]}}
+    ))
+    fetching = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fetch():
+        fetching.set()
+        await release.wait()
+        return {"success": True, "result": ["old"]}
+
+    assert (await users.get_or_fetch(1, fetch))[1] == CacheStatus.STALE
+    await fetching.wait()
+    await users.invalidate(1)
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert await fake_redis.get(users.key(1)) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_by_another_worker_wins(fake_redis: FakeRedis) -> None:
+    # Two workers, each with its own cache object, sharing Redis
+    worker_a = HAUserListCache(ttl=60, stale_ttl=60)
+    worker_b = HAUserListCache(ttl=60, stale_ttl=60)
+    fetching = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_fetch():
+        fetching.set()
+        await release.wait()
+        return {"success": True, "result": ["old"]}
+
+    listing = asyncio.create_task(worker_a.get_or_fetch(1, slow_fetch))
+    await fetching.wait()
+    await worker_b.invalidate(1)
+    release.set()
+
+    assert (await listing)[1] == CacheStatus.MISS
+    assert await fake_redis.get(worker_a.key(1)) is None
+    assert 0 < await fake_redis.ttl(worker_a.generation_key(1)) <= 86400
+
+    async def fetch():
+        return {"success": True, "result": ["new"]}
+
+    # Fetched under the new generation, so it is cached again
+    await worker_a.get_or_fetch(1, fetch)
+    response, status = await worker_b.get_or_fetch(1, fetch)
+    assert status == CacheStatus.HIT and response["result"] == ["new"]
+
+
+@pytest.mark.asyncio
+async def test_zero_ttl_is_respected(fake_redis: FakeRedis) -> None:
+    async def fetch():
+        return {"success": True, "result": []}
+
+    users = HAUserListCache(ttl=0, stale_ttl=0)
+    assert users.ttl == 0
+    assert (await users.get_or_fetch(1, fetch))[1] == CacheStatus.MISS
+    assert await fake_redis.get(users.key(1)) is None
+
+
+@pytest.mark.asyncio
+async def test_content_hashes_need_every_entry_fresh(fake_redis: FakeRedis) -> None:
+    async def fetch():
+        return {"success": True, "result": ["user"]}
+
+    users = HAUserListCache(ttl=60, stale_ttl=60)
+    await users.get_or_fetch(1, fetch)
+    await users.get_or_fetch(2, fetch)
+
+    hashes = await users.content_hashes([1, 2])
+    assert hashes is not None and hashes[1] == hashes[2]
+    assert await users.content_hashes([1, 2, 3]) is None
+
+    await fake_redis.set(
+        users.key(3), json.dumps({"fetched_at": 0, "response": {}, "hash": "old"})
+    )
+    assert await users.content_hashes([1, 3]) is None
+
+
+def test_combined_status_reports_the_worst_case() -> None:
+    assert CacheStatus.combine([CacheStatus.HIT, CacheStatus.HIT]) == CacheStatus.HIT
+    assert (
+        CacheStatus.combine([CacheStatus.HIT, CacheStatus.STALE]) == CacheStatus.STALE
+    )
+    assert (
+        CacheStatus.combine([CacheStatus.STALE, CacheStatus.MISS]) == CacheStatus.MISS
+    )
@@ -0,0 +1,288 @@
+import asyncio
+import dataclasses
+import json
+import time
+from collections import Counter
+
+import pytest
+import pytest_asyncio
+
+from benchmarks.fake_ha import FakeFleet
+from src import redis
+from src.core.ha_websocket import coordination
+from src.core.ha_websocket.coordination import BuildingCoordinator, rendezvous
+from src.core.ha_websocket.main import HomeAssistantAuthError
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+from tests.fake_redis import FakeRedis
+
+
+def test_rendezvous_is_stable_and_balanced() -> None:
+    workers = [f"worker-{i}" for i in range(4)]
+    owners = {
+        building_id: rendezvous(building_id, workers) for building_id in range(2000)
+    }
+
+    assert owners == {
+        building_id: rendezvous(building_id, reversed(workers))
+        for building_id in owners
+    }
+    assert all(400 < count < 600 for count in Counter(owners.values()).values())
+
+    # Losing a worker only moves the buildings it owned
+    survivors = workers[:3]
+    for building_id, owner in owners.items():
+        if owner != "worker-3":
+            assert rendezvous(building_id, survivors) == owner
+    assert rendezvous(1, []) is None
+
+
+@pytest.fixture
+def leases(monkeypatch: pytest.MonkeyPatch) -> dict:
+    data = {}
+
+    async def fake_get_by_key(key):
+        return data.get(key)
+
+    async def fake_acquire_lease(key, owner, ttl):
+        if data.get(key, owner.encode()) != owner.encode():
+            return False
+        data[key] = owner.encode()
+        return True
+
+    monkeypatch.setattr(coordination, "get_by_key", fake_get_by_key)
+    monkeypatch.setattr(coordination, "acquire_lease", fake_acquire_lease)
+    return data
+
+
+def target(building_id: int) -> BuildingTarget:
+    return BuildingTarget(
+        id=building_id, name=str(building_id), building_url="host", access_token="token"
+    )
+
+
+@pytest.mark.asyncio
+async def test_owner_of_follows_leases_and_hashing(leases: dict) -> None:
+    coordinator = BuildingCoordinator(enabled=True)
+    other = "other:1:abcd"
+    coordinator.workers = sorted([coordinator.worker_id, other])
+    ours = next(
+        i for i in range(100) if coordinator.preferred(i) == coordinator.worker_id
+    )
+    theirs = next(i for i in range(100) if coordinator.preferred(i) == other)
+
+    # Unleased: ours is taken over, theirs is left to them
+    assert await coordinator.owner_of(target(ours)) == coordinator.worker_id
+    assert leases[coordinator.owner_key(ours)] == coordinator.worker_id.encode()
+    assert await coordinator.owner_of(target(theirs)) == other
+    assert coordinator.owner_key(theirs) not in leases
+
+    # A live lease holder keeps the building even when hashing disagrees
+    leases[coordinator.owner_key(theirs)] = other.encode()
+    assert await coordinator.owner_of(target(theirs)) == other
+
+    # The lease of a worker that left is not waited out
+    leases[coordinator.owner_key(theirs)] = b"gone:2:ffff"
+    assert await coordinator.owner_of(target(theirs)) == coordinator.worker_id
+
+
+@pytest.mark.asyncio
+async def test_remote_client_forwards_to_owner(monkeypatch: pytest.MonkeyPatch) -> None:
+    coordinator = BuildingCoordinator(enabled=True)
+    forwarded = []
+
+    async def fake_forward(owner, target, op, retry, kwargs):
+        forwarded.append((owner, target.id, op, retry, kwargs))
+        return {"success": True}
+
+    monkeypatch.setattr(coordinator, "_forward", fake_forward)
+    client = coordinator.remote("other:1:abcd", target(7))
+
+    assert await client.create_user(username="alice") == {"success": True}
+    assert forwarded == [
+        ("other:1:abcd", 7, "create_user", False, {"username": "alice"})
+    ]
+    with pytest.raises(AttributeError):
+        client.close
+
+
+@pytest.mark.asyncio
+async def test_disabled_runs_on_local_pool() -> None:
+    coordinator = BuildingCoordinator(enabled=False)
+    async with FakeFleet(1, users=3) as fleet:
+        home = fleet.homes[0]
+        building = BuildingTarget(
+            id=1, name="home", building_url=home.url, access_token=home.access_token
+        )
+        try:
+            persons = await coordinator.run(building, "list_persons")
+            reply = await coordinator.run(
+                building, "command", message={"type": "get_states"}
+            )
+        finally:
+            await ha_pool.invalidate(building.id)
+
+    assert len(persons["result"]) == 3
+    assert reply["success"] and len(reply["result"]) == 10
+    with pytest.raises(ValueError):
+        await coordinator.run(building, "close")
+
+
+@pytest.fixture
+def fake_redis(monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    fake = FakeRedis()
+    monkeypatch.setattr(redis, "redis_client", fake)
+    return fake
+
+
+@pytest_asyncio.fixture
+async def workers(fake_redis: FakeRedis):
+    first, second = BuildingCoordinator(enabled=True), BuildingCoordinator(enabled=True)
+    await first.start()
+    await second.start()
+    await first._heartbeat()
+    try:
+        yield first, second
+    finally:
+        await first.close()
+        await second.close()
+
+
+@pytest.mark.asyncio
+async def test_replies_are_subscribed_before_start_returns(
+    fake_redis: FakeRedis,
+) -> None:
+    worker = BuildingCoordinator(enabled=True)
+    await worker.start()
+    try:
+        # No chance yet for the listener task to run
+        assert worker._pubsub is not None
+        assert worker._replies_channel().encode() in worker._pubsub.channels
+    finally:
+        await worker.close()
+
+
+def owned_by(coordinator: BuildingCoordinator, owner: str, skip: int = 0) -> int:
+    ids = (i for i in range(1, 1000) if coordinator.preferred(i) == owner)
+    for _ in range(skip):
+        next(ids)
+    return next(ids)
+
+
+@pytest.mark.asyncio
+async def test_calls_are_forwarded_to_the_owner_and_back(workers) -> None:
+    first, second = workers
+    async with FakeFleet(1, users=3) as fleet:
+        home = fleet.homes[0]
+        building = BuildingTarget(
+            id=owned_by(first, second.worker_id),
+            name="home",
+            building_url=home.url,
+            access_token=home.access_token,
+        )
+        rejected = dataclasses.replace(
+            building, id=owned_by(first, second.worker_id, skip=1), access_token="wrong"
+        )
+        try:
+            persons = await first.run(building, "list_persons")
+            assert len(persons["result"]) == 3
+            assert building.id in second.owned and building.id not in first.owned
+
+            # The owner's error type is raised on the requesting side
+            with pytest.raises(HomeAssistantAuthError):
+                await first.run(rejected, "list_persons", retry=False)
+        finally:
+            await ha_pool.invalidate(building.id)
+            await ha_pool.invalidate(rejected.id)
+    assert first._replies == {}
+
+
+@pytest.mark.asyncio
+async def test_failing_subscriber_does_not_break_replies(
+    workers, fake_redis: FakeRedis
+) -> None:
+    first, second = workers
+    received = []
+
+    def broken(frame: dict) -> None:
+        received.append(frame)
+        raise RuntimeError("subscriber bug")
+
+    await first.subscribe_events(42, broken)
+    pubsub = first._pubsub
+    await fake_redis.publish(first.EVENTS_CHANNEL.format(building_id=42), "{}")
+    await fake_redis.publish(first.EVENTS_CHANNEL.format(building_id=42), "not json")
+    await asyncio.sleep(0.05)
+    assert first._pubsub is pubsub
+
+    async with FakeFleet(1, users=1) as fleet:
+        home = fleet.homes[0]
+        building = BuildingTarget(
+            id=owned_by(first, second.worker_id),
+            name="home",
+            building_url=home.url,
+            access_token=home.access_token,
+        )
+        try:
+            assert len((await first.run(building, "list_persons"))["result"]) == 1
+        finally:
+            await ha_pool.invalidate(building.id)
+    assert received == [{}]
+
+
+@pytest.mark.asyncio
+async def test_expired_requests_get_no_reply(
+    workers, fake_redis: FakeRedis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    first, second = workers
+    replies = fake_redis.pubsub()
+    await replies.subscribe(first.REPLIES_CHANNEL.format(worker_id=first.worker_id))
+
+    await second._handle({
+        "id": "late",
+        "reply_to": first.worker_id,
+        "deadline": time.time() - 1,
+        "target": dataclasses.asdict(target(1)),
+        "op": "list_persons",
+        "retry": False,
+        "kwargs": {},
+    })
+    assert await replies.get_message(timeout=0.1) is None
+
+    # Nobody serves a worker that died; the caller gives up at the deadline
+    monkeypatch.setattr(coordination.settings, "HA_COORDINATION_FORWARD_TIMEOUT", 0.2)
+    with pytest.raises(asyncio.TimeoutError):
+        await first._forward("gone:1:ffff", target(1), "list_persons")
+    assert first._replies == {}
+    queued = json.loads(fake_redis.lists[b"ha:rpc:gone:1:ffff"][0])
+    assert queued["op"] == "list_persons" and queued["reply_to"] == first.worker_id
+
+
+@pytest.mark.asyncio
+async def test_buildings_are_handed_over_when_owners_change(
+    workers, fake_redis: FakeRedis
+) -> None:
+    first, second = workers
+    async with FakeFleet(1, users=2) as fleet:
+        home = fleet.homes[0]
+        building = BuildingTarget(
+            id=owned_by(first, second.worker_id),
+            name="home",
+            building_url=home.url,
+            access_token=home.access_token,
+        )
+        try:
+            await first.run(building, "list_persons")
+            assert building.id in second.owned
+
+            # The second worker is leaving: hashing now picks the first one
+            first.workers = second.workers = [first.worker_id]
+            await second._rebalance()
+            assert building.id not in second.owned
+            assert await fake_redis.get(second.owner_key(building.id)) is None
+
+            assert len((await first.run(building, "list_persons"))["result"]) == 2
+            assert building.id in first.owned
+            lease = await fake_redis.get(first.owner_key(building.id))
+            assert lease == first.worker_id.encode()
+        finally:
+            await ha_pool.invalidate(building.id)
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_ha import FakeFleet
+from src.core.ha_websocket.events import EventHub, EventSubscriber, coalesce_key
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+
+
+def state_changed(entity_id: str, state: str) -> dict:
+    return {
+        "type": "event",
+        "building_id": 1,
+        "event_type": "state_changed",
+        "data": {"entity_id": entity_id, "new_state": {"state": state}},
+    }
+
+
+def test_slow_subscriber_coalesces_then_drops_oldest() -> None:
+    subscriber = EventSubscriber(maxsize=2)
+    for frame in (
+        state_changed("light.a", "on"),
+        state_changed("light.a", "off"),
+        state_changed("light.b", "on"),
+    ):
+        subscriber.push(frame, coalesce_key(frame))
+    assert subscriber.coalesced == 1 and subscriber.dropped == 0
+
+    frame = state_changed("light.c", "on")
+    subscriber.push(frame, coalesce_key(frame))
+    assert subscriber.dropped == 1
+    assert [f["data"]["entity_id"] for f in subscriber._buffer.values()] == [
+        "light.b",
+        "light.c",
+    ]
+
+
+async def next_event(subscriber: EventSubscriber) -> dict:
+    while True:
+        frame = await asyncio.wait_for(subscriber.get(), timeout=2)
+        if frame["type"] == "event":
+            return frame
+
+
+@pytest.mark.asyncio
+async def test_one_upstream_subscription_serves_many_clients() -> None:
+    hub = EventHub()
+    async with FakeFleet(1) as fleet:
+        home = fleet.homes[0]
+        target = BuildingTarget(
+            id=1, name="one", building_url=home.url, access_token=home.access_token
+        )
+        try:
+            async with hub.subscribe([target]) as everything, \
+                    hub.subscribe([target], entity_ids=["light.b"]) as only_b:
+                status = await asyncio.wait_for(everything.get(), timeout=2)
+                assert status["status"] == "connected"
+
+                await home.fire_state_changed("light.a", "on")
+                await home.fire_state_changed("light.b", "on")
+
+                assert (await next_event(everything))["data"]["entity_id"] == "light.a"
+                assert (await next_event(everything))["data"]["entity_id"] == "light.b"
+                assert (await next_event(only_b))["data"]["entity_id"] == "light.b"
+
+                subscriptions = [subs for subs in home._subscriptions.values() if subs]
+                assert len(subscriptions) == 1 and len(subscriptions[0]) == 1
+
+            assert len(hub) == 0
+            await asyncio.sleep(0.05)
+            assert not any(home._subscriptions.values())
+        finally:
+            await hub.close()
+            await ha_pool.close()
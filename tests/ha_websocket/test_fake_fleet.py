@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.fake_ha import FakeFleet
+from src.core.ha_websocket.main import (
+    HomeAssistantAuthError,
+    HomeAssistantWS,
+    websocket_url,
+)
+
+
+def test_websocket_url_accepts_hosts_ports_and_urls() -> None:
+    assert websocket_url("home.local") == "ws://home.local:8002/api/websocket"
+    assert websocket_url("127.0.0.1:8123") == "ws://127.0.0.1:8123/api/websocket"
+    assert websocket_url("wss://home.example/api/websocket") == "wss://home.example/api/websocket"
+
+
+@pytest.mark.asyncio
+async def test_client_round_trip_against_fake_home() -> None:
+    async with FakeFleet(1, users=3) as fleet:
+        home = fleet.homes[0]
+        client = HomeAssistantWS(home.url, home.access_token)
+        await client.connect()
+        try:
+            listed = await client.list_persons()
+            assert len(listed["result"]) == 3
+
+            await client.create_user("alice", "secret", display_name="Alice")
+            listed = await client.list_persons()
+            assert "alice" in {user["username"] for user in listed["result"]}
+        finally:
+            await client.close()
+
+
+@pytest.mark.asyncio
+async def test_fake_home_rejects_wrong_token() -> None:
+    async with FakeFleet(1) as fleet:
+        client = HomeAssistantWS(fleet.homes[0].url, "wrong")
+        with pytest.raises(HomeAssistantAuthError):
+            await client.connect()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from src.core.ha_websocket.fanout import BuildingStatus, BuildingTarget, FanOut
+from src.core.ha_websocket.main import HomeAssistantWS
+
+
+def make_targets(count: int) -> list[BuildingTarget]:
+    return [
+        BuildingTarget(
+            id=i, name=f"building-{i}", building_url=f"host-{i}", access_token="token"
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def fake_connection(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def fake_connect(self):
+        pass
+
+    async def fake_close(self):
+        pass
+
+    monkeypatch.setattr(HomeAssistantWS, "connect", fake_connect)
+    monkeypatch.setattr(HomeAssistantWS, "close", fake_close)
+
+
+@pytest.mark.asyncio
+async def test_fanout_runs_buildings_concurrently() -> None:
+    async def work(client):
+        await asyncio.sleep(0.1)
+        return {"domain": client.domain}
+
+    started = time.perf_counter()
+    outcomes = await FanOut(concurrency=50, timeout=1, deadline=5).run(
+        make_targets(20), work
+    )
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.5
+    assert [outcome.target.id for outcome in outcomes] == list(range(20))
+    assert all(outcome.status == BuildingStatus.OK for outcome in outcomes)
+    assert outcomes[3].result == {"domain": "host-3"}
+
+
+@pytest.mark.asyncio
+async def test_fanout_reports_errors_and_timeouts() -> None:
+    async def work(client):
+        if client.domain == "host-0":
+            raise Exception("boom")
+        if client.domain == "host-1":
+            await asyncio.sleep(1)
+        return {}
+
+    outcomes = await FanOut(concurrency=5, timeout=0.1, deadline=5).run(
+        make_targets(3), work
+    )
+
+    assert outcomes[0].status == BuildingStatus.ERROR
+    assert outcomes[0].as_response() == {"error": "boom", "status": "error"}
+    assert outcomes[1].status == BuildingStatus.TIMEOUT
+    assert outcomes[2].status == BuildingStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_fanout_deadline_returns_partial_results() -> None:
+    async def work(client):
+        if client.domain != "host-0":
+            await asyncio.sleep(1)
+        return {}
+
+    started = time.perf_counter()
+    outcomes = await FanOut(concurrency=5, timeout=5, deadline=0.2).run(
+        make_targets(3), work
+    )
+
+    assert time.perf_counter() - started < 0.5
+    assert outcomes[0].status == BuildingStatus.OK
+    assert {outcome.status for outcome in outcomes[1:]} == {BuildingStatus.TIMEOUT}
+
+
+@pytest.mark.asyncio
+async def test_fanout_stream_yields_fastest_building_first() -> None:
+    async def work(target):
+        await asyncio.sleep(0.2 if target.id else 0.01)
+        return target.id
+
+    started = time.perf_counter()
+    stream = FanOut(concurrency=2, timeout=1, deadline=5).stream(make_targets(3), work)
+    first = await stream.__anext__()
+
+    assert first.result == 0
+    assert time.perf_counter() - started < 0.1
+    assert sorted([outcome.result async for outcome in stream]) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_skipped_buildings_are_reported_without_running() -> None:
+    ran = []
+
+    async def work(target):
+        ran.append(target.id)
+        return target.id
+
+    outcomes = await FanOut(concurrency=2, skip={1, 3}).map(make_targets(5), work)
+
+    assert sorted(ran) == [0, 2, 4]
+    assert [outcome.status for outcome in outcomes] == [
+        BuildingStatus.OK, BuildingStatus.SKIPPED, BuildingStatus.OK,
+        BuildingStatus.SKIPPED, BuildingStatus.OK,
+    ]
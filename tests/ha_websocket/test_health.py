@@ -0,0 +1,55 @@
+import pytest
+
+from benchmarks.fake_ha import FakeFleet
+from src.core.ha_websocket import health
+from src.core.ha_websocket.health import FleetHealthMonitor
+from src.core.ha_websocket.pool import BuildingTarget
+
+
+@pytest.fixture
+def store(monkeypatch: pytest.MonkeyPatch) -> dict:
+    data = {}
+
+    async def fake_get_many(keys):
+        return [data.get(key) for key in keys]
+
+    async def fake_set_many(items):
+        for item in items:
+            data[item.key] = item.value
+
+    monkeypatch.setattr(health, "get_many", fake_get_many)
+    monkeypatch.setattr(health, "set_many", fake_set_many)
+    return data
+
+
+@pytest.mark.asyncio
+async def test_sweep_records_reachability(
+    store: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async with FakeFleet(1) as fleet:
+        home = fleet.homes[0]
+        targets = [
+            BuildingTarget(
+                id=1, name="up", building_url=home.url, access_token=home.access_token
+            ),
+            BuildingTarget(
+                id=2, name="bad-token", building_url=home.url, access_token="wrong"
+            ),
+        ]
+        monitor = FleetHealthMonitor(interval=5, timeout=2)
+
+        async def fake_targets():
+            return targets
+
+        monkeypatch.setattr(monitor, "_targets", fake_targets)
+
+        await monitor.sweep()
+        await monitor.sweep()
+
+    statuses = await monitor.statuses([1, 2, 3])
+    assert set(statuses) == {1, 2}
+    assert statuses[1]["reachable"] and statuses[1]["ha_version"] == "2024.1.0"
+    assert statuses[1]["latency_ms"] is not None
+    assert not statuses[2]["reachable"]
+    assert statuses[2]["consecutive_failures"] == 2
+    assert await monitor.unreachable([1, 2, 3]) == {2}
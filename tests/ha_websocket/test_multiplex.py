@@ -0,0 +1,90 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+from src.core.ha_websocket import main
+from src.core.ha_websocket.main import HomeAssistantWS
+
+
+class FakeSocket:
+    """Answers `config/auth/list` after a per-command delay, out of order."""
+
+    def __init__(self):
+        self.state = SimpleNamespace(name="OPEN")
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.inbox.put_nowait(json.dumps({"type": "auth_required"}))
+
+    async def send(self, raw: str) -> None:
+        message = json.loads(raw)
+        if message["type"] == "auth":
+            await self.inbox.put(json.dumps({"type": "auth_ok"}))
+            return
+        asyncio.get_running_loop().call_later(
+            message["delay"],
+            self.inbox.put_nowait,
+            json.dumps(
+                {"id": message["id"], "type": "result", "result": message["delay"]}
+            ),
+        )
+
+    async def recv(self) -> str:
+        return await self.inbox.get()
+
+    async def close(self) -> None:
+        self.state.name = "CLOSED"
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch: pytest.MonkeyPatch) -> HomeAssistantWS:
+    socket = FakeSocket()
+
+    async def fake_connect(url):
+        return socket
+
+    monkeypatch.setattr(main.websockets, "connect", fake_connect)
+    client = HomeAssistantWS(domain="host", access_token="token")
+    await client.connect()
+    yield client
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_replies_are_routed_by_id(client: HomeAssistantWS) -> None:
+    slow, fast = await asyncio.gather(
+        client.command({"type": "config/auth/list", "delay": 0.1}),
+        client.command({"type": "config/auth/list", "delay": 0.01}),
+    )
+
+    assert slow["result"] == 0.1
+    assert fast["result"] == 0.01
+
+
+@pytest.mark.asyncio
+async def test_explicit_timeouts_do_not_feed_the_latency_estimate(
+    client: HomeAssistantWS,
+) -> None:
+    latency = client.guard.command_latency
+    before = (latency.smoothed, latency.deviation)
+
+    await client.command({"type": "get_states", "delay": 0.05}, timeout=60)
+    assert (latency.smoothed, latency.deviation) == before
+
+    await client.command({"type": "config/auth/list", "delay": 0.01})
+    assert (latency.smoothed, latency.deviation) != before
+
+
+@pytest.mark.asyncio
+async def test_command_timeout_and_event_channel(client: HomeAssistantWS) -> None:
+    with pytest.raises(asyncio.TimeoutError):
+        await client.command({"type": "config/auth/list", "delay": 0.2}, timeout=0.05)
+
+    client.websocket.inbox.put_nowait(
+        json.dumps({"id": 99, "type": "event", "event": {}})
+    )
+    event = await asyncio.wait_for(client.events.get(), timeout=1)
+
+    assert event["id"] == 99
+    assert client.connected
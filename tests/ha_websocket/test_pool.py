@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.ha_websocket.main import HomeAssistantWS
+from src.core.ha_websocket.pool import BuildingTarget, HAConnectionPool
+
+
+@pytest.fixture
+def connects(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    opened = []
+
+    async def fake_connect(self):
+        opened.append(self.domain)
+        self.websocket = SimpleNamespace(state=SimpleNamespace(name="OPEN"))
+        self._reader = asyncio.get_running_loop().create_future()
+
+    async def fake_close(self):
+        self.websocket.state.name = "CLOSED"
+
+    monkeypatch.setattr(HomeAssistantWS, "connect", fake_connect)
+    monkeypatch.setattr(HomeAssistantWS, "close", fake_close)
+    return opened
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_sessions_per_building(connects: list[str]) -> None:
+    pool = HAConnectionPool(max_connections=10)
+    target = BuildingTarget(
+        id=1, name="one", building_url="host-1", access_token="token"
+    )
+
+    async with pool.acquire(target) as first:
+        pass
+    async with pool.acquire(target) as second:
+        pass
+
+    assert first is second
+    assert connects == ["host-1"]
+
+
+@pytest.mark.asyncio
+async def test_pool_reconnects_when_building_changes(connects: list[str]) -> None:
+    pool = HAConnectionPool(max_connections=10)
+    target = BuildingTarget(
+        id=1, name="one", building_url="host-1", access_token="token"
+    )
+    edited = BuildingTarget(
+        id=1, name="one", building_url="host-2", access_token="token"
+    )
+
+    async with pool.acquire(target):
+        pass
+    async with pool.acquire(edited) as client:
+        assert client.domain == "host-2"
+
+    await pool.invalidate(1)
+    assert len(pool) == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_evicts_least_recently_used(connects: list[str]) -> None:
+    pool = HAConnectionPool(max_connections=2)
+    targets = [
+        BuildingTarget(
+            id=i, name=str(i), building_url=f"host-{i}", access_token="token"
+        )
+        for i in range(3)
+    ]
+
+    for target in targets:
+        async with pool.acquire(target):
+            pass
+
+    assert len(pool) == 2
+    async with pool.acquire(targets[0]):
+        pass
+    assert connects == ["host-0", "host-1", "host-2", "host-0"]
+
+
+@pytest.mark.asyncio
+async def test_new_session_survives_a_full_pool_of_busy_sessions(
+    connects: list[str],
+) -> None:
+    pool = HAConnectionPool(max_connections=1)
+    busy = BuildingTarget(id=1, name="1", building_url="host-1", access_token="token")
+    new = BuildingTarget(id=2, name="2", building_url="host-2", access_token="token")
+
+    async with pool.acquire(busy):
+        async with pool.acquire(new) as client:
+            # Over the limit, but both sessions are in use: neither is closed
+            assert client.connected
+            assert len(pool) == 2
+    assert len(pool) == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_during_connect_keeps_one_connect_at_a_time(
+    connects: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pool = HAConnectionPool(max_connections=10)
+    target = BuildingTarget(id=1, name="1", building_url="host-1", access_token="t")
+    connecting = asyncio.Event()
+    release = asyncio.Event()
+    running = []
+    fake_connect = HomeAssistantWS.connect
+
+    async def slow_connect(self):
+        running.append(self)
+        assert len(running) == 1, "two connects ran for one building"
+        connecting.set()
+        await release.wait()
+        await fake_connect(self)
+        running.remove(self)
+
+    monkeypatch.setattr(HomeAssistantWS, "connect", slow_connect)
+
+    async def use():
+        async with pool.acquire(target) as client:
+            return client
+
+    first = asyncio.create_task(use())
+    await connecting.wait()
+    await pool.invalidate(1)
+    second = asyncio.create_task(use())
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await first is await second
+    assert connects == ["host-1"]
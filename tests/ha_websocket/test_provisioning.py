@@ -0,0 +1,65 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from src.core.ha_websocket import provisioning
+from src.core.ha_websocket.pool import BuildingTarget
+from src.core.schemas.user_schema import BulkBuildingUserInputField
+
+
+class FakeClient:
+    def __init__(self, domain: str):
+        self.domain = domain
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create_user(self, username, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if username == "taken":
+            raise Exception("username already exists")
+        return {"success": True}
+
+
+@pytest.mark.asyncio
+async def test_provision_users_reports_every_item(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    clients = {}
+
+    @contextlib.asynccontextmanager
+    async def fake_acquire(target):
+        yield clients.setdefault(target.id, FakeClient(target.building_url))
+
+    monkeypatch.setattr(provisioning.ha_pool, "acquire", fake_acquire)
+    monkeypatch.setattr(provisioning.settings, "HA_BULK_PER_BUILDING_CONCURRENCY", 5)
+
+    targets = {
+        i: BuildingTarget(
+            id=i, name=str(i), building_url=f"host-{i}", access_token="token"
+        )
+        for i in (1, 2)
+    }
+    items = [
+        BulkBuildingUserInputField(
+            building_id=i % 2 + 1, username=f"user-{i}", password="pw"
+        )
+        for i in range(40)
+    ]
+    items.append(
+        BulkBuildingUserInputField(building_id=1, username="taken", password="pw")
+    )
+    items.append(
+        BulkBuildingUserInputField(building_id=3, username="nowhere", password="pw")
+    )
+
+    reports = await provisioning.provision_users(targets, items)
+
+    assert [report["index"] for report in reports] == list(range(len(items)))
+    assert all(report["success"] for report in reports[:40])
+    assert reports[40]["error"] == "username already exists"
+    assert reports[41]["error"] == "Building not found."
+    assert {client.max_in_flight for client in clients.values()} == {5}
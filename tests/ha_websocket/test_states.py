@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_ha import FakeFleet
+from src.core.ha_websocket.events import event_hub
+from src.core.ha_websocket.pool import BuildingTarget, ha_pool
+from src.core.ha_websocket.states import EntityState, EntityStateRegistry
+
+
+def test_entity_state_is_compact_and_round_trips() -> None:
+    raw = {
+        "entity_id": "light.kitchen",
+        "state": "on",
+        "attributes": {"brightness": 200},
+        "last_changed": "2024-01-01T00:00:00+00:00",
+        "last_updated": "2024-01-01T00:00:00+00:00",
+    }
+    entity = EntityState.from_ha(raw)
+
+    assert not hasattr(entity, "__dict__")
+    assert entity.as_dict() == raw
+    assert EntityState.from_ha(dict(raw, entity_id="light.hall")).state is entity.state
+
+
+async def eventually(condition) -> None:
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+@pytest.mark.asyncio
+async def test_cache_is_seeded_then_follows_events_and_resyncs() -> None:
+    registry = EntityStateRegistry(idle_timeout=60)
+    async with FakeFleet(1, entities=3) as fleet:
+        home = fleet.homes[0]
+        target = BuildingTarget(
+            id=1, name="one", building_url=home.url, access_token=home.access_token
+        )
+        try:
+            cache = await registry.get(target)
+            assert cache.status == "live"
+            assert set(cache.entities) == {
+                "sensor.fake_0",
+                "sensor.fake_1",
+                "sensor.fake_2",
+            }
+
+            await home.fire_state_changed("sensor.fake_0", "42")
+            await home.fire_state_changed("sensor.fake_2", None)
+            await eventually(lambda: cache.entities["sensor.fake_0"].state == "42")
+            await eventually(lambda: "sensor.fake_2" not in cache.entities)
+
+            # A dropped connection marks the cache stale until it has resynced
+            await ha_pool.invalidate(1)
+            await eventually(lambda: cache.stale)
+            home.states["light.new"] = home._state("light.new", "on")
+            await eventually(
+                lambda: cache.status == "live" and "light.new" in cache.entities
+            )
+        finally:
+            await registry.close()
+            await event_hub.close()
+            await ha_pool.close()
+    assert len(registry) == 0
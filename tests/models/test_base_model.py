@@ -0,0 +1,106 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.core.models.building import Building
+from src.exceptions import BadRequest
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def record(self, statement) -> None:
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+
+    async def execute(self, statement, params=None):
+        self.record(statement)
+        return SimpleNamespace(all=list, scalars=lambda: SimpleNamespace(all=list))
+
+    async def scalar(self, statement):
+        self.record(statement)
+        return 1
+
+    async def scalars(self, statement, params=None):
+        self.record(statement)
+        return SimpleNamespace(all=list)
+
+    async def commit(self):
+        self.commits += 1
+
+
+def test_cursor_round_trip() -> None:
+    row = SimpleNamespace(id=7, created_at=datetime(2025, 2, 17, 12, 19, 26))
+    cursor = Building.encode_cursor(row, "-created_at")
+
+    assert Building.decode_cursor(cursor, "-created_at") == [row.created_at, 7]
+    with pytest.raises(BadRequest):
+        Building.decode_cursor("not-a-cursor", "id")
+
+
+@pytest.mark.asyncio
+async def test_list_builds_a_keyset_page() -> None:
+    db = RecordingSession()
+    cursor = Building.encode_cursor(
+        SimpleNamespace(id=7, created_at=datetime(2025, 1, 1)), "created_at"
+    )
+
+    await Building.list(
+        db,
+        columns=["name"],
+        filters={"name": "HQ"},
+        order_by="created_at",
+        limit=10,
+        cursor=cursor,
+    )
+
+    sql = db.statements[0]
+    assert sql.startswith("SELECT building.name, building.created_at, building.id")
+    assert "(building.created_at, building.id) > (" in sql
+    assert "ORDER BY building.created_at, building.id" in sql
+    assert "LIMIT" in sql
+
+
+@pytest.mark.asyncio
+async def test_list_rejects_unknown_fields() -> None:
+    with pytest.raises(BadRequest):
+        await Building.list(RecordingSession(), columns=["password"])
+    with pytest.raises(BadRequest):
+        await Building.list(RecordingSession(), order_by="name")
+
+
+@pytest.mark.asyncio
+async def test_writes_are_single_statements() -> None:
+    db = RecordingSession()
+
+    await Building.create(db, name="HQ")
+    await Building.update(db, 1, name="HQ 2")
+    await Building.delete(db, 1)
+    await Building.bulk_upsert(
+        db, [{"id": 1, "name": "HQ"}, {"id": 2, "name": "Annex"}]
+    )
+
+    assert len(db.statements) == db.commits == 4
+    assert all("RETURNING" in sql for sql in db.statements)
+    assert db.statements[1].startswith(
+        "UPDATE building SET name=%(name)s, updated_at=now()"
+    )
+    assert "ON CONFLICT (id) DO UPDATE SET name = excluded.name" in db.statements[3]
+
+
+@pytest.mark.asyncio
+async def test_create_if_absent_relies_on_the_unique_index() -> None:
+    db = RecordingSession()
+
+    await Building.create_if_absent(
+        db, ("building_url",), name="HQ", building_url="hq.local"
+    )
+
+    assert "ON CONFLICT (building_url) DO NOTHING RETURNING" in db.statements[0]
+    index = next(
+        i for i in Building.__table__.indexes if i.name == "building_building_url_idx"
+    )
+    assert index.unique
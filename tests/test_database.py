@@ -0,0 +1,181 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool, QueuePool
+
+from src import database
+from src.config import settings
+from src.database import (
+    DatabaseService,
+    HeldConnections,
+    db_scope,
+    end_routing,
+    ping_idle_connections,
+    start_routing,
+    warn_if_holding,
+)
+from src.metrics import DB_CONNECTIONS_HELD_ACROSS_IO
+from src.middlewares import ReadYourWritesMiddleware
+
+# Nothing listens on port 1, so connecting fails fast
+PRIMARY = "postgresql+asyncpg://user:pw@127.0.0.1:1/app"
+REPLICAS = ["postgresql+asyncpg://user:pw@127.0.0.2:1/app", "postgresql+asyncpg://user:pw@127.0.0.3:1/app"]
+
+
+@pytest.mark.asyncio
+async def test_reads_rotate_over_healthy_replicas() -> None:
+    service = DatabaseService(PRIMARY, replica_hosts=REPLICAS)
+    try:
+        picks = [service._pick_replica().name for _ in range(4)]
+        assert picks == ["127.0.0.2", "127.0.0.3", "127.0.0.2", "127.0.0.3"]
+
+        service._replicas[0].mark(False, "down")
+        assert {service._pick_replica().name for _ in range(4)} == {"127.0.0.3"}
+
+        routing, token = start_routing(primary=True)
+        try:
+            assert service._pick_replica() is None
+        finally:
+            end_routing(token)
+
+        service._replicas[1].mark(False, "down")
+        assert service._pick_replica() is None
+    finally:
+        await service.close()
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_is_taken_out_of_rotation() -> None:
+    service = DatabaseService(PRIMARY, replica_hosts=REPLICAS[:1])
+    replica = service._replicas[0]
+    try:
+        # Opening a read session does not touch the replica
+        async with service.read_session() as session:
+            assert session.info["replica"] == replica.name
+        assert replica.healthy and replica._recheck is None
+
+        with pytest.raises(OSError):
+            async with service.read_session() as session:
+                await session.execute(text("SELECT 1"))
+        await replica._recheck
+        assert not replica.healthy
+
+        async with service.read_session() as session:
+            assert "replica" not in session.info
+
+        await service.check_replicas()
+        assert not replica.healthy
+    finally:
+        await service.close()
+
+
+def test_clients_read_their_writes_from_the_primary() -> None:
+    app = FastAPI()
+
+    @app.post("/write")
+    async def write():
+        database._mark_write()
+        return {"primary": database._routing.get().use_primary}
+
+    @app.get("/read")
+    async def read():
+        return {"primary": database._routing.get().use_primary}
+
+    app.add_middleware(ReadYourWritesMiddleware, window=5)
+
+    with TestClient(app) as client:
+        assert client.get("/read").json() == {"primary": False}
+        assert "set-cookie" not in client.get("/read").headers
+
+        written = client.post("/write")
+        assert written.json() == {"primary": True}
+        assert ReadYourWritesMiddleware.COOKIE in written.headers["set-cookie"]
+        assert client.get("/read").json() == {"primary": True}
+
+        client.cookies.set(ReadYourWritesMiddleware.COOKIE, "0")
+        assert client.get("/read").json() == {"primary": False}
+
+
+def test_connections_held_across_io_are_reported_once() -> None:
+    counter = DB_CONNECTIONS_HELD_ACROSS_IO.labels(activity="test I/O")
+    before = counter._value.get()
+
+    token = database._held.set(HeldConnections())
+    try:
+        warn_if_holding("test I/O")
+        database._held.get().add(object())
+        warn_if_holding("test I/O")
+        warn_if_holding("test I/O")
+    finally:
+        database._held.reset(token)
+
+    assert counter._value.get() == before + 1
+
+
+@pytest.mark.asyncio
+async def test_db_scope_closes_the_session() -> None:
+    class FakeSession:
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    session = FakeSession()
+    with pytest.raises(RuntimeError):
+        async with db_scope(session):
+            raise RuntimeError
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_pgbouncer_mode_keeps_no_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "DATABASE_POOL_MODE", "pgbouncer")
+    service = DatabaseService(PRIMARY)
+    try:
+        assert isinstance(service._engine.pool, NullPool)
+        assert service.pool_stats() == {"primary": {"pool": "NullPool"}}
+        assert await service.warm_up(5) == 0
+    finally:
+        await service.close()
+
+
+def test_only_idle_connections_are_pinged() -> None:
+    class FakeConnection:
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    created, pinged = [], []
+    alive = True
+
+    def creator():
+        created.append(FakeConnection())
+        return created[-1]
+
+    def do_ping(connection):
+        pinged.append(connection)
+        if not alive:
+            raise OSError("server closed the connection")
+
+    pool = QueuePool(creator, pool_size=1)
+    ping_idle_connections(
+        SimpleNamespace(pool=pool, dialect=SimpleNamespace(do_ping=do_ping)), idle=60
+    )
+    pool.connect().close()
+    pool.connect().close()
+    assert pinged == []
+
+    pool = QueuePool(creator, pool_size=1)
+    ping_idle_connections(
+        SimpleNamespace(pool=pool, dialect=SimpleNamespace(do_ping=do_ping)), idle=0
+    )
+    pool.connect().close()
+    alive = False
+    connection = pool.connect()
+    assert len(pinged) == 1
+    assert connection.dbapi_connection is created[-1] and len(created) == 3
@@ -0,0 +1,30 @@
+import logging
+import queue
+
+from src.logger import APP_LOGGER, DroppingQueueHandler, get_logger
+from src.metrics import LOG_RECORDS_DROPPED
+
+
+def test_full_queue_drops_instead_of_blocking() -> None:
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    exported = LOG_RECORDS_DROPPED._value.get()
+    logger = logging.getLogger("tests.dropping")
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    for i in range(5):
+        logger.warning("record %s", i)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    assert LOG_RECORDS_DROPPED._value.get() == exported + 3
+
+
+def test_handlers_are_attached_once() -> None:
+    get_logger("src.one")
+    get_logger("src.two")
+    get_logger("src.one")
+
+    app_handlers = logging.getLogger(APP_LOGGER).handlers
+    assert sum(isinstance(h, DroppingQueueHandler) for h in app_handlers) == 1
+    assert logging.getLogger("src.one").handlers == []
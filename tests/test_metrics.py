@@ -0,0 +1,28 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from src.middlewares import MetricsMiddleware
+
+
+def test_requests_are_labelled_by_route_template() -> None:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, router=app.router)
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    before = (
+        REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0
+    )
+
+    with TestClient(app) as client:
+        client.get("/items/1")
+        client.get("/items/2")
+
+    assert (
+        REGISTRY.get_sample_value("http_request_duration_seconds_count", labels)
+        == before + 2
+    )
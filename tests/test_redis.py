@@ -0,0 +1,75 @@
+import pytest
+
+from src import redis
+from tests.fake_redis import FakeRedis
+
+
+@pytest.mark.asyncio
+async def test_client_lifecycle_and_health_probe(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Nothing listens on port 1, so the probe must report the failure, not raise
+    monkeypatch.setattr(redis.settings, "REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(redis.settings, "REDIS_MAX_CONNECTIONS", 7)
+    assert (await redis.redis_health())["healthy"] is False
+
+    redis.init_redis()
+    try:
+        pool = redis.get_redis().connection_pool
+        assert pool.max_connections == 7
+
+        health = await redis.redis_health()
+        assert health["healthy"] is False and health["error"]
+        assert health["max_connections"] == 7
+        assert health["connections_in_use"] == 0
+
+        # Empty batches don't touch the server
+        assert await redis.get_many([]) == []
+        assert await redis.delete_many([]) == 0
+        await redis.set_many([])
+    finally:
+        await redis.close_redis()
+
+    with pytest.raises(RuntimeError):
+        redis.get_redis()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch: pytest.MonkeyPatch) -> FakeRedis:
+    fake = FakeRedis()
+    monkeypatch.setattr(redis, "redis_client", fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_batch_helpers_take_one_round_trip(fake_redis: FakeRedis) -> None:
+    keys = [f"key:{i}" for i in range(50)]
+    await redis.set_many([
+        redis.RedisData(key=key, value=f"value:{i}", ttl=60 if i % 2 else None)
+        for i, key in enumerate(keys)
+    ])
+    assert fake_redis.round_trips == 1
+    assert fake_redis.commands == ["set"] * 50
+    assert await fake_redis.ttl("key:1") == 60
+    assert await fake_redis.ttl("key:0") == -1
+
+    fake_redis.round_trips = 0
+    values = await redis.get_many([*keys, "missing"])
+    assert values == [f"value:{i}".encode() for i in range(50)] + [None]
+    assert fake_redis.round_trips == 1
+
+    fake_redis.round_trips = 0
+    assert await redis.delete_many([*keys[:10], "missing"]) == 10
+    assert fake_redis.round_trips == 1
+    assert await redis.get_many(keys[:11]) == [None] * 10 + [b"value:10"]
+
+
+@pytest.mark.asyncio
+async def test_single_set_applies_the_ttl(fake_redis: FakeRedis) -> None:
+    await redis.set_redis_key(redis.RedisData(key="a", value="1", ttl=30))
+    await redis.set_redis_key(redis.RedisData(key="b", value="2"))
+
+    assert fake_redis.round_trips == 2
+    assert await redis.get_by_key("a") == b"1"
+    assert await fake_redis.ttl("a") == 30
+    assert await fake_redis.ttl("b") == -1
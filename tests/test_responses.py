@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from src.models import ZPModel
+from src.responses import (
+    ErrorResponseModel,
+    SucessResponseModel,
+    error,
+    etag_matches,
+    make_etag,
+    not_modified,
+    success,
+    with_etag,
+)
+
+
+class Stamped(ZPModel):
+    when: datetime
+
+
+def test_fast_rendering_matches_jsonable_encoder() -> None:
+    data = {
+        "created_at": datetime(2025, 2, 17, 12, 19, 26, 49868),
+        "day": date(2025, 1, 1),
+        "uuid": UUID("b3aae702-faae-4b7b-a83b-72864d5a4cd9"),
+        "amount": Decimal("1.5"),
+        "model": Stamped(when=datetime(2025, 1, 1)),
+        "tags": {"a"},
+        1: [None, True, 1.5],
+    }
+    errors = [{"message": "Sorry", "code": "VALIDATION_ERROR"}]
+
+    legacy_success = JSONResponse(jsonable_encoder(SucessResponseModel(data=data)))
+    legacy_error = JSONResponse(jsonable_encoder(ErrorResponseModel(errors=errors)))
+
+    assert success(data).body == legacy_success.body
+    assert error(errors).body == legacy_error.body
+    assert b'"when":"2025-01-01T00:00:00+0000"' in success(data).body
+
+
+def test_conditional_get_with_etags() -> None:
+    app = FastAPI()
+    version = {"value": 1}
+
+    @app.get("/items")
+    async def items(request: Request):
+        etag = make_etag(version["value"], {"b": 2, "a": 1})
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return with_etag(success([version["value"]]), etag)
+
+    assert make_etag(1, {"a": 1, "b": 2}) == make_etag(1, {"b": 2, "a": 1})
+
+    with TestClient(app) as client:
+        first = client.get("/items")
+        etag = first.headers["ETag"]
+        assert first.status_code == 200 and first.headers["Cache-Control"] == "no-cache"
+
+        revalidated = client.get(
+            "/items", headers={"If-None-Match": f'"other", W/{etag}'}
+        )
+        assert revalidated.status_code == 304 and revalidated.content == b""
+        assert revalidated.headers["ETag"] == etag
+
+        version["value"] = 2
+        changed = client.get("/items", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["ETag"] != etag
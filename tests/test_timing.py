@@ -0,0 +1,37 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.middlewares import ServerTimingMiddleware
+from src.responses import FastJSONResponse
+from src.timing import span
+
+
+def test_server_timing_header_lists_phase_totals() -> None:
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/work")
+    async def work():
+        for _ in range(2):
+            with span("ha-recv"):
+                await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    app.add_middleware(ServerTimingMiddleware)
+
+    with TestClient(app) as client:
+        response = client.get("/work")
+
+    entries = dict(
+        entry.strip().split(";dur=")
+        for entry in response.headers["server-timing"].split(",")
+    )
+    assert set(entries) == {"ha-recv", "render", "total"}
+    assert float(entries["ha-recv"]) >= 20
+    assert float(entries["total"]) >= float(entries["ha-recv"])
+
+
+def test_span_outside_a_request_is_a_no_op() -> None:
+    with span("sql"):
+        pass
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from src import warmup as warmup_module
+from src.core.routers.base_router import router
+from src.warmup import WarmUp
+
+
+@pytest.fixture
+def no_pools(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(warmup_module.settings, "WARMUP_DB_CONNECTIONS", 0)
+    monkeypatch.setattr(warmup_module.settings, "WARMUP_REDIS_CONNECTIONS", 0)
+
+
+@pytest.mark.asyncio
+async def test_ready_after_building_warm_up(
+    no_pools, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(warmup_module.settings, "WARMUP_BUILDINGS", 3)
+    release = asyncio.Event()
+    warm = WarmUp()
+
+    async def fake_buildings(limit):
+        await release.wait()
+        return limit
+
+    monkeypatch.setattr(warm, "buildings", fake_buildings)
+
+    await warm.start(import_seconds=0.5)
+    assert not warm.ready
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert warm.ready
+    assert set(warm.timings) == {"imports", "buildings", "total"}
+    assert warm.timings["total"] >= 0.5
+
+
+@pytest.mark.asyncio
+async def test_failed_warm_up_still_gets_ready(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(warmup_module.settings, "WARMUP_BUILDINGS", 0)
+    monkeypatch.setattr(warmup_module.settings, "WARMUP_REDIS_CONNECTIONS", 0)
+
+    async def unreachable(connections):
+        raise OSError("Connection refused")
+
+    monkeypatch.setattr(warmup_module.sessionmanager, "warm_up", unreachable)
+    warm = WarmUp()
+    await warm.start(import_seconds=0.1)
+
+    assert warm.ready
+    assert "database" in warm.timings
+
+
+@pytest.mark.asyncio
+async def test_readiness_endpoint(monkeypatch: pytest.MonkeyPatch) -> None:
+    app = FastAPI()
+    app.include_router(router)
+    warm = WarmUp()
+    monkeypatch.setattr("src.core.routers.base_router.warmup", warm)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        assert (await client.get("/readiness")).status_code == 503
+        warm.ready = True
+        response = await client.get("/readiness")
+
+    assert response.status_code == 200